@@ -0,0 +1,358 @@
+"""Asyncio versions of the callable functions, for the async example."""
+
+# Copyright © 2025-2026 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# These mirror the functions in callable_functions, and share its URL building
+# and response parsing. Only the network I/O differs: it goes through a single
+# httpx.AsyncClient, so many conversations can run tools on one event loop.
+# The caches are shared with callable_functions too; they take locks, and may
+# read or write their files, so they are used from worker threads, through
+# asyncio.to_thread(), never on the event loop itself.
+
+import asyncio
+import json
+
+import callable_functions
+import circuit_breaker
+import http_sessions
+import httpx
+import rate_limit
+
+_client = None
+
+
+def get_client():
+  """Returns the shared AsyncClient, creating it on first use."""
+  global _client
+  if _client is None:
+    # Use the same keep-alive pool settings as the synchronous sessions.
+    pool_maxsize = http_sessions.get_pool_maxsize()
+    limits = httpx.Limits(
+        max_connections=None,
+        max_keepalive_connections=pool_maxsize,
+        keepalive_expiry=http_sessions.get_keepalive_seconds() or None,
+    )
+    connect_timeout, read_timeout = http_sessions.get_timeout()
+    _client = httpx.AsyncClient(
+        limits=limits,
+        timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+    )
+  return _client
+
+
+async def _get(upstream, url, **kwargs):
+  """Sends a GET on the shared client, after the upstream's rate limit.
+
+  Like callable_functions._http_get(), the request has the connect and read
+  timeouts of http_sessions.get_timeout(), and goes through the circuit
+  breaker of the host.
+
+  Raises:
+    httpx.HTTPError: if the request fails or times out.
+    circuit_breaker.CircuitOpenError: if the host's breaker is open.
+  """
+
+  async def send():
+    await rate_limit.acquire_async(upstream)
+    return await get_client().get(url, **kwargs)
+
+  return await circuit_breaker.get_breaker(url).call_async(
+      send, failure_exceptions=(httpx.TransportError,)
+  )
+
+
+async def aclose_client():
+  """Closes the shared AsyncClient, if one was created."""
+  global _client
+  if _client is not None:
+    await _client.aclose()
+    _client = None
+
+
+async def get_weather_forecast(*args):
+  """Fetches weather forecast for a given placename.
+
+  Expects placename (e.g., "Chicago, IL") as the first argument. Returns a dict
+  with "temperature" and "periodName", or an error dict.
+  """
+  if not args:
+    error_msg = (
+        "Error: get_weather_forecast expects at least one argument (placename)."
+    )
+    print(error_msg)
+    return {"error": error_msg}
+  placename = args[0]
+
+  tomtom_key = callable_functions.get_tomtom_key()
+
+  if not tomtom_key:
+    return {
+        "error": (
+            "TomTom API key is missing or could not be read from environment"
+            " TOMTOM_APIKEY."
+        )
+    }
+
+  # 1. Get Lat/Lon from TomTom
+  position, error = await _geocode_placename(placename, tomtom_key)
+  if error:
+    return error
+  latitude, longitude = position
+
+  # 2. Get Weather.gov forecast office URL
+  forecast_grid_data_url, error = await _get_forecast_url(latitude, longitude)
+  if error:
+    return error
+
+  # 3. Get actual forecast
+  return await _get_forecast(forecast_grid_data_url, placename)
+
+
+async def _geocode_placename(placename, tomtom_key):
+  """Resolves a placename to (lat, lon), via the cache or TomTom."""
+  position = await asyncio.to_thread(
+      callable_functions._cached_position, placename
+  )
+  if position:
+    return position, None
+
+  geocode_url = callable_functions._geocode_url(placename, tomtom_key)
+  try:
+    print(f"Fetching geocode for '{placename}' from TomTom...")
+    response_geocode = await _get(rate_limit.TOMTOM, geocode_url)
+    response_geocode.raise_for_status()
+    position, error = callable_functions._position_from_geocode_data(
+        response_geocode.json(), placename
+    )
+    if position:
+      await asyncio.to_thread(
+          callable_functions._remember_position, placename, position
+      )
+    return position, error
+
+  except (httpx.HTTPError, circuit_breaker.CircuitOpenError) as e:
+    error_msg = f"TomTom API request failed for '{placename}': {e}"
+    print(error_msg)
+    return None, {"error": error_msg, "details": str(e)}
+  except json.JSONDecodeError:
+    error_msg = f"Failed to decode JSON from TomTom API for '{placename}'."
+    print(error_msg)
+    return None, {"error": error_msg}
+  except (KeyError, IndexError) as e:
+    error_msg = (
+        f"Unexpected structure in TomTom API response for '{placename}': {e}"
+    )
+    print(error_msg)
+    return None, {"error": error_msg, "details": str(e)}
+
+
+async def _get_forecast_url(latitude, longitude):
+  """Resolves a lat/lon to the weather.gov forecast URL for its grid cell."""
+  grid_key = callable_functions._grid_key(latitude, longitude)
+  forecast_url = await asyncio.to_thread(
+      callable_functions._cached_forecast_url, grid_key
+  )
+  if forecast_url:
+    return forecast_url, None
+
+  weather_gov_base_url = callable_functions.get_base_url("WEATHER_GOV_BASE_URL")
+  points_url = f"{weather_gov_base_url}/points/{grid_key}"
+  weather_headers = {"User-Agent": callable_functions.WEATHER_GOV_USER_AGENT}
+
+  try:
+    print(
+        f"Fetching weather points for {latitude},{longitude} from"
+        " Weather.gov..."
+    )
+    redirect_url = await asyncio.to_thread(
+        callable_functions._cached_redirect, points_url
+    )
+    if redirect_url:
+      print(f"Using cached redirect: {redirect_url}")
+      response_points = await _get(
+          rate_limit.WEATHER, redirect_url, headers=weather_headers
+      )
+    else:
+      # httpx does not follow redirects unless asked to.
+      response_points = await _get(
+          rate_limit.WEATHER, points_url, headers=weather_headers
+      )
+
+    if response_points.status_code == 301:  # Handle redirect
+      redirect_url = response_points.headers.get("Location")
+      if not redirect_url:
+        error_msg = (
+            "Weather.gov points API redirected (301) but no Location header"
+            " found."
+        )
+        print(error_msg)
+        return None, {"error": error_msg}
+      print(f"Redirected to: {redirect_url}")
+      redirect_url = callable_functions._absolute_weather_gov_url(redirect_url)
+      await asyncio.to_thread(
+          callable_functions._remember_redirect, points_url, redirect_url
+      )
+
+      response_points = await _get(
+          rate_limit.WEATHER, redirect_url, headers=weather_headers
+      )
+
+    response_points.raise_for_status()
+    forecast_url, error = callable_functions._forecast_url_from_points_data(
+        response_points.json()
+    )
+    if forecast_url:
+      await asyncio.to_thread(
+          callable_functions._remember_forecast_url, grid_key, forecast_url
+      )
+    return forecast_url, error
+
+  except (httpx.HTTPError, circuit_breaker.CircuitOpenError) as e:
+    error_msg = f"Weather.gov points API request failed: {e}"
+    print(error_msg)
+    return None, {"error": error_msg, "details": str(e)}
+  except json.JSONDecodeError:
+    error_msg = "Failed to decode JSON from Weather.gov points API."
+    print(error_msg)
+    return None, {"error": error_msg}
+  except (KeyError, IndexError) as e:
+    error_msg = f"Unexpected structure in Weather.gov points API response: {e}"
+    print(error_msg)
+    return None, {"error": error_msg, "details": str(e)}
+
+
+async def _get_forecast(forecast_grid_data_url, placename):
+  """Fetches the forecast from weather.gov, or the cache, and formats it."""
+  forecast_cache = await asyncio.to_thread(
+      callable_functions._get_forecast_cache
+  )
+  entry = await asyncio.to_thread(forecast_cache.lookup, forecast_grid_data_url)
+  if forecast_cache.is_fresh(entry):
+    print(f"Using cached forecast from: {forecast_grid_data_url}")
+    return callable_functions._format_forecast(entry["body"], placename)
+
+  weather_headers = {"User-Agent": callable_functions.WEATHER_GOV_USER_AGENT}
+  weather_headers.update(forecast_cache.conditional_headers(entry))
+  try:
+    print(f"Fetching actual forecast from: {forecast_grid_data_url}...")
+    response_forecast = await _get(
+        rate_limit.WEATHER, forecast_grid_data_url, headers=weather_headers
+    )
+    if response_forecast.status_code == 304 and entry:
+      print("Cached forecast is still current (304).")
+      entry = await asyncio.to_thread(
+          forecast_cache.revalidated,
+          forecast_grid_data_url,
+          entry,
+          response_forecast.headers,
+      )
+      return callable_functions._format_forecast(entry["body"], placename)
+
+    response_forecast.raise_for_status()
+    forecast_data = response_forecast.json()
+    await asyncio.to_thread(
+        forecast_cache.store,
+        forecast_grid_data_url,
+        response_forecast.headers,
+        forecast_data,
+    )
+    return callable_functions._format_forecast(forecast_data, placename)
+
+  except (httpx.HTTPError, circuit_breaker.CircuitOpenError) as e:
+    error_msg = f"Weather.gov forecast API request failed: {e}"
+    print(error_msg)
+    return {"error": error_msg, "details": str(e)}
+  except json.JSONDecodeError:
+    error_msg = "Failed to decode JSON from Weather.gov forecast API."
+    print(error_msg)
+    return {"error": error_msg}
+  except (KeyError, IndexError) as e:
+    error_msg = (
+        f"Unexpected structure in Weather.gov forecast API response: {e}"
+    )
+    print(error_msg)
+    return {"error": error_msg, "details": str(e)}
+
+
+async def get_min_scrabble_word_score(*args):
+  """Calculates a Scrabble score for a word; see callable_functions."""
+  # Pure computation, nothing to await.
+  return callable_functions.get_min_scrabble_word_score(*args)
+
+
+async def get_is_known_word(*args):
+  """Returns a bool indicating if the candidate is an actual word.
+
+  Expects the candidate word as the first argument. Checks the offline word
+  index, if any, and then the online dictionary to determine the result. Both
+  known (200) and unknown (404) answers are cached; errors are not.
+  """
+  if not args:
+    print(
+        "Error: get_is_known_word expects at least one argument (candidate"
+        " word)."
+    )
+    return False
+  candidate = args[0]
+
+  is_known = callable_functions._offline_is_known(candidate)
+  if is_known is not None:
+    return is_known
+
+  # With WORD_CACHE_DB set, the cache reads and writes sqlite, which can wait
+  # on a lock held by another process; so do it off the event loop.
+  is_known = await asyncio.to_thread(
+      callable_functions._cached_is_known, candidate
+  )
+  if is_known is not None:
+    return is_known
+
+  url = callable_functions._dictionary_url(candidate)
+
+  try:
+    response = await _get(rate_limit.DICTIONARY, url)
+
+    if response.status_code == 200:
+      await asyncio.to_thread(
+          callable_functions._remember_is_known, candidate, True
+      )
+      return True
+    elif response.status_code == 404:
+      await asyncio.to_thread(
+          callable_functions._remember_is_known, candidate, False
+      )
+      return False
+    else:
+      print(
+          f"Unexpected status code {response.status_code} for word"
+          f" '{candidate}': {response.text}"
+      )
+      response.raise_for_status()
+
+  except circuit_breaker.CircuitOpenError as e:
+    print(f"Not checking word '{candidate}': {e}")
+    return {"error": str(e)}
+  except httpx.HTTPError as e:
+    print(f"An error occurred while checking word '{candidate}': {e}")
+    return False
+  return False
+
+
+KNOWN_FUNCTIONS = {
+    "get_min_scrabble_word_score": get_min_scrabble_word_score,
+    "get_is_known_word": get_is_known_word,
+    "get_weather_forecast": get_weather_forecast,
+}
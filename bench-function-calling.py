@@ -0,0 +1,308 @@
+"""Benchmark - the function calling loop, end to end, on local stand-ins."""
+
+# /// script
+# requires-python = ">=3.13"
+# dependencies = ["requests", "python-dotenv"]
+# ///
+
+# Copyright © 2025-2026 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# This starts the stand-ins from local_standins.py, points every base URL at
+# them, and runs the batch mode of test2-gemini-function-calling.py. It then
+# reports the latency of each model call, of the tools in each iteration, of
+# each individual tool call, and of whole sessions. With --output the summary
+# is saved as JSON; a later run with --baseline compares against it, and exits
+# with status 1 if any median or p90 got slower by more than --tolerance.
+
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+
+import context_cache
+import local_standins
+import memo
+import rate_limit
+import tool_dispatch
+import tracing
+
+DEFAULT_LATENCY = "gemini=0.2,tomtom=0.03,weather=0.05,dictionary=0.03"
+MIN_REGRESSION_MS = 1.0
+
+
+def _percentile(sorted_values, fraction):
+  """Returns the nearest-rank percentile of an already sorted list."""
+  rank = round(fraction * len(sorted_values)) - 1
+  return sorted_values[max(0, min(len(sorted_values) - 1, rank))]
+
+
+def summarize(samples):
+  """Returns count, mean and percentiles, in milliseconds, for each metric."""
+  summary = {}
+  for metric, values in sorted(samples.items()):
+    if not values:
+      continue
+    values = sorted(values)
+    summary[metric] = {
+        "count": len(values),
+        "mean_ms": 1000 * sum(values) / len(values),
+        "p50_ms": 1000 * _percentile(values, 0.50),
+        "p90_ms": 1000 * _percentile(values, 0.90),
+        "p99_ms": 1000 * _percentile(values, 0.99),
+        "max_ms": 1000 * values[-1],
+    }
+  return summary
+
+
+def collect_samples(session_results):
+  """Gathers the timings in the session results into one list per metric."""
+  samples = {"session": [], "model_call": [], "tools_per_iteration": []}
+  for session_result in session_results:
+    samples["session"].append(session_result["wall_seconds"])
+    for timing in session_result["iteration_timings"]:
+      samples["model_call"].append(timing["model_seconds"])
+      if "first_chunk_seconds" in timing:
+        samples.setdefault("model_first_chunk", []).append(
+            timing["first_chunk_seconds"]
+        )
+      if "tool_timings" in timing:
+        samples["tools_per_iteration"].append(timing["tools_seconds"])
+        for tool_timing in timing["tool_timings"]:
+          samples.setdefault(f"tool:{tool_timing['name']}", []).append(
+              tool_timing["seconds"]
+          )
+  return samples
+
+
+def print_summary(summary, baseline=None, tolerance=0.1):
+  """Prints the summary table, and returns the metrics that regressed."""
+  regressions = []
+  print(
+      f"{'metric':<40} {'count':>6} {'mean':>9} {'p50':>9} {'p90':>9}"
+      f" {'p99':>9} {'max':>9}  (ms)"
+  )
+  for metric, stats in summary.items():
+    flag = ""
+    if baseline and metric in baseline:
+      for key in ("p50_ms", "p90_ms"):
+        before = baseline[metric][key]
+        # Sub-millisecond differences are noise, whatever the ratio.
+        slower = stats[key] > before * (1 + tolerance)
+        if slower and stats[key] - before >= MIN_REGRESSION_MS:
+          regressions.append(
+              f"{metric} {key}: {before:.1f} -> {stats[key]:.1f}"
+          )
+          flag = "  REGRESSION"
+    print(
+        f"{metric:<40} {stats['count']:>6} {stats['mean_ms']:>9.1f}"
+        f" {stats['p50_ms']:>9.1f} {stats['p90_ms']:>9.1f}"
+        f" {stats['p99_ms']:>9.1f} {stats['max_ms']:>9.1f}{flag}"
+    )
+  return regressions
+
+
+def load_test2():
+  """Imports test2-gemini-function-calling.py, whose name is not a module."""
+  spec = importlib.util.spec_from_file_location(
+      "test2_gemini_function_calling", "test2-gemini-function-calling.py"
+  )
+  module = importlib.util.module_from_spec(spec)
+  spec.loader.exec_module(module)
+  return module
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(
+      description=(
+          "Benchmarks the function calling loop against local stand-ins for"
+          " all the upstream services."
+      )
+  )
+  parser.add_argument("--sessions", type=int, default=40)
+  parser.add_argument("--concurrency", type=int, default=4)
+  parser.add_argument("--tool-workers", type=int, default=1)
+  parser.add_argument(
+      "--stream",
+      action="store_true",
+      help="Use streamGenerateContent, with early tool dispatch.",
+  )
+  parser.add_argument(
+      "--context-cache",
+      action="store_true",
+      help="Send the tools as cached content, through the cachedContents API.",
+  )
+  parser.add_argument(
+      "--speculate",
+      action="store_true",
+      help="Start the likely function calls before the model asks for them.",
+  )
+  parser.add_argument(
+      "--filter",
+      type=str,
+      help="Filter payload files by a string contained in their filename.",
+  )
+  parser.add_argument(
+      "--latency",
+      type=str,
+      default=DEFAULT_LATENCY,
+      help=f"Per-request delay of each stand-in (default {DEFAULT_LATENCY}).",
+  )
+  parser.add_argument(
+      "--gemini-quota",
+      type=int,
+      default=0,
+      help=(
+          "Model calls per second the Gemini stand-in accepts before it"
+          " answers 429 (default: no limit)."
+      ),
+  )
+  parser.add_argument(
+      "--trace",
+      type=str,
+      metavar="FILE",
+      help=(
+          "Also trace every stage, and write the spans to FILE (.jsonl for JSON"
+          " lines, otherwise the Chrome trace-event format)."
+      ),
+  )
+  parser.add_argument(
+      "--output", type=str, help="Save the summary to this JSON file."
+  )
+  parser.add_argument(
+      "--baseline",
+      type=str,
+      help="Compare against a summary saved earlier with --output.",
+  )
+  parser.add_argument(
+      "--tolerance",
+      type=float,
+      default=0.10,
+      help="Allowed slowdown against the baseline (default 0.10 = 10%%).",
+  )
+  args = parser.parse_args()
+
+  standins = local_standins.Standins(
+      local_standins.parse_latency(args.latency),
+      gemini_quota=args.gemini_quota,
+  )
+  # Point everything at the stand-ins, even if .env says otherwise.
+  os.environ.update(standins.environment())
+  test2 = load_test2()
+  if args.trace:
+    tracing.enable()
+  shared_context_cache = None
+  if args.context_cache:
+    shared_context_cache = context_cache.ContextCache(
+        test2.BASE_API_URL, test2.TEXT_MODEL_NAME, os.environ["GEMINI_APIKEY"]
+    )
+
+  with tempfile.TemporaryDirectory() as temp_dir:
+    results_path = os.path.join(temp_dir, "results.jsonl")
+    start_time = time.perf_counter()
+    # The loop narrates every step; keep that out of the report.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+      session_results = test2.run_batch(
+          os.environ["GEMINI_APIKEY"],
+          args.sessions,
+          args.concurrency,
+          results_path,
+          filename_filter=args.filter,
+          tool_workers=args.tool_workers,
+          stream=args.stream,
+          context_cache=shared_context_cache,
+          speculate=args.speculate,
+      )
+    elapsed_seconds = time.perf_counter() - start_time
+  standins.stop()
+
+  failed = [r for r in session_results if r["error"]]
+  print(
+      f"{len(session_results)} session(s), {len(failed)} failed, in"
+      f" {elapsed_seconds:.2f}s ({len(session_results) / elapsed_seconds:.2f}"
+      " sessions/s)"
+  )
+  retries = sum(r["retries"]["retries"] for r in session_results)
+  if retries:
+    waited_seconds = sum(
+        r["retries"]["waited_seconds"] for r in session_results
+    )
+    print(
+        f"{retries} model call(s) retried, after {waited_seconds:.1f}s of waits"
+    )
+  total_tokens = sum(r["usage"]["total_tokens"] for r in session_results)
+  prompt_tokens = sum(r["usage"]["prompt_tokens"] for r in session_results)
+  print(
+      f"{total_tokens} tokens ({prompt_tokens} prompt),"
+      f" {total_tokens / elapsed_seconds:.0f} tokens/s"
+  )
+  coalescing = tool_dispatch.get_coalescing_stats()
+  if coalescing["calls"]:
+    print(
+        f"{coalescing['coalesced']} of {coalescing['calls']} tool calls"
+        f" coalesced ({coalescing['dedup_ratio']:.0%})"
+    )
+  memo_stats = memo.get_stats()
+  if memo_stats and memo_stats["hits"] + memo_stats["misses"]:
+    print(
+        f"{memo_stats['hits']} memoized tool results reused,"
+        f" {memo_stats['misses']} computed"
+    )
+  rate_limits = rate_limit.get_stats()
+  for upstream, limit in rate_limits.items():
+    print(
+        f"Rate limit {upstream}: {limit['waits']} of {limit['acquired']}"
+        f" requests waited, {limit['waited_seconds']:.1f}s in all"
+    )
+  print(f"Stand-in latency: {args.latency}\n")
+
+  summary = summarize(collect_samples(session_results))
+  baseline = None
+  if args.baseline:
+    with open(args.baseline, "r") as f:
+      baseline = json.load(f)["metrics"]
+  regressions = print_summary(summary, baseline, args.tolerance)
+
+  if args.trace:
+    tracing.print_summary()
+    tracing.write(args.trace)
+    print(f"Trace written to {args.trace}")
+
+  if args.output:
+    with open(args.output, "w") as f:
+      json.dump(
+          {
+              "settings": vars(args),
+              "sessions_per_second": len(session_results) / elapsed_seconds,
+              "tokens_per_second": total_tokens / elapsed_seconds,
+              "coalescing": coalescing,
+              "memo": memo_stats,
+              "rate_limits": rate_limits,
+              "metrics": summary,
+          },
+          f,
+          indent=2,
+      )
+    print(f"\nSummary written to {args.output}")
+
+  if regressions:
+    print("\nRegressions against the baseline:")
+    for regression in regressions:
+      print(f"  {regression}")
+    sys.exit(1)
@@ -0,0 +1,120 @@
+"""Benchmark - compiled placeholder templates versus replacing one at a time."""
+
+# /// script
+# requires-python = ">=3.13"
+# ///
+
+# Copyright © 2025-2026 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import argparse
+import random
+import time
+
+import text_utils
+
+
+def replace_by_rescanning(text_content, replacements_map):
+  """The earlier algorithm: one str.replace(..., 1) per placeholder."""
+  for placeholder, word_list in replacements_map.items():
+    available_words_for_this_key = []
+    while placeholder in text_content:
+      if not available_words_for_this_key:
+        if not word_list:
+          break
+        available_words_for_this_key = list(word_list)
+        random.shuffle(available_words_for_this_key)
+      replacement_word = available_words_for_this_key.pop()
+      text_content = text_content.replace(placeholder, replacement_word, 1)
+  return text_content
+
+
+def make_template(placeholders, seed):
+  """Returns a JSON-like text with the given number of placeholders."""
+  rng = random.Random(seed)
+  keys = list(text_utils.REPLACEMENTS)
+  lines = ['{"contents": [{"role": "user", "parts": [']
+  for number in range(placeholders):
+    lines.append(
+        f'  {{"text": "Item {number}: what about {rng.choice(keys)} today?"}},'
+    )
+  lines.append("]}]}")
+  return "\n".join(lines)
+
+
+def check_sampling(replacements_map, occurrences):
+  """Verifies that each key's words never repeat until all have been used."""
+  placeholders = [p for p in replacements_map for _ in range(occurrences)]
+  template = text_utils.Template("|".join(placeholders), replacements_map)
+  values = template.fill(replacements_map).split("|")
+  start = 0
+  for placeholder, word_list in replacements_map.items():
+    filled = values[start : start + occurrences]
+    start += occurrences
+    for offset in range(0, occurrences, len(word_list)):
+      window = filled[offset : offset + len(word_list)]
+      if len(set(window)) != len(window):
+        raise SystemExit(f"Words for {placeholder} repeat within one round!")
+
+
+def best_of(repeats, fn):
+  """Returns the fastest of several timed runs."""
+  best = None
+  for _ in range(repeats):
+    start_time = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start_time
+    best = elapsed if best is None else min(best, elapsed)
+  return best
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(
+      description=(
+          "Compares text_utils.Template with replacing each placeholder by"
+          " rescanning the text."
+      )
+  )
+  parser.add_argument(
+      "--placeholders",
+      type=int,
+      default=5000,
+      help="The number of placeholders in the template.",
+  )
+  parser.add_argument(
+      "--repeats", type=int, default=3, help="Runs per variant; best is kept."
+  )
+  parser.add_argument("--seed", type=int, default=1, help="Random seed.")
+  args = parser.parse_args()
+
+  check_sampling(text_utils.REPLACEMENTS, 200)
+
+  text = make_template(args.placeholders, args.seed)
+  replacements = text_utils.REPLACEMENTS
+
+  rescan_seconds = best_of(
+      args.repeats, lambda: replace_by_rescanning(text, replacements)
+  )
+  compile_seconds = best_of(
+      args.repeats, lambda: text_utils.Template(text, replacements)
+  )
+  template = text_utils.Template(text, replacements)
+  fill_seconds = best_of(args.repeats, lambda: template.fill(replacements))
+
+  print(f"template: {len(text):,} chars, {len(template):,} placeholders")
+  print(f"rescan:   {rescan_seconds * 1000:.2f} ms")
+  print(f"compile:  {compile_seconds * 1000:.2f} ms (once per template)")
+  print(f"fill:     {fill_seconds * 1000:.2f} ms")
+  print(f"speedup:  {rescan_seconds / fill_seconds:.1f}x per fill")
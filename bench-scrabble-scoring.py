@@ -0,0 +1,100 @@
+"""Benchmark - batch Scrabble scoring versus the one-word-at-a-time function."""
+
+# /// script
+# requires-python = ">=3.13"
+# dependencies = ["numpy", "requests"]
+# ///
+
+# Copyright © 2025-2026 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import argparse
+import random
+import string
+import time
+
+from callable_functions import get_min_scrabble_word_score
+from scrabble_scoring import score_words
+import text_utils
+
+
+def make_words(count, seed):
+  """Returns a mix of the sample words and random ASCII and non-ASCII words."""
+  rng = random.Random(seed)
+  alphabet = string.ascii_letters + "-' "
+  words = []
+  for _ in range(count):
+    choice = rng.random()
+    if choice < 0.5:
+      words.append(rng.choice(text_utils.ENGLISH_WORDS))
+    elif choice < 0.99:
+      words.append(
+          "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 15)))
+      )
+    else:
+      words.append(rng.choice(["naïve", "café", "Zürich", "ınk"]))
+  return words
+
+
+def best_of(repeats, fn):
+  """Returns the fastest of several timed runs, and the last result."""
+  best = None
+  result = None
+  for _ in range(repeats):
+    start_time = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start_time
+    best = elapsed if best is None else min(best, elapsed)
+  return best, result
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(
+      description=(
+          "Compares score_words() with calling get_min_scrabble_word_score()"
+          " once per word."
+      )
+  )
+  parser.add_argument(
+      "--words", type=int, default=1_000_000, help="The number of words."
+  )
+  parser.add_argument(
+      "--repeats", type=int, default=3, help="Runs per variant; best is kept."
+  )
+  parser.add_argument("--seed", type=int, default=1, help="Random seed.")
+  args = parser.parse_args()
+
+  words = make_words(args.words, args.seed)
+
+  scalar_seconds, scalar_scores = best_of(
+      args.repeats, lambda: [get_min_scrabble_word_score(w) for w in words]
+  )
+  batch_seconds, batch_scores = best_of(
+      args.repeats, lambda: score_words(words)
+  )
+
+  if batch_scores.tolist() != scalar_scores:
+    raise SystemExit("Batch and scalar scores differ!")
+
+  print(f"words:  {len(words):,}")
+  print(
+      f"scalar: {scalar_seconds:.3f}s"
+      f" ({len(words) / scalar_seconds:,.0f} words/s)"
+  )
+  print(
+      f"batch:  {batch_seconds:.3f}s"
+      f" ({len(words) / batch_seconds:,.0f} words/s)"
+  )
+  print(f"speedup: {scalar_seconds / batch_seconds:.1f}x")
@@ -0,0 +1,497 @@
+"""Small caches used by the callable functions."""
+
+# Copyright © 2025-2026 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import atexit
+import collections
+import contextlib
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+
+try:
+  import fcntl
+except ImportError:  # not on Windows; MmapTTLStore needs it
+  fcntl = None
+
+# How long the changes to a TTLCache with a file may wait to be written.
+DEFAULT_FLUSH_SECONDS = 2.0
+
+
+class TTLCache:
+  """A thread-safe LRU cache whose entries also expire after a TTL.
+
+  Keys are strings, values anything JSON-serializable. If a filename is given,
+  the cache loads its entries from that file when constructed, and writes its
+  changes back in the background, at most once every `flush_seconds`, and at
+  exit. Each write merges with what is in the file by then, so processes that
+  share the file keep each other's entries. Expiry times are wall-clock times
+  for that reason.
+  """
+
+  def __init__(
+      self,
+      max_entries,
+      ttl_seconds,
+      filename=None,
+      flush_seconds=DEFAULT_FLUSH_SECONDS,
+  ):
+    """Creates the cache.
+
+    Args:
+      max_entries: the number of entries to keep before evicting the least
+        recently used one.
+      ttl_seconds: the default lifetime of an entry, or None for no expiry.
+      filename: optional path of a JSON file to persist the entries in.
+      flush_seconds: how long changes may wait before they are written to the
+        file; 0 writes them at once, on the caller's thread.
+    """
+    self.max_entries = max_entries
+    self.ttl_seconds = ttl_seconds
+    self.filename = filename
+    self.flush_seconds = flush_seconds
+    self._lock = threading.Lock()
+    # key -> (expires_at or None, value), least recently used first.
+    self._entries = collections.OrderedDict()
+    # Changes not yet in the file: keys deleted since the last flush, and
+    # whether the cache was cleared, so that merging does not bring them back.
+    self._dirty = False
+    self._deleted = set()
+    self._cleared = False
+    self._flush_lock = threading.Lock()
+    self._timer = None
+    if filename:
+      with self._locked_file():
+        self._entries.update(self._read_file())
+      atexit.register(self.flush)
+
+  def get(self, key, default=None):
+    """Returns the live value for key, or default if missing or expired."""
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        return default
+      expires_at, value = entry
+      if expires_at is not None and expires_at <= time.time():
+        del self._entries[key]
+        return default
+      self._entries.move_to_end(key)
+      return value
+
+  def set(self, key, value, ttl_seconds=None):
+    """Stores value under key.
+
+    Args:
+      key: the cache key.
+      value: the value to store.
+      ttl_seconds: optional lifetime for this entry, overriding the default.
+    """
+    ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+    expires_at = None if ttl is None else time.time() + ttl
+    with self._lock:
+      self._entries[key] = (expires_at, value)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+      self._deleted.discard(key)
+      flush_now = self._changed()
+    if flush_now:
+      self.flush()
+
+  def delete(self, key):
+    """Removes key from the cache, if present."""
+    with self._lock:
+      self._entries.pop(key, None)
+      self._deleted.add(key)
+      flush_now = self._changed()
+    if flush_now:
+      self.flush()
+
+  def clear(self):
+    """Removes every entry."""
+    with self._lock:
+      self._entries.clear()
+      self._deleted.clear()
+      self._cleared = True
+      flush_now = self._changed()
+    if flush_now:
+      self.flush()
+
+  def __len__(self):
+    with self._lock:
+      return len(self._entries)
+
+  def _changed(self):
+    """Schedules a flush; call with self._lock held.
+
+    Returns:
+      True if the caller should flush now, once it has released the lock.
+    """
+    if not self.filename:
+      return False
+    self._dirty = True
+    if self.flush_seconds <= 0:
+      return True
+    if self._timer is None:
+      self._timer = threading.Timer(self.flush_seconds, self.flush)
+      self._timer.daemon = True
+      self._timer.start()
+    return False
+
+  def flush(self):
+    """Writes the changes since the last flush to the file, if any.
+
+    The entries in the file that this cache neither has nor deleted are kept,
+    and loaded into the cache too.
+    """
+    if not self.filename:
+      return
+    with self._flush_lock:
+      with self._lock:
+        if self._timer is not None:
+          self._timer.cancel()
+          self._timer = None
+        if not self._dirty:
+          return
+        entries = list(self._entries.items())
+        deleted, self._deleted = self._deleted, set()
+        cleared, self._cleared = self._cleared, False
+        self._dirty = False
+      with self._locked_file():
+        merged = collections.OrderedDict()
+        if not cleared:
+          merged.update(
+              (key, entry)
+              for key, entry in self._read_file().items()
+              if key not in deleted
+          )
+        ours = dict(entries)
+        theirs = [(k, e) for k, e in merged.items() if k not in ours]
+        for key, entry in entries:
+          merged[key] = entry
+          merged.move_to_end(key)
+        while len(merged) > self.max_entries:
+          merged.popitem(last=False)
+        self._write_file(merged)
+      with self._lock:
+        for key, entry in theirs:
+          if key not in self._entries and len(self._entries) < self.max_entries:
+            self._entries[key] = entry
+            self._entries.move_to_end(key, last=False)
+
+  @contextlib.contextmanager
+  def _locked_file(self):
+    """Holds a lock on the file, across processes where fcntl exists."""
+    if fcntl is None:
+      yield
+      return
+    try:
+      lock_fd = os.open(self.filename + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+    except OSError:
+      yield
+      return
+    try:
+      fcntl.flock(lock_fd, fcntl.LOCK_EX)
+      yield
+    finally:
+      os.close(lock_fd)  # releases the lock
+
+  def _read_file(self):
+    """Returns the live entries in the file, least recently used first."""
+    try:
+      with open(self.filename, "r") as f:
+        stored = json.load(f)
+    except FileNotFoundError:
+      return {}
+    except (OSError, json.JSONDecodeError) as e:
+      print(f"Ignoring unreadable cache file '{self.filename}': {e}")
+      return {}
+    now = time.time()
+    return collections.OrderedDict(
+        (key, (expires_at, value))
+        for key, expires_at, value in stored[-self.max_entries :]
+        if expires_at is None or expires_at > now
+    )
+
+  def _write_file(self, entries):
+    # Write to a temp file and rename it, so a crash never leaves a partial
+    # file behind for the next process to load.
+    stored = [
+        [key, expires_at, value] for key, (expires_at, value) in entries.items()
+    ]
+    directory = os.path.dirname(os.path.abspath(self.filename))
+    try:
+      fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+      with os.fdopen(fd, "w") as f:
+        json.dump(stored, f)
+      os.replace(temp_path, self.filename)
+    except OSError as e:
+      print(f"Could not write cache file '{self.filename}': {e}")
+
+
+class SqliteTTLStore:
+  """A TTL key/value store in a sqlite file, shared between processes.
+
+  It has the same get/set/delete interface as TTLCache. Values are stored as
+  JSON. Each thread uses its own connection, and the database runs in WAL
+  mode so that readers in other processes are not blocked by a writer.
+  """
+
+  def __init__(self, filename, table="cache", ttl_seconds=None):
+    """Creates the store, and its table if needed.
+
+    Args:
+      filename: the path of the sqlite database file.
+      table: the name of the table to keep the entries in.
+      ttl_seconds: the default lifetime of an entry, or None for no expiry.
+    """
+    if not table.isidentifier():
+      raise ValueError(f"Invalid table name: {table!r}")
+    self.filename = filename
+    self.table = table
+    self.ttl_seconds = ttl_seconds
+    self._local = threading.local()
+    with self._connection() as conn:
+      conn.execute(
+          f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY,"
+          " expires_at REAL, value TEXT NOT NULL)"
+      )
+
+  def _connection(self):
+    conn = getattr(self._local, "conn", None)
+    if conn is None:
+      conn = sqlite3.connect(self.filename, timeout=30)
+      conn.execute("PRAGMA journal_mode=WAL")
+      conn.execute("PRAGMA synchronous=NORMAL")
+      self._local.conn = conn
+    return conn
+
+  def get_with_expiry(self, key):
+    """Returns (value, expires_at) for a live entry, or (None, None)."""
+    row = (
+        self._connection()
+        .execute(
+            f"SELECT value, expires_at FROM {self.table} WHERE key = ? AND"
+            " (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        )
+        .fetchone()
+    )
+    if row is None:
+      return None, None
+    return json.loads(row[0]), row[1]
+
+  def get(self, key, default=None):
+    """Returns the live value for key, or default if missing or expired."""
+    value, _ = self.get_with_expiry(key)
+    return default if value is None else value
+
+  def set(self, key, value, ttl_seconds=None):
+    """Stores value under key, with an optional lifetime override."""
+    ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+    expires_at = None if ttl is None else time.time() + ttl
+    with self._connection() as conn:
+      conn.execute(
+          f"INSERT OR REPLACE INTO {self.table} (key, expires_at, value)"
+          " VALUES (?, ?, ?)",
+          (key, expires_at, json.dumps(value)),
+      )
+
+  def delete(self, key):
+    """Removes key from the store, if present."""
+    with self._connection() as conn:
+      conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+  def clear(self):
+    """Removes every entry."""
+    with self._connection() as conn:
+      conn.execute(f"DELETE FROM {self.table}")
+
+
+class MmapTTLStore:
+  """A TTL key/value table in a memory-mapped file, shared between processes.
+
+  It has the same get/set/delete interface as TTLCache. The file holds a fixed
+  number of slots of a fixed size. A key may live in any of a few slots after
+  the one its hash points to; when those are all taken by other live entries,
+  a new entry replaces the one in the first slot. Values are stored as JSON,
+  and a value too large for a slot is not stored at all. Readers hold a shared
+  lock on the file, and writers an exclusive one. POSIX only.
+  """
+
+  # Each slot: the key's digest, its expiry (inf for none), the JSON length.
+  _SLOT_HEADER = struct.Struct("<16sdI")
+  _PROBES = 4
+
+  def __init__(self, filename, slots=4096, slot_size=256, ttl_seconds=None):
+    """Opens the file, creating and sizing it if needed.
+
+    Args:
+      filename: the path of the file.
+      slots: the number of entries the file can hold.
+      slot_size: the bytes per slot; values must fit, with a small header.
+      ttl_seconds: the default lifetime of an entry, or None for no expiry.
+    """
+    if fcntl is None:
+      raise OSError("MmapTTLStore needs fcntl, which this platform lacks.")
+    if slot_size <= self._SLOT_HEADER.size:
+      raise ValueError(f"slot_size must exceed {self._SLOT_HEADER.size}.")
+    self.filename = filename
+    self.slots = slots
+    self.slot_size = slot_size
+    self.ttl_seconds = ttl_seconds
+    size = slots * slot_size
+    self._fd = os.open(filename, os.O_RDWR | os.O_CREAT, 0o644)
+    fcntl.flock(self._fd, fcntl.LOCK_EX)
+    try:
+      if os.fstat(self._fd).st_size != size:
+        # A file made with other dimensions holds nothing usable.
+        os.ftruncate(self._fd, 0)
+        os.ftruncate(self._fd, size)
+    finally:
+      fcntl.flock(self._fd, fcntl.LOCK_UN)
+    self._map = mmap.mmap(self._fd, size)
+    # flock does not exclude threads sharing this descriptor.
+    self._lock = threading.Lock()
+
+  def _digest(self, key):
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+  def _offsets(self, digest):
+    first = int.from_bytes(digest[:8], "little") % self.slots
+    return [
+        ((first + probe) % self.slots) * self.slot_size
+        for probe in range(self._PROBES)
+    ]
+
+  @contextlib.contextmanager
+  def _locked(self, operation):
+    """Holds the thread lock and the file lock, LOCK_SH or LOCK_EX."""
+    with self._lock:
+      fcntl.flock(self._fd, operation)
+      try:
+        yield
+      finally:
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+  def get_with_expiry(self, key):
+    """Returns (value, expires_at) for a live entry, or (None, None)."""
+    digest = self._digest(key)
+    now = time.time()
+    with self._locked(fcntl.LOCK_SH):
+      for offset in self._offsets(digest):
+        slot_digest, expires_at, length = self._SLOT_HEADER.unpack_from(
+            self._map, offset
+        )
+        if slot_digest == digest and length and expires_at > now:
+          start = offset + self._SLOT_HEADER.size
+          data = self._map[start : start + length]
+          break
+      else:
+        return None, None
+    return json.loads(data), (
+        None if expires_at == float("inf") else expires_at
+    )
+
+  def get(self, key, default=None):
+    """Returns the live value for key, or default if missing or expired."""
+    value, _ = self.get_with_expiry(key)
+    return default if value is None else value
+
+  def set(self, key, value, ttl_seconds=None):
+    """Stores value under key, with an optional lifetime override."""
+    data = json.dumps(value, separators=(",", ":")).encode("utf-8")
+    if len(data) > self.slot_size - self._SLOT_HEADER.size:
+      return
+    ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+    expires_at = float("inf") if ttl is None else time.time() + ttl
+    digest = self._digest(key)
+    offsets = self._offsets(digest)
+    now = time.time()
+    with self._locked(fcntl.LOCK_EX):
+      target = offsets[0]
+      for offset in offsets:
+        slot_digest, slot_expires_at, length = self._SLOT_HEADER.unpack_from(
+            self._map, offset
+        )
+        if slot_digest == digest or not length or slot_expires_at <= now:
+          target = offset
+          break
+      start = target + self._SLOT_HEADER.size
+      self._map[start : start + len(data)] = data
+      self._SLOT_HEADER.pack_into(
+          self._map, target, digest, expires_at, len(data)
+      )
+
+  def delete(self, key):
+    """Removes key from the store, if present."""
+    digest = self._digest(key)
+    with self._locked(fcntl.LOCK_EX):
+      for offset in self._offsets(digest):
+        if self._SLOT_HEADER.unpack_from(self._map, offset)[0] == digest:
+          self._SLOT_HEADER.pack_into(self._map, offset, bytes(16), 0.0, 0)
+
+  def clear(self):
+    """Removes every entry."""
+    with self._locked(fcntl.LOCK_EX):
+      self._map[:] = bytes(len(self._map))
+
+  def close(self):
+    """Unmaps and closes the file."""
+    self._map.close()
+    os.close(self._fd)
+
+
+class TieredCache:
+  """A TTLCache in front of a SqliteTTLStore.
+
+  Reads check memory first. Writes go to both, so other processes sharing the
+  sqlite file see them, and misses in memory are filled from sqlite with the
+  lifetime the entry has left.
+  """
+
+  def __init__(self, front, back):
+    self.front = front
+    self.back = back
+
+  def get(self, key, default=None):
+    value = self.front.get(key)
+    if value is not None:
+      return value
+    value, expires_at = self.back.get_with_expiry(key)
+    if value is None:
+      return default
+    ttl = None if expires_at is None else max(0, expires_at - time.time())
+    self.front.set(key, value, ttl_seconds=ttl)
+    return value
+
+  def set(self, key, value, ttl_seconds=None):
+    self.front.set(key, value, ttl_seconds=ttl_seconds)
+    self.back.set(key, value, ttl_seconds=ttl_seconds)
+
+  def delete(self, key):
+    self.front.delete(key)
+    self.back.delete(key)
+
+  def clear(self):
+    self.front.clear()
+    self.back.clear()
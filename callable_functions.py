@@ -17,12 +17,46 @@
 
 import json
 import os
+import threading
 
+import caches
+import circuit_breaker
+import http_cache
+import http_sessions
+import rate_limit
 import requests
+import tracing
+import word_index
 
 TOMTOM_BASE_URL = "https://api.tomtom.com"
 WEATHER_GOV_BASE_URL = "https://api.weather.gov"
 WEATHER_GOV_USER_AGENT = "python test_gemini"
+DICTIONARY_BASE_URL = "https://api.dictionaryapi.dev"
+
+DEFAULT_GEOCODE_CACHE_SIZE = 1024
+DEFAULT_GEOCODE_CACHE_TTL = 30 * 24 * 60 * 60  # coordinates do not move
+DEFAULT_POINTS_CACHE_SIZE = 4096
+DEFAULT_POINTS_CACHE_TTL = 7 * 24 * 60 * 60  # grid cells rarely change
+DEFAULT_FORECAST_CACHE_SIZE = 1024
+DEFAULT_FORECAST_CACHE_TTL = 24 * 60 * 60  # how long to keep stale forecasts
+DEFAULT_WORD_CACHE_SIZE = 4096
+DEFAULT_WORD_CACHE_KNOWN_TTL = 30 * 24 * 60 * 60
+DEFAULT_WORD_CACHE_UNKNOWN_TTL = 24 * 60 * 60  # dictionaries do grow
+
+_caches_lock = threading.Lock()
+_caches = {}
+_word_index = None
+_word_index_loaded = False
+
+
+def get_base_url(name):
+  """Returns the base URL for an upstream service.
+
+  An environment variable with the same name as the module constant, for
+  example TOMTOM_BASE_URL, overrides the default; the local stand-ins in
+  local_standins.py rely on that.
+  """
+  return os.environ.get(name, globals()[name]).rstrip("/")
 
 
 def get_tomtom_key():
@@ -32,6 +66,37 @@ def get_tomtom_key():
   return os.environ.get("TOMTOM_APIKEY", "-unset-")
 
 
+FORECAST_KEYS_TO_KEEP = [
+    "name",
+    "temperature",
+    "temperatureUnit",
+    "probabilityOfPrecipitation",
+    "shortForecast",
+    "detailedForecast",
+]
+
+
+def _http_get(upstream, url, **kwargs):
+  """Sends a GET on the pooled keep-alive session for the url's host.
+
+  Waits first, if need be, for the rate limit of the upstream; see
+  rate_limit.py. The request has the connect and read timeouts of
+  http_sessions.get_timeout(), and goes through the circuit breaker of the
+  host; see circuit_breaker.py.
+
+  Raises:
+    requests.exceptions.RequestException: if the request fails, times out,
+      or the host's breaker is open (circuit_breaker.CircuitOpenError).
+  """
+  kwargs.setdefault("timeout", http_sessions.get_timeout())
+
+  def send():
+    rate_limit.acquire(upstream)
+    return http_sessions.get_session(url).get(url, **kwargs)
+
+  return circuit_breaker.get_breaker(url).call(send)
+
+
 def get_weather_forecast(*args):
   """Fetches weather forecast for a given placename.
 
@@ -57,61 +122,249 @@ def get_weather_forecast(*args):
     }
 
   # 1. Get Lat/Lon from TomTom
-  geocode_url = f"{TOMTOM_BASE_URL}/search/2/geocode/{requests.utils.quote(placename)}.json?key={tomtom_key}"
-  latitude = None
-  longitude = None
+  with tracing.span("weather.geocode"):
+    position, error = _geocode_placename(placename, tomtom_key)
+  if error:
+    return error
+  latitude, longitude = position
 
-  try:
-    print(f"Fetching geocode for '{placename}' from TomTom...")
-    response_geocode = requests.get(geocode_url)
-    response_geocode.raise_for_status()
-    geocode_data = response_geocode.json()
+  # 2. Get Weather.gov forecast office URL
+  with tracing.span("weather.points"):
+    forecast_grid_data_url, error = _get_forecast_url(latitude, longitude)
+  if error:
+    return error
+
+  # 3. Get actual forecast
+  with tracing.span("weather.forecast"):
+    return _get_forecast(forecast_grid_data_url, placename)
+
+
+def _geocode_url(placename, tomtom_key):
+  return f"{get_base_url('TOMTOM_BASE_URL')}/search/2/geocode/{requests.utils.quote(placename)}.json?key={tomtom_key}"
+
+
+def _position_from_geocode_data(geocode_data, placename):
+  """Extracts (lat, lon) from a TomTom geocode response.
+
+  Returns:
+    ((latitude, longitude), None) on success, or (None, error_dict).
+  """
+  if not geocode_data.get("results"):
+    error_msg = f"No geocoding results found for '{placename}'."
+    print(error_msg)
+    return None, {"error": error_msg}
+
+  position = geocode_data["results"][0].get("position")
+  if not position or "lat" not in position or "lon" not in position:
+    error_msg = (
+        f"Could not extract lat/lon from TomTom response for '{placename}'."
+    )
+    print(error_msg)
+    return None, {"error": error_msg}
+
+  print(f"Got lat/lon: {position['lat']}, {position['lon']}")
+  return (position["lat"], position["lon"]), None
+
+
+def _get_cache(prefix, default_size, default_ttl):
+  """Returns the named cache, configured from the environment on first use.
+
+  For a prefix like GEOCODE_CACHE, the settings are GEOCODE_CACHE_SIZE (the
+  number of entries), GEOCODE_CACHE_TTL (seconds to keep an entry) and
+  GEOCODE_CACHE_FILE (an optional JSON file that persists the cache).
+  """
+  # Read lazily, because the main module calls load_dotenv() after this module
+  # is imported.
+  cache = _caches.get(prefix)
+  if cache is None:
+    with _caches_lock:
+      cache = _caches.get(prefix)
+      if cache is None:
+        cache = caches.TTLCache(
+            int(os.environ.get(f"{prefix}_SIZE", default_size)),
+            float(os.environ.get(f"{prefix}_TTL", default_ttl)),
+            filename=os.environ.get(f"{prefix}_FILE") or None,
+        )
+        _caches[prefix] = cache
+  return cache
 
-    if not geocode_data.get("results"):
-      error_msg = f"No geocoding results found for '{placename}'."
-      print(error_msg)
-      return {"error": error_msg}
 
-    position = geocode_data["results"][0].get("position")
-    if not position or "lat" not in position or "lon" not in position:
-      error_msg = (
-          f"Could not extract lat/lon from TomTom response for '{placename}'."
+def _get_geocode_cache():
+  return _get_cache(
+      "GEOCODE_CACHE", DEFAULT_GEOCODE_CACHE_SIZE, DEFAULT_GEOCODE_CACHE_TTL
+  )
+
+
+def _get_points_cache():
+  return _get_cache(
+      "POINTS_CACHE", DEFAULT_POINTS_CACHE_SIZE, DEFAULT_POINTS_CACHE_TTL
+  )
+
+
+def _get_forecast_cache():
+  # The freshness of each forecast comes from its own response headers; the
+  # TTL only bounds how long a stale one is kept for revalidation.
+  return http_cache.HttpCache(
+      _get_cache(
+          "FORECAST_CACHE",
+          DEFAULT_FORECAST_CACHE_SIZE,
+          DEFAULT_FORECAST_CACHE_TTL,
       )
-      print(error_msg)
-      return {"error": error_msg}
+  )
+
+
+def _normalize_placename(placename):
+  """Folds case and whitespace, so "chicago,  IL" and "Chicago, IL" match."""
+  return " ".join(placename.split()).casefold()
+
+
+def _cached_position(placename):
+  """Returns the cached (lat, lon) for placename, or None."""
+  position = _get_geocode_cache().get(_normalize_placename(placename))
+  if position is None:
+    return None
+  print(f"Using cached lat/lon for '{placename}': {position[0]}, {position[1]}")
+  return tuple(position)
 
-    latitude = position["lat"]
-    longitude = position["lon"]
-    print(f"Got lat/lon: {latitude}, {longitude}")
+
+def _remember_position(placename, position):
+  _get_geocode_cache().set(_normalize_placename(placename), list(position))
+
+
+def _geocode_placename(placename, tomtom_key):
+  """Resolves a placename to (lat, lon), via the cache or TomTom.
+
+  Returns:
+    ((latitude, longitude), None) on success, or (None, error_dict).
+  """
+  position = _cached_position(placename)
+  if position:
+    return position, None
+
+  geocode_url = _geocode_url(placename, tomtom_key)
+  try:
+    print(f"Fetching geocode for '{placename}' from TomTom...")
+    response_geocode = _http_get(rate_limit.TOMTOM, geocode_url)
+    response_geocode.raise_for_status()
+    position, error = _position_from_geocode_data(
+        response_geocode.json(), placename
+    )
+    if position:
+      _remember_position(placename, position)
+    return position, error
 
   except requests.exceptions.RequestException as e:
     error_msg = f"TomTom API request failed for '{placename}': {e}"
     print(error_msg)
-    return {"error": error_msg, "details": str(e)}
+    return None, {"error": error_msg, "details": str(e)}
   except json.JSONDecodeError:
     error_msg = f"Failed to decode JSON from TomTom API for '{placename}'."
     print(error_msg)
-    return {"error": error_msg}
+    return None, {"error": error_msg}
   except (KeyError, IndexError) as e:
     error_msg = (
         f"Unexpected structure in TomTom API response for '{placename}': {e}"
     )
     print(error_msg)
-    return {"error": error_msg, "details": str(e)}
+    return None, {"error": error_msg, "details": str(e)}
+
+
+def _absolute_weather_gov_url(redirect_url):
+  """Turns the Location of a weather.gov redirect into an absolute URL."""
+  weather_gov_base_url = get_base_url("WEATHER_GOV_BASE_URL")
+  if not redirect_url.startswith(("https://", "http://")):
+    # Ensure no double slashes if redirect_url starts with /
+    redirect_url = f"{weather_gov_base_url}{redirect_url}"
+  if not redirect_url.startswith(
+      f"{weather_gov_base_url}/"
+  ) and redirect_url.startswith(
+      f"{weather_gov_base_url}"
+  ):  # if it became https://api.weather.govrelative/path
+    redirect_url = redirect_url.replace(
+        f"{weather_gov_base_url}", f"{weather_gov_base_url}/", 1
+    )
+  return redirect_url
 
-  # 2. Get Weather.gov forecast office URL
-  points_url = f"{WEATHER_GOV_BASE_URL}/points/{latitude},{longitude}"
+
+def _forecast_url_from_points_data(points_data):
+  """Extracts properties.forecast from a weather.gov points response.
+
+  Returns:
+    (forecast_url, None) on success, or (None, error_dict).
+  """
+  forecast_grid_data_url = points_data.get("properties", {}).get("forecast")
+  if not forecast_grid_data_url:
+    error_msg = (
+        "Could not find 'properties.forecast' URL in Weather.gov points"
+        " response."
+    )
+    print(error_msg)
+    return None, {"error": error_msg}
+  print(f"Got forecast grid data URL: {forecast_grid_data_url}")
+  return forecast_grid_data_url, None
+
+
+def _grid_key(latitude, longitude):
+  """Rounds a lat/lon to the 4 decimal places that weather.gov accepts."""
+  return f"{round(latitude, 4)},{round(longitude, 4)}"
+
+
+def _cached_forecast_url(grid_key):
+  """Returns the cached forecast URL for a rounded lat/lon, or None."""
+  forecast_url = _get_points_cache().get(f"forecast:{grid_key}")
+  if forecast_url:
+    print(f"Using cached forecast URL for {grid_key}: {forecast_url}")
+  return forecast_url
+
+
+def _remember_forecast_url(grid_key, forecast_url):
+  _get_points_cache().set(f"forecast:{grid_key}", forecast_url)
+
+
+def _cached_redirect(points_url):
+  """Returns the remembered 301 target for a points URL, or None."""
+  return _get_points_cache().get(f"redirect:{points_url}")
+
+
+def _remember_redirect(points_url, redirect_url):
+  _get_points_cache().set(f"redirect:{points_url}", redirect_url)
+
+
+def _get_forecast_url(latitude, longitude):
+  """Resolves a lat/lon to the weather.gov forecast URL for its grid cell.
+
+  The forecast URL for each rounded lat/lon is cached, as is the target of any
+  301 redirect from the points API, so a warm lookup sends no request at all.
+
+  Returns:
+    (forecast_url, None) on success, or (None, error_dict).
+  """
+  grid_key = _grid_key(latitude, longitude)
+  forecast_url = _cached_forecast_url(grid_key)
+  if forecast_url:
+    return forecast_url, None
+
+  points_url = f"{get_base_url('WEATHER_GOV_BASE_URL')}/points/{grid_key}"
   weather_headers = {"User-Agent": WEATHER_GOV_USER_AGENT}
-  forecast_grid_data_url = None
 
   try:
     print(
         f"Fetching weather points for {latitude},{longitude} from"
         " Weather.gov..."
     )
-    response_points = requests.get(
-        points_url, headers=weather_headers, allow_redirects=False
-    )  # Handle redirect manually
+    redirect_url = _cached_redirect(points_url)
+    if redirect_url:
+      print(f"Using cached redirect: {redirect_url}")
+      response_points = _http_get(
+          rate_limit.WEATHER, redirect_url, headers=weather_headers
+      )
+    else:
+      response_points = _http_get(
+          rate_limit.WEATHER,
+          points_url,
+          headers=weather_headers,
+          allow_redirects=False,
+      )  # Handle redirect manually
 
     if response_points.status_code == 301:  # Handle redirect
       redirect_url = response_points.headers.get("Location")
@@ -121,77 +374,84 @@ def get_weather_forecast(*args):
             " found."
         )
         print(error_msg)
-        return {"error": error_msg}
+        return None, {"error": error_msg}
       print(f"Redirected to: {redirect_url}")
-      if not redirect_url.startswith("https://"):
-        # Ensure no double slashes if redirect_url starts with /
-        redirect_url = f"{WEATHER_GOV_BASE_URL}{redirect_url}"
-      if not redirect_url.startswith(
-          f"{WEATHER_GOV_BASE_URL}/"
-      ) and redirect_url.startswith(
-          f"{WEATHER_GOV_BASE_URL}"
-      ):  # if it became https://api.weather.govrelative/path
-        redirect_url = redirect_url.replace(
-            f"{WEATHER_GOV_BASE_URL}", f"{WEATHER_GOV_BASE_URL}/", 1
-        )
+      redirect_url = _absolute_weather_gov_url(redirect_url)
+      _remember_redirect(points_url, redirect_url)
 
-      response_points = requests.get(redirect_url, headers=weather_headers)
+      response_points = _http_get(
+          rate_limit.WEATHER, redirect_url, headers=weather_headers
+      )
 
     response_points.raise_for_status()
-    points_data = response_points.json()
-
-    forecast_grid_data_url = points_data.get("properties", {}).get("forecast")
-    if not forecast_grid_data_url:
-      error_msg = (
-          "Could not find 'properties.forecast' URL in Weather.gov points"
-          " response."
-      )
-      print(error_msg)
-      return {"error": error_msg}
-    print(f"Got forecast grid data URL: {forecast_grid_data_url}")
+    forecast_url, error = _forecast_url_from_points_data(response_points.json())
+    if forecast_url:
+      _remember_forecast_url(grid_key, forecast_url)
+    return forecast_url, error
 
   except requests.exceptions.RequestException as e:
     error_msg = f"Weather.gov points API request failed: {e}"
     print(error_msg)
-    return {"error": error_msg, "details": str(e)}
+    return None, {"error": error_msg, "details": str(e)}
   except json.JSONDecodeError:
     error_msg = "Failed to decode JSON from Weather.gov points API."
     print(error_msg)
-    return {"error": error_msg}
+    return None, {"error": error_msg}
   except (KeyError, IndexError) as e:
     error_msg = f"Unexpected structure in Weather.gov points API response: {e}"
     print(error_msg)
-    return {"error": error_msg, "details": str(e)}
+    return None, {"error": error_msg, "details": str(e)}
 
-  # 3. Get actual forecast
+
+def _format_forecast(forecast_data, placename):
+  """Reduces a weather.gov forecast response to the result for the model."""
+  periods = forecast_data.get("properties", {}).get("periods")
+  if not periods or not isinstance(periods, list) or len(periods) == 0:
+    error_msg = "No forecast periods found in Weather.gov forecast response."
+    print(error_msg)
+    return {"error": error_msg}
+
+  return {
+      f"Forecast for '{placename}'": [
+          {key: period[key] for key in FORECAST_KEYS_TO_KEEP}
+          for period in periods
+      ]
+  }
+
+
+def _get_forecast(forecast_grid_data_url, placename):
+  """Fetches the forecast from weather.gov and formats it for the model.
+
+  A forecast that is still fresh, according to the Cache-Control or Expires
+  headers it came with, is served from the cache. A stale one is revalidated
+  with a conditional request, so an unchanged forecast costs only a 304.
+  """
+  forecast_cache = _get_forecast_cache()
+  entry = forecast_cache.lookup(forecast_grid_data_url)
+  if forecast_cache.is_fresh(entry):
+    print(f"Using cached forecast from: {forecast_grid_data_url}")
+    return _format_forecast(entry["body"], placename)
+
+  weather_headers = {"User-Agent": WEATHER_GOV_USER_AGENT}
+  weather_headers.update(forecast_cache.conditional_headers(entry))
   try:
     print(f"Fetching actual forecast from: {forecast_grid_data_url}...")
-    response_forecast = requests.get(
-        forecast_grid_data_url, headers=weather_headers
+    response_forecast = _http_get(
+        rate_limit.WEATHER, forecast_grid_data_url, headers=weather_headers
     )
+    if response_forecast.status_code == 304 and entry:
+      print("Cached forecast is still current (304).")
+      entry = forecast_cache.revalidated(
+          forecast_grid_data_url, entry, response_forecast.headers
+      )
+      return _format_forecast(entry["body"], placename)
+
     response_forecast.raise_for_status()
     forecast_data = response_forecast.json()
-
-    periods = forecast_data.get("properties", {}).get("periods")
-    if not periods or not isinstance(periods, list) or len(periods) == 0:
-      error_msg = "No forecast periods found in Weather.gov forecast response."
-      print(error_msg)
-      return {"error": error_msg}
-
-    keys_to_keep = [
-        "name",
-        "temperature",
-        "temperatureUnit",
-        "probabilityOfPrecipitation",
-        "shortForecast",
-        "detailedForecast",
-    ]
-
-    return {
-        f"Forecast for '{placename}'": [
-            {key: period[key] for key in keys_to_keep} for period in periods
-        ]
-    }
+    forecast_cache.store(
+        forecast_grid_data_url, response_forecast.headers, forecast_data
+    )
+    return _format_forecast(forecast_data, placename)
 
   except requests.exceptions.RequestException as e:
     error_msg = f"Weather.gov forecast API request failed: {e}"
@@ -209,6 +469,36 @@ def get_weather_forecast(*args):
     return {"error": error_msg, "details": str(e)}
 
 
+LETTER_SCORES = {
+    "A": 1,
+    "E": 1,
+    "I": 1,
+    "L": 1,
+    "N": 1,
+    "O": 1,
+    "R": 1,
+    "S": 1,
+    "T": 1,
+    "U": 1,
+    "D": 2,
+    "G": 2,
+    "B": 3,
+    "C": 3,
+    "M": 3,
+    "P": 3,
+    "F": 4,
+    "H": 4,
+    "V": 4,
+    "W": 4,
+    "Y": 4,
+    "K": 5,
+    "J": 8,
+    "X": 8,
+    "Q": 10,
+    "Z": 10,
+}
+
+
 def get_min_scrabble_word_score(*args):
   """Calculates a Scrabble score for a word based on standard letter values.
 
@@ -226,34 +516,6 @@ def get_min_scrabble_word_score(*args):
     return 0
   word = args[0]
 
-  letter_scores = {
-      "A": 1,
-      "E": 1,
-      "I": 1,
-      "L": 1,
-      "N": 1,
-      "O": 1,
-      "R": 1,
-      "S": 1,
-      "T": 1,
-      "U": 1,
-      "D": 2,
-      "G": 2,
-      "B": 3,
-      "C": 3,
-      "M": 3,
-      "P": 3,
-      "F": 4,
-      "H": 4,
-      "V": 4,
-      "W": 4,
-      "Y": 4,
-      "K": 5,
-      "J": 8,
-      "X": 8,
-      "Q": 10,
-      "Z": 10,
-  }
   total_score = 0
 
   for char_original in word:
@@ -261,7 +523,7 @@ def get_min_scrabble_word_score(*args):
     if not char_upper.isascii():
       return 0  # Stop and return 0 if non-ASCII character is found
 
-    total_score += letter_scores.get(
+    total_score += LETTER_SCORES.get(
         char_upper, 0
     )  # Default to 0 for non-letters (though isascii should catch most)
 
@@ -273,11 +535,100 @@ def get_min_scrabble_word_score(*args):
   return total_score
 
 
+def _dictionary_url(candidate):
+  return f"{get_base_url('DICTIONARY_BASE_URL')}/api/v2/entries/en/{candidate}"
+
+
+def _get_word_cache():
+  """Returns the cache of dictionary lookups, configured on first use.
+
+  Settings:
+    WORD_CACHE_SIZE         the number of words to keep in memory (default 4096)
+    WORD_CACHE_KNOWN_TTL    seconds to keep a known word (default 30 days)
+    WORD_CACHE_UNKNOWN_TTL  seconds to keep an unknown word (default 1 day)
+    WORD_CACHE_DB           optional sqlite file, shared between processes
+  """
+  cache = _caches.get("WORD_CACHE")
+  if cache is None:
+    with _caches_lock:
+      cache = _caches.get("WORD_CACHE")
+      if cache is None:
+        cache = caches.TTLCache(
+            int(os.environ.get("WORD_CACHE_SIZE", DEFAULT_WORD_CACHE_SIZE)),
+            None,
+        )
+        db_filename = os.environ.get("WORD_CACHE_DB")
+        if db_filename:
+          cache = caches.TieredCache(
+              cache, caches.SqliteTTLStore(db_filename, table="known_words")
+          )
+        _caches["WORD_CACHE"] = cache
+  return cache
+
+
+def _get_word_index():
+  """Returns the offline WordIndex named by WORD_INDEX_FILE, or None."""
+  global _word_index, _word_index_loaded
+  if not _word_index_loaded:
+    with _caches_lock:
+      if not _word_index_loaded:
+        filename = os.environ.get("WORD_INDEX_FILE")
+        if filename:
+          try:
+            _word_index = word_index.WordIndex(filename)
+          except (OSError, ValueError) as e:
+            print(f"Cannot use the word index '{filename}': {e}")
+        _word_index_loaded = True
+  return _word_index
+
+
+def _offline_is_known(candidate):
+  """Checks the offline word index, if there is one.
+
+  Returns:
+    True if the index has the word. False if it does not, and
+    WORD_INDEX_FALLBACK is "0". Otherwise None, meaning ask the online
+    dictionary.
+  """
+  index = _get_word_index()
+  if index is None:
+    return None
+  if candidate in index:
+    print(f"Found '{candidate}' in the offline word index.")
+    return True
+  if os.environ.get("WORD_INDEX_FALLBACK", "1") == "0":
+    print(f"'{candidate}' is not in the offline word index.")
+    return False
+  return None
+
+
+def _cached_is_known(candidate):
+  """Returns the cached True/False for candidate, or None if not cached."""
+  is_known = _get_word_cache().get(candidate.casefold())
+  if is_known is not None:
+    print(f"Using cached dictionary result for '{candidate}': {is_known}")
+  return is_known
+
+
+def _remember_is_known(candidate, is_known):
+  """Caches a definite answer from the dictionary; never call on errors."""
+  if is_known:
+    ttl = os.environ.get("WORD_CACHE_KNOWN_TTL", DEFAULT_WORD_CACHE_KNOWN_TTL)
+  else:
+    ttl = os.environ.get(
+        "WORD_CACHE_UNKNOWN_TTL", DEFAULT_WORD_CACHE_UNKNOWN_TTL
+    )
+  _get_word_cache().set(candidate.casefold(), is_known, ttl_seconds=float(ttl))
+
+
 def get_is_known_word(*args):
   """Returns a bool indicating if the candidate is an actual word.
 
-  Expects the candidate word as the first argument. Checks the online
-  dictionary to determine the result.
+  Expects the candidate word as the first argument. Checks the offline word
+  index, if WORD_INDEX_FILE names one, and then the online dictionary, to
+  determine the result. Both known (200) and unknown (404) answers from the
+  online dictionary are cached; errors are not. While the circuit breaker of
+  the dictionary host is open, returns an error dict instead.
   """
   if not args:
     print(
@@ -287,10 +638,18 @@ def get_is_known_word(*args):
     return False
   candidate = args[0]
 
-  url = f"https://api.dictionaryapi.dev/api/v2/entries/en/{candidate}"
+  is_known = _offline_is_known(candidate)
+  if is_known is not None:
+    return is_known
+
+  is_known = _cached_is_known(candidate)
+  if is_known is not None:
+    return is_known
+
+  url = _dictionary_url(candidate)
 
   try:
-    response = requests.get(url)
+    response = _http_get(rate_limit.DICTIONARY, url)
 
     if response.status_code == 200:
       # Optional. People might want to see the JSON response
@@ -298,8 +657,10 @@ def get_is_known_word(*args):
 
       # models_data = response.json()
       # print(json.dumps(models_data, indent=2))
+      _remember_is_known(candidate, True)
       return True
     elif response.status_code == 404:
+      _remember_is_known(candidate, False)
       return False
     else:
       # For any other status code, print a message and then raise the exception
@@ -310,9 +671,13 @@ def get_is_known_word(*args):
       # This will re-throw an HTTPError for other bad statuses
       response.raise_for_status()
 
+  except circuit_breaker.CircuitOpenError as e:
+    # The dictionary is down; say so, rather than call the word unknown.
+    print(f"Not checking word '{candidate}': {e}")
+    return {"error": str(e)}
   except requests.exceptions.RequestException as e:
     # This will catch the re-thrown error from response.raise_for_status()
-    # or other network-related errors from requests.get()
+    # or other network-related errors from _http_get()
     print(f"An error occurred while checking word '{candidate}': {e}")
     # Or re-raise, depending on desired error handling for network issues
     return False
@@ -327,3 +692,27 @@ KNOWN_FUNCTIONS = {
     "get_weather_forecast": get_weather_forecast,
     # Add other known functions here as they are defined
 }
+
+# How each known function should be run; see tool_dispatch.py. "io" functions
+# run on the caller's thread, or its event loop. "cpu" functions run in a
+# pool of worker processes, so they do not hold the GIL of the caller; that
+# costs a round trip between processes per call, so it only pays for heavy
+# computations. get_min_scrabble_word_score is a few dictionary lookups, far
+# cheaper than the round trip, so it runs inline.
+FUNCTION_POLICIES = {
+    "get_min_scrabble_word_score": "io",
+    "get_is_known_word": "io",
+    "get_weather_forecast": "io",
+}
+
+# Whether the result of each known function may be reused for the same
+# arguments, and for how long; see memo.py. A ttl_seconds of None keeps it for
+# as long as the store does. get_is_known_word answers False when the
+# dictionary cannot be reached, so only its own cache, which knows which
+# answers to keep, applies to it; forecasts follow the freshness headers of
+# weather.gov instead.
+FUNCTION_MEMO = {
+    "get_min_scrabble_word_score": {"cacheable": True, "ttl_seconds": None},
+    "get_is_known_word": {"cacheable": False},
+    "get_weather_forecast": {"cacheable": False},
+}
@@ -0,0 +1,246 @@
+"""Circuit breakers that fail fast while an upstream host is down."""
+
+# Copyright © 2025-2026 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# When an upstream host stops answering, every tool call that needs it waits
+# for a timeout before it fails, and every turn of every session pays for
+# that. A circuit breaker per host counts the consecutive failures - errors
+# to connect, timeouts, and 5xx answers - and once there are enough of them,
+# it opens: requests to the host fail at once with CircuitOpenError, which the
+# functions turn into an error result like any other failed request.
+#
+# After a while the breaker goes half-open and lets a single request through,
+# as a probe; the others still fail fast. If the probe succeeds, the breaker
+# closes again, and if it fails, the breaker stays open for another while.
+#
+# Settings, read from the environment on first use:
+#   HTTP_CIRCUIT_FAILURES       consecutive failures that open a breaker
+#                               (default 5; 0 turns the breakers off)
+#   HTTP_CIRCUIT_RESET_SECONDS  seconds a breaker stays open before it lets
+#                               a probe through (default 30)
+
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_SECONDS = 30.0
+
+# The failures of the requests library that say a host is not answering.
+FAILURE_EXCEPTIONS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+)
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+  """Raised instead of sending a request to a host whose breaker is open."""
+
+
+class CircuitBreaker:
+  """Tracks the health of one host, and stops requests while it is down."""
+
+  def __init__(
+      self,
+      name,
+      failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+      reset_seconds=DEFAULT_RESET_SECONDS,
+      clock=time.monotonic,
+  ):
+    """Configures the breaker, closed.
+
+    Args:
+      name: the host, for the messages and the stats.
+      failure_threshold: the consecutive failures that open the breaker.
+      reset_seconds: how long the breaker stays open before it lets a probe
+        through.
+      clock: optional function that returns the time in seconds.
+    """
+    self.name = name
+    self.failure_threshold = failure_threshold
+    self.reset_seconds = reset_seconds
+    self._clock = clock
+    self._lock = threading.Lock()
+    self.state = CLOSED
+    self.failures = 0
+    self._opened_at = 0.0
+    self._probing = False
+    self.opened = 0
+    self.rejected = 0
+
+  def _before(self):
+    """Lets a request through, or raises CircuitOpenError.
+
+    Returns:
+      True if the request is the probe of a half-open breaker.
+    """
+    with self._lock:
+      if self.state == OPEN:
+        remaining = self._opened_at + self.reset_seconds - self._clock()
+        if remaining > 0:
+          self.rejected += 1
+          raise CircuitOpenError(
+              f"Circuit for {self.name} is open after {self.failures} failed"
+              f" requests; next try in {remaining:.0f}s."
+          )
+        self.state = HALF_OPEN
+      if self.state == HALF_OPEN:
+        if self._probing:
+          self.rejected += 1
+          raise CircuitOpenError(
+              f"Circuit for {self.name} is half-open; waiting for a probe."
+          )
+        self._probing = True
+        return True
+      return False
+
+  def _after(self, is_probe, failed):
+    with self._lock:
+      if is_probe:
+        self._probing = False
+      if not failed:
+        if self.state != CLOSED:
+          print(f"Circuit for {self.name} closed; the host answers again.")
+        self.state = CLOSED
+        self.failures = 0
+        return
+      self.failures += 1
+      if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+        if self.state == CLOSED:
+          self.opened += 1
+          print(
+              f"Circuit for {self.name} opened after {self.failures} failed"
+              f" requests; failing fast for {self.reset_seconds:.0f}s."
+          )
+        self.state = OPEN
+        self._opened_at = self._clock()
+
+  def _abandon(self, is_probe):
+    """Lets another request probe, if the probe ended without an answer."""
+    if is_probe:
+      with self._lock:
+        self._probing = False
+
+  def call(self, send, failure_exceptions=FAILURE_EXCEPTIONS):
+    """Calls send(), unless the breaker is open, and records how it went.
+
+    Args:
+      send: a function of no arguments that sends the request, and returns
+        the response.
+      failure_exceptions: the exceptions that count as a failure of the host.
+
+    Returns:
+      what send() returned. A response with a 5xx status counts as a failure,
+      but is returned all the same.
+
+    Raises:
+      CircuitOpenError: if the breaker is open, without calling send().
+    """
+    is_probe = self._before()
+    try:
+      response = send()
+    except failure_exceptions:
+      self._after(is_probe, failed=True)
+      raise
+    except BaseException:
+      self._abandon(is_probe)
+      raise
+    self._after(is_probe, failed=response.status_code >= 500)
+    return response
+
+  async def call_async(self, send, failure_exceptions=FAILURE_EXCEPTIONS):
+    """Like call(), for a coroutine function."""
+    is_probe = self._before()
+    try:
+      response = await send()
+    except failure_exceptions:
+      self._after(is_probe, failed=True)
+      raise
+    except BaseException:  # cancelled, for one
+      self._abandon(is_probe)
+      raise
+    self._after(is_probe, failed=response.status_code >= 500)
+    return response
+
+  def stats(self):
+    with self._lock:
+      return {
+          "state": self.state,
+          "failures": self.failures,
+          "opened": self.opened,
+          "rejected": self.rejected,
+      }
+
+
+class _NoBreaker:
+  """Stands in for a breaker while the breakers are off."""
+
+  def call(self, send, failure_exceptions=FAILURE_EXCEPTIONS):
+    return send()
+
+  async def call_async(self, send, failure_exceptions=FAILURE_EXCEPTIONS):
+    return await send()
+
+
+_NO_BREAKER = _NoBreaker()
+
+
+def get_breaker(url):
+  """Returns the shared CircuitBreaker for the host of the given url."""
+  host = urlsplit(url).netloc
+  with _breakers_lock:
+    breaker = _breakers.get(host)
+    if breaker is None:
+      failure_threshold = int(
+          os.environ.get("HTTP_CIRCUIT_FAILURES", DEFAULT_FAILURE_THRESHOLD)
+      )
+      if failure_threshold <= 0:
+        breaker = _NO_BREAKER
+      else:
+        breaker = CircuitBreaker(
+            host,
+            failure_threshold,
+            float(
+                os.environ.get(
+                    "HTTP_CIRCUIT_RESET_SECONDS", DEFAULT_RESET_SECONDS
+                )
+            ),
+        )
+      _breakers[host] = breaker
+    return breaker
+
+
+def reset():
+  """Forgets every breaker; the next use reads the settings again."""
+  with _breakers_lock:
+    _breakers.clear()
+
+
+def get_stats():
+  """Returns the stats of each host's breaker."""
+  with _breakers_lock:
+    breakers = [b for b in _breakers.values() if b is not _NO_BREAKER]
+  return {b.name: b.stats() for b in breakers}
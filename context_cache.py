@@ -0,0 +1,242 @@
+"""Gemini context caching for the static parts of function calling payloads."""
+
+# Copyright © 2025-2026 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# Every turn of a function calling conversation sends the same tools and
+# system_instruction again. With the cachedContents API, that prefix is
+# uploaded once, and each request refers to it by name instead. The server
+# keeps a cache for its TTL; this module tracks that, extends a cache that is
+# about to expire, and creates a new one when it has expired.
+#
+# Gemini only caches content above a minimum size (about a thousand tokens for
+# the Flash models). When it refuses to create a cache, the payloads are sent
+# inline, as before, and creating that cache is not tried again for a while.
+
+import datetime
+import hashlib
+import json
+import threading
+import time
+
+from gemini_utils import FrozenDict
+from gemini_utils import FrozenList
+import http_sessions
+import requests
+
+DEFAULT_TTL_SECONDS = 600
+# Extend a cache that has less than this left (or a quarter of its TTL, if
+# that is less), rather than risk using it as it expires.
+REFRESH_MARGIN_SECONDS = 60
+# After a cache could not be created, send inline for this long before trying
+# again.
+RETRY_AFTER_FAILURE_SECONDS = 300
+
+# The parts of a payload that the cache holds, in both spellings the API
+# accepts.
+STATIC_PAYLOAD_KEYS = (
+    "tools",
+    "tool_config",
+    "toolConfig",
+    "system_instruction",
+    "systemInstruction",
+)
+
+_FROZEN_TYPES = (FrozenDict, FrozenList)
+
+
+def _parse_expire_time(expire_time):
+  """Returns an RFC 3339 timestamp as epoch seconds, or None."""
+  try:
+    return datetime.datetime.fromisoformat(
+        expire_time.replace("Z", "+00:00")
+    ).timestamp()
+  except (AttributeError, ValueError):
+    return None
+
+
+class ContextCache:
+  """Creates, reuses and refreshes cachedContents for payload prefixes.
+
+  One instance can serve every session in a process: caches are keyed by the
+  content of the static prefix, so all sessions that use the same template
+  share one cache.
+  """
+
+  def __init__(
+      self, base_url, model_name, api_key, ttl_seconds=DEFAULT_TTL_SECONDS
+  ):
+    """Configures the cache.
+
+    Args:
+      base_url: the Gemini API base URL, e.g.
+        https://generativelanguage.googleapis.com
+      model_name: the model the caches are for, e.g. gemini-2.5-flash.
+      api_key: the Gemini API key.
+      ttl_seconds: how long the server should keep each cache.
+    """
+    self._base_url = base_url.rstrip("/")
+    self._model_name = model_name
+    self._headers = {
+        "Content-Type": "application/json",
+        "x-goog-api-key": api_key,
+    }
+    self._ttl_seconds = ttl_seconds
+    self._refresh_margin = min(REFRESH_MARGIN_SECONDS, ttl_seconds / 4)
+    self._lock = threading.Lock()
+    self._entries = {}  # prefix key -> {"name", "expires"} or {"failed"}
+    self._key_locks = {}
+    # Static parts from gemini_utils.PayloadRegistry are frozen, so their key
+    # can be remembered by identity. The value keeps them alive.
+    self._keys_by_identity = {}
+
+  def _prefix(self, payload):
+    return {k: payload[k] for k in STATIC_PAYLOAD_KEYS if k in payload}
+
+  def _prefix_key(self, prefix):
+    identity = tuple((k, id(v)) for k, v in prefix.items())
+    remembered = self._keys_by_identity.get(identity)
+    if remembered:
+      return remembered[0]
+    key = hashlib.sha256(
+        json.dumps(prefix, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    if all(isinstance(v, _FROZEN_TYPES) for v in prefix.values()):
+      with self._lock:
+        self._keys_by_identity[identity] = (key, prefix)
+    return key
+
+  def _url(self, path):
+    return f"{self._base_url}/v1beta/{path}"
+
+  def _create(self, prefix):
+    """Creates a cache for the prefix; returns its entry, or None."""
+    body = {
+        "model": f"models/{self._model_name}",
+        "ttl": f"{self._ttl_seconds}s",
+        **prefix,
+    }
+    url = self._url("cachedContents")
+    requested_at = time.time()
+    try:
+      response = http_sessions.get_session(url).post(
+          url, json=body, headers=self._headers
+      )
+      response.raise_for_status()
+      cached = response.json()
+    except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+      print(f"Could not create a context cache, sending inline: {e}")
+      return None
+    return self._entry(cached, requested_at)
+
+  def _extend(self, name):
+    """Extends the TTL of an existing cache; returns its entry, or None."""
+    url = self._url(f"{name}?updateMask=ttl")
+    requested_at = time.time()
+    try:
+      response = http_sessions.get_session(url).patch(
+          url, json={"ttl": f"{self._ttl_seconds}s"}, headers=self._headers
+      )
+      response.raise_for_status()
+      cached = response.json()
+    except (requests.exceptions.RequestException, json.JSONDecodeError):
+      return None
+    return self._entry(cached, requested_at)
+
+  def _entry(self, cached, requested_at):
+    name = cached.get("name")
+    if not name:
+      return None
+    # Trust the server's expireTime, but never beyond the TTL that was asked
+    # for, counted from before the request.
+    expires = requested_at + self._ttl_seconds
+    server_expires = _parse_expire_time(cached.get("expireTime"))
+    if server_expires is not None:
+      expires = min(expires, server_expires)
+    return {"name": name, "expires": expires}
+
+  def get_cached_content(self, payload):
+    """Returns the name of a live cache for the payload's prefix, or None.
+
+    Creates the cache on first use, extends it when it is about to expire,
+    and replaces it when it has expired.
+    """
+    prefix = self._prefix(payload)
+    if not prefix:
+      return None
+    key = self._prefix_key(prefix)
+    now = time.time()
+    entry = self._entries.get(key)
+    if entry and entry.get("expires", 0) - self._refresh_margin > now:
+      return entry["name"]
+    if entry and entry.get("failed", 0) + RETRY_AFTER_FAILURE_SECONDS > now:
+      return None
+
+    with self._lock:
+      key_lock = self._key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+      # Another session may have refreshed it while this one waited.
+      entry = self._entries.get(key)
+      now = time.time()
+      if entry and entry.get("expires", 0) - self._refresh_margin > now:
+        return entry["name"]
+      if entry and entry.get("failed", 0) + RETRY_AFTER_FAILURE_SECONDS > now:
+        return None
+      new_entry = None
+      if entry and entry.get("expires", 0) > now:
+        new_entry = self._extend(entry["name"])
+      if new_entry is None:
+        new_entry = self._create(prefix) or {"failed": now}
+      self._entries[key] = new_entry
+      return new_entry.get("name")
+
+  def apply(self, payload):
+    """Returns the payload to send, and the cache it refers to, if any.
+
+    Args:
+      payload: a full payload, with the tools and system_instruction inline.
+
+    Returns:
+      (request_payload, cached_content_name). If a cache is live, the
+      request_payload refers to it instead of carrying the static parts;
+      otherwise it is the payload itself, and the name is None.
+    """
+    name = self.get_cached_content(payload)
+    if not name:
+      return payload, None
+    request_payload = {
+        k: v for k, v in payload.items() if k not in STATIC_PAYLOAD_KEYS
+    }
+    request_payload["cachedContent"] = name
+    return request_payload, name
+
+  def invalidate(self, name):
+    """Forgets a cache the server no longer accepts, e.g. one that expired."""
+    with self._lock:
+      for key, entry in list(self._entries.items()):
+        if entry.get("name") == name:
+          del self._entries[key]
+
+  def delete_all(self):
+    """Deletes every cache this instance created, e.g. at the end of a run."""
+    with self._lock:
+      names = [e["name"] for e in self._entries.values() if e.get("name")]
+      self._entries.clear()
+    for name in names:
+      url = self._url(name)
+      try:
+        http_sessions.get_session(url).delete(url, headers=self._headers)
+      except requests.exceptions.RequestException:
+        pass
@@ -0,0 +1,569 @@
+"""Payload and response helpers shared by the function calling examples."""
+
+# Copyright © 2025-2026 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import glob
+import json
+import os
+import random
+import threading
+
+import text_utils
+import tracing
+
+CONFIG_DIR_PATH = "config"
+PAYLOAD_FILE_PATTERN = "fn-*.json"
+
+
+class FrozenDict(dict):
+  """A dict that refuses changes, for the parts that payloads share."""
+
+  def _immutable(self, *args, **kwargs):
+    raise TypeError("This part of the payload is shared, and cannot change.")
+
+  __setitem__ = __delitem__ = __ior__ = _immutable
+  clear = pop = popitem = setdefault = update = _immutable
+
+  def __copy__(self):
+    return self
+
+  def __deepcopy__(self, memo):
+    return self
+
+  def __reduce__(self):
+    return (FrozenDict, (dict(self),))
+
+
+class FrozenList(list):
+  """A list that refuses changes, for the parts that payloads share."""
+
+  def _immutable(self, *args, **kwargs):
+    raise TypeError("This part of the payload is shared, and cannot change.")
+
+  __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+  append = clear = extend = insert = pop = remove = _immutable
+  reverse = sort = _immutable
+
+  def __copy__(self):
+    return self
+
+  def __deepcopy__(self, memo):
+    return self
+
+  def __reduce__(self):
+    return (FrozenList, (list(self),))
+
+
+def _freeze(value):
+  if isinstance(value, dict):
+    return FrozenDict({k: _freeze(v) for k, v in value.items()})
+  if isinstance(value, list):
+    return FrozenList(_freeze(v) for v in value)
+  return value
+
+
+class _DictFiller:
+  """Fills a dict that has placeholders somewhere below it."""
+
+  def __init__(self, items):
+    self._items = items  # (key, value, value is a filler)
+
+  def fill(self, replacements_map, rng, available_words, substitutions):
+    return {
+        key: (
+            value.fill(replacements_map, rng, available_words, substitutions)
+            if is_filler
+            else value
+        )
+        for key, value, is_filler in self._items
+    }
+
+
+class _ListFiller:
+  """Fills a list that has placeholders somewhere below it."""
+
+  def __init__(self, items):
+    self._items = items  # (value, value is a filler)
+
+  def fill(self, replacements_map, rng, available_words, substitutions):
+    return [
+        (
+            value.fill(replacements_map, rng, available_words, substitutions)
+            if is_filler
+            else value
+        )
+        for value, is_filler in self._items
+    ]
+
+
+def _compile_node(node, placeholders):
+  """Returns (filler, True) for a node with placeholders, else (node, False).
+
+  A node without placeholders comes back frozen, to be shared by every
+  payload filled from the template.
+  """
+  if isinstance(node, str):
+    template = text_utils.Template(node, placeholders)
+    return (template, True) if len(template) else (node, False)
+  if isinstance(node, dict):
+    items = [(k, *_compile_node(v, placeholders)) for k, v in node.items()]
+    if any(is_filler for _, _, is_filler in items):
+      return _DictFiller(items), True
+    return FrozenDict({k: v for k, v, _ in items}), False
+  if isinstance(node, list):
+    items = [_compile_node(v, placeholders) for v in node]
+    if any(is_filler for _, is_filler in items):
+      return _ListFiller(items), True
+    return FrozenList(v for v, _ in items), False
+  return node, False
+
+
+class PayloadTemplate:
+  """A parsed payload file, ready to be filled again and again.
+
+  The JSON is parsed once. Strings with placeholders are compiled into
+  text_utils.Template objects; everything else, such as the tools and their
+  functionDeclarations, is frozen and shared by every filled payload.
+  """
+
+  def __init__(self, payload, placeholders):
+    self._root, self._is_filler = _compile_node(payload, placeholders)
+
+  def fill(self, replacements_map, rng=random, substitutions=None):
+    """Returns a new payload, with the placeholders filled.
+
+    The words for each placeholder are drawn from one pool across the whole
+    payload, as if it were filled as a single text. Only the containers on the
+    way to a placeholder are new; the rest is shared and read-only.
+
+    Args:
+      replacements_map: a dict of placeholder to list of words.
+      rng: the source of randomness.
+      substitutions: optional list; each (placeholder, word) that was filled
+        in is appended to it, in document order.
+    """
+    if not self._is_filler:
+      return dict(self._root)
+    return self._root.fill(replacements_map, rng, {}, substitutions)
+
+
+class PayloadRegistry:
+  """Loads and compiles every payload file once, and serves them from memory.
+
+  After the first use, listing, loading and selecting payloads touch neither
+  the filesystem nor the JSON parser. Call reload() to pick up changed files.
+  """
+
+  def __init__(
+      self,
+      config_dir=CONFIG_DIR_PATH,
+      pattern=PAYLOAD_FILE_PATTERN,
+      replacements_map=None,
+  ):
+    self._config_dir = config_dir
+    self._pattern = pattern
+    self._replacements_map = (
+        text_utils.REPLACEMENTS
+        if replacements_map is None
+        else replacements_map
+    )
+    self._lock = threading.Lock()
+    self.reload()
+
+  def reload(self):
+    """Reads and compiles all the payload files again."""
+    search_path = os.path.join(self._config_dir, self._pattern)
+    templates = {}
+    for file_path in sorted(glob.glob(search_path)):
+      template = self._compile_file(file_path)
+      if template:
+        templates[file_path] = template
+    with self._lock:
+      self._templates = templates
+      self._files = list(templates)
+      self._filtered_files = {}
+
+  def _compile_file(self, file_path):
+    try:
+      with open(file_path, "r") as f:
+        payload = json.load(f)
+    except FileNotFoundError:
+      print(f"Error: File {file_path} not found.")
+      return None
+    except json.JSONDecodeError:
+      print(f"Error: Could not decode JSON from {file_path}.")
+      return None
+    return PayloadTemplate(payload, tuple(self._replacements_map))
+
+  def files(self, filename_filter=None):
+    """Returns the sorted paths of the payload files, maybe filtered."""
+    with self._lock:
+      if not filename_filter:
+        return list(self._files)
+      if filename_filter not in self._filtered_files:
+        self._filtered_files[filename_filter] = [
+            f for f in self._files if filename_filter in os.path.basename(f)
+        ]
+      return list(self._filtered_files[filename_filter])
+
+  def load(self, file_path, substitutions=None):
+    """Returns a newly filled payload from a file, or None on error.
+
+    Args:
+      file_path: the path of the payload file.
+      substitutions: optional list, passed to PayloadTemplate.fill().
+    """
+    with self._lock:
+      template = self._templates.get(file_path)
+    if template is None:
+      # Not one of the payload files; compile it once, and keep it.
+      template = self._compile_file(file_path)
+      if template is None:
+        return None
+      with self._lock:
+        self._templates[file_path] = template
+    with tracing.span("payload.fill", file=os.path.basename(file_path)):
+      return template.fill(self._replacements_map, substitutions=substitutions)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+  """Returns the shared PayloadRegistry, loading it on first use."""
+  global _registry
+  with _registry_lock:
+    if _registry is None:
+      _registry = PayloadRegistry()
+    return _registry
+
+
+def list_payload_files(filename_filter=None):
+  """Lists the function calling payload files in the config directory.
+
+  Args:
+    filename_filter: When present this function restricts found files to those
+      that have names that include this string.
+
+  Returns:
+    a sorted list of file paths, possibly empty.
+  """
+  return get_registry().files(filename_filter)
+
+
+def load_payload(selected_file_path, substitutions=None):
+  """Loads a payload file, replacing its placeholders.
+
+  The file is read and parsed only the first time; see PayloadRegistry.
+
+  Args:
+    selected_file_path: the path of the payload file.
+    substitutions: optional list; each (placeholder, word) that was filled in
+      is appended to it.
+
+  Returns:
+    the payload, or None if an error occurs.
+  """
+  return get_registry().load(selected_file_path, substitutions)
+
+
+def select_random_payload(filename_filter=None, substitutions=None):
+  """Selects a random function candidate-*.json file from the config directory,.
+
+  optionally filtering by a string in the filename.
+  Loads its JSON content, and returns the payload and the selected file path.
+
+  Args:
+    filename_filter: When present this function restricts found files to those
+      that have names that include this string.
+    substitutions: optional list; each (placeholder, word) that was filled in
+      is appended to it.
+
+  Returns:
+    (payload, selected_file_path) if everything works.
+    (None, None) if an error occurs.
+  """
+  try:
+    candidate_files = list_payload_files(filename_filter)
+    if not candidate_files:
+      if filename_filter:
+        print(
+            f"No '{PAYLOAD_FILE_PATTERN}' files containing '{filename_filter}'"
+            f" found in '{CONFIG_DIR_PATH}'."
+        )
+      else:
+        print(
+            f"No '{PAYLOAD_FILE_PATTERN}' files found in the"
+            f" '{CONFIG_DIR_PATH}' directory."
+        )
+      return None, None
+
+    selected_file_path = random.choice(candidate_files)
+    print(f"\nSelected function calling payload file: {selected_file_path}")
+
+    payload = load_payload(selected_file_path, substitutions)
+    if payload is None:
+      return None, None
+    return payload, selected_file_path
+
+  except Exception as e:
+    print(f"An error occurred while selecting or loading the payload: {e}")
+    return None, None
+
+
+def extract_function_calls_from_response(response_data):
+  """Extracts function call details from the Gemini API response.
+
+  Args:
+    response_data: a parsed JSON, as returned from Gemini
+
+  Returns:
+    a list of functionCall objects directly from the response.
+  """
+  extracted_function_calls = []
+  if "candidates" in response_data:
+    for candidate in response_data.get("candidates", []):
+      if "content" in candidate and "parts" in candidate["content"]:
+        for part in candidate["content"].get("parts", []):
+          if "functionCall" in part:
+            extracted_function_calls.append(part["functionCall"])
+  return extracted_function_calls
+
+
+def get_model_content(response_data):
+  """Returns the content of the first candidate in a response, or None."""
+  if response_data.get("candidates"):
+    candidate = response_data["candidates"][0]
+    if "content" in candidate:
+      return candidate["content"]
+  return None
+
+
+# The token counts in a response's usageMetadata, and the names they are
+# recorded under. The prompt count includes the cached tokens.
+USAGE_FIELDS = {
+    "promptTokenCount": "prompt_tokens",
+    "cachedContentTokenCount": "cached_tokens",
+    "candidatesTokenCount": "candidates_tokens",
+    "thoughtsTokenCount": "thoughts_tokens",
+    "toolUsePromptTokenCount": "tool_use_prompt_tokens",
+    "totalTokenCount": "total_tokens",
+}
+
+
+def get_usage(response_data):
+  """Returns the token counts in a response, with 0 for any that are missing."""
+  usage_metadata = response_data.get("usageMetadata") or {}
+  return {
+      name: usage_metadata.get(field, 0) for field, name in USAGE_FIELDS.items()
+  }
+
+
+def add_usage(total, usage):
+  """Adds the token counts of one response to a running total, in place."""
+  for name in USAGE_FIELDS.values():
+    total[name] = total.get(name, 0) + usage.get(name, 0)
+  return total
+
+
+def get_text_from_payload(data, datatype="initial_prompt"):
+  """Safely extracts text from payload structures."""
+  try:
+    if datatype == "initial_prompt":
+      return data["contents"][0]["parts"][0]["text"]
+    elif datatype == "final_response":
+      return data["candidates"][0]["content"]["parts"][0]["text"]
+  except (IndexError, KeyError, TypeError):
+    return None
+  return None
+
+
+def get_arg_values(fc_from_api):
+  """Returns the positional argument values for an extracted function call."""
+  args_dict = fc_from_api.get("args")
+  return (
+      list(args_dict.values())
+      if args_dict and isinstance(args_dict, dict)
+      else []
+  )
+
+
+def format_tool_response(function_name, args_dict, result):
+  """Wraps a local function result as a functionResponse part."""
+  response_content_for_tool = args_dict.copy() if args_dict else {}
+  if function_name == "get_max_scrabble_word_score":
+    response_content_for_tool["score"] = result
+  elif function_name == "get_is_known_word":
+    response_content_for_tool["is_known"] = result
+  else:
+    response_content_for_tool["result"] = result
+
+  return {
+      "functionResponse": {
+          "name": function_name,
+          "response": {"content": response_content_for_tool},
+      }
+  }
+
+
+# The parts of the original payload that every later turn sends again.
+_STATIC_PAYLOAD_KEYS = ("tools", "generation_config", "system_instruction")
+
+
+class ConversationHistory:
+  """The contents of a function calling conversation, built up turn by turn.
+
+  Turns are appended in place, and each one is remembered by its identity, so
+  appending the same content object twice is caught without comparing any
+  contents. The payload for the next call is built once, and shares the
+  contents list and the tools, generation_config and system_instruction of
+  the original payload, so each turn costs the same however long the
+  conversation gets.
+  """
+
+  def __init__(self, payload):
+    """Starts the history from the contents of the original payload.
+
+    Args:
+      payload: the original payload, which supplies the first contents and
+        the parts that every later turn sends again.
+    """
+    self._contents = list(payload.get("contents", []))
+    # The contents list keeps every turn alive, so no id is ever reused.
+    self._turn_ids = {id(content) for content in self._contents}
+    self._payload = {
+        key: payload[key]
+        for key in ("contents", *_STATIC_PAYLOAD_KEYS)
+        if payload.get(key) is not None
+    }
+    self._payload["contents"] = self._contents
+
+  def append(self, content):
+    """Adds a turn to the conversation.
+
+    Args:
+      content: a content dict, with a role and parts.
+
+    Returns:
+      True if the turn was added, False if it was already in the history.
+    """
+    if id(content) in self._turn_ids:
+      return False
+    self._turn_ids.add(id(content))
+    self._contents.append(content)
+    return True
+
+  @property
+  def contents(self):
+    return self._contents
+
+  @property
+  def payload(self):
+    """The payload for the next call to generateContent.
+
+    This is the same object on every call, and it changes as turns are added,
+    so send or serialize it before appending the next turn.
+    """
+    return self._payload
+
+  def __len__(self):
+    return len(self._contents)
+
+
+def iter_sse_events(lines):
+  """Parses a server-sent event stream into the JSON in each event.
+
+  Args:
+    lines: an iterable of lines without their line endings, as bytes or str,
+      such as requests.Response.iter_lines().
+
+  Yields:
+    the parsed data of each event, as soon as the event is complete.
+  """
+  data_lines = []
+  for line in lines:
+    if isinstance(line, bytes):
+      line = line.decode("utf-8")
+    if not line:
+      # A blank line ends the event.
+      if data_lines:
+        yield json.loads("\n".join(data_lines))
+        data_lines = []
+    elif line.startswith("data:"):
+      data = line[len("data:") :]
+      data_lines.append(data[1:] if data.startswith(" ") else data)
+  if data_lines:
+    yield json.loads("\n".join(data_lines))
+
+
+def _is_text_part(part):
+  return "text" in part and set(part) <= {"text", "thought", "thoughtSignature"}
+
+
+def merge_stream_chunks(chunks):
+  """Combines streamGenerateContent chunks into one generateContent response.
+
+  Text that arrives in pieces is joined into one part; every other part, such
+  as a functionCall, is kept as it arrived. For everything else, like the
+  finishReason and the usageMetadata, the last chunk wins.
+
+  Args:
+    chunks: the parsed chunks, in the order they arrived.
+
+  Returns:
+    a response shaped like the one generateContent returns.
+  """
+  response = {}
+  merged_candidates = {}
+  for chunk in chunks:
+    for key, value in chunk.items():
+      if key != "candidates":
+        response[key] = value
+    for position, candidate in enumerate(chunk.get("candidates", [])):
+      merged = merged_candidates.setdefault(
+          candidate.get("index", position),
+          {"content": {"role": "model", "parts": []}},
+      )
+      for key, value in candidate.items():
+        if key != "content":
+          merged[key] = value
+      content = candidate.get("content", {})
+      if "role" in content:
+        merged["content"]["role"] = content["role"]
+      parts = merged["content"]["parts"]
+      for part in content.get("parts", []):
+        if (
+            _is_text_part(part)
+            and parts
+            and _is_text_part(parts[-1])
+            and parts[-1].get("thought") == part.get("thought")
+            and not (
+                "thoughtSignature" in parts[-1] and "thoughtSignature" in part
+            )
+        ):
+          parts[-1] = {
+              **parts[-1],
+              **part,
+              "text": parts[-1]["text"] + part["text"],
+          }
+        else:
+          parts.append(part)
+  if merged_candidates:
+    response["candidates"] = [
+        merged_candidates[index] for index in sorted(merged_candidates)
+    ]
+  return response
@@ -0,0 +1,168 @@
+"""A client-side HTTP response cache that follows the cache headers."""
+
+# Copyright © 2025-2026 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# The cache keeps the decoded JSON body of each response together with its
+# validators (ETag, Last-Modified) and the time it stops being fresh, derived
+# from Cache-Control max-age, or from Expires. While an entry is fresh it can
+# be used without touching the network. Once it is stale, the caller sends a
+# conditional request with the headers from conditional_headers(); a 304 reply
+# makes the stored body fresh again without downloading it.
+#
+# This works with the headers of both requests and httpx responses, since both
+# look up header names without regard to case.
+
+import email.utils
+import time
+
+
+def _parse_http_date(value):
+  """Returns the epoch time of an HTTP date header, or None."""
+  if not value:
+    return None
+  try:
+    return email.utils.parsedate_to_datetime(value).timestamp()
+  except (TypeError, ValueError):
+    return None
+
+
+def _parse_cache_control(value):
+  """Parses a Cache-Control header into a dict of lowercased directives."""
+  directives = {}
+  for item in (value or "").split(","):
+    name, _, argument = item.strip().partition("=")
+    if name:
+      directives[name.lower()] = argument.strip('"') or None
+  return directives
+
+
+def freshness_lifetime(headers, now=None):
+  """Returns how many seconds a response stays fresh, or None if not storable.
+
+  Args:
+    headers: the response headers.
+    now: the current epoch time, used when the response has no Date header.
+
+  Returns:
+    the remaining freshness lifetime in seconds (0 means store, but revalidate
+    before every use), or None if the response must not be stored.
+  """
+  now = time.time() if now is None else now
+  directives = _parse_cache_control(headers.get("Cache-Control"))
+  if "no-store" in directives:
+    return None
+  if "no-cache" in directives:
+    return 0
+
+  age = 0
+  try:
+    age = max(0, int(headers.get("Age") or 0))
+  except ValueError:
+    pass
+
+  max_age = directives.get("max-age")
+  if max_age is not None:
+    try:
+      return max(0, int(max_age) - age)
+    except ValueError:
+      return 0
+
+  expires = _parse_http_date(headers.get("Expires"))
+  if expires is not None:
+    date = _parse_http_date(headers.get("Date")) or now
+    return max(0, expires - date)
+  return 0
+
+
+class HttpCache:
+  """Caches decoded JSON responses by URL, honouring the cache headers."""
+
+  def __init__(self, store):
+    """Creates the cache.
+
+    Args:
+      store: a caches.TTLCache to hold the entries. Its TTL bounds how long a
+        stale entry is kept around for revalidation.
+    """
+    self._store = store
+
+  def lookup(self, url):
+    """Returns the cached entry for url, fresh or stale, or None."""
+    return self._store.get(url)
+
+  @staticmethod
+  def is_fresh(entry):
+    """Returns True if the entry can be used without revalidating."""
+    return entry is not None and entry["fresh_until"] > time.time()
+
+  @staticmethod
+  def conditional_headers(entry):
+    """Returns the headers that revalidate a stale entry."""
+    headers = {}
+    if entry is not None:
+      if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+      if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+  def store(self, url, headers, body):
+    """Stores a 200 response, if its headers allow it.
+
+    Args:
+      url: the request url.
+      headers: the response headers.
+      body: the decoded JSON body.
+
+    Returns:
+      the stored entry, or None if the response is not storable.
+    """
+    lifetime = freshness_lifetime(headers)
+    if lifetime is None:
+      self._store.delete(url)
+      return None
+    entry = {
+        "body": body,
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+        "fresh_until": time.time() + lifetime,
+    }
+    if lifetime == 0 and not (entry["etag"] or entry["last_modified"]):
+      # Nothing to revalidate with, so it would never be used.
+      return None
+    self._store.set(url, entry)
+    return entry
+
+  def revalidated(self, url, entry, headers):
+    """Refreshes an entry after the server answered 304 Not Modified.
+
+    Args:
+      url: the request url.
+      entry: the stale entry that was revalidated.
+      headers: the headers of the 304 response.
+
+    Returns:
+      the refreshed entry.
+    """
+    lifetime = freshness_lifetime(headers)
+    entry = dict(entry)
+    entry["fresh_until"] = time.time() + (lifetime or 0)
+    entry["etag"] = headers.get("ETag") or entry.get("etag")
+    entry["last_modified"] = headers.get("Last-Modified") or entry.get(
+        "last_modified"
+    )
+    self._store.set(url, entry)
+    return entry
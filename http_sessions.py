@@ -0,0 +1,229 @@
+"""Shared, pooled HTTP sessions for calls to upstream services."""
+
+# Copyright © 2025-2026 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# Calling requests.get() directly opens a new connection, with a new TLS
+# handshake, for every request. Instead, the functions here keep one
+# requests.Session per upstream host. Each session has its own urllib3
+# connection pool, which is safe to share across threads, so repeated tool
+# calls reuse warm keep-alive connections.
+#
+# Settings come from the environment, read the first time a session is
+# created:
+#   HTTP_POOL_MAXSIZE       connections kept per host (default 10)
+#   HTTP_KEEPALIVE_SECONDS  idle time before TCP keep-alive probes start;
+#                           0 leaves the OS defaults alone (default 60)
+#   HTTP_CONNECT_TIMEOUT    seconds to wait for a connection (default 3.05)
+#   HTTP_READ_TIMEOUT       seconds to wait for each read of the answer
+#                           (default 10)
+# The sessions do not apply the timeouts themselves, since a model call may
+# legitimately take longer; callers pass get_timeout() to each request.
+#
+# When tracing is on (see tracing.py), each request is an "http.request" span,
+# with an "http.connect" span for each new connection (including the TLS
+# handshake), "http.ttfb" up to the response headers, and "http.body" for
+# reading the body. A streamed body is read by the caller, outside the span.
+
+import os
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+import tracing
+from urllib3.connection import HTTPConnection
+from urllib3.connection import HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool
+from urllib3.connectionpool import HTTPSConnectionPool
+
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_KEEPALIVE_SECONDS = 60
+# Just over a multiple of 3s, the TCP retransmission window.
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10.0
+
+_lock = threading.Lock()
+_sessions = {}
+_settings = {}
+
+
+def configure(pool_maxsize=None, keepalive_seconds=None):
+  """Overrides the pool settings for sessions created after this call.
+
+  Args:
+    pool_maxsize: the maximum number of connections to keep per host.
+    keepalive_seconds: idle seconds before TCP keep-alive probes are sent, or 0
+      to leave the OS defaults alone.
+  """
+  with _lock:
+    if pool_maxsize is not None:
+      _settings["pool_maxsize"] = pool_maxsize
+    if keepalive_seconds is not None:
+      _settings["keepalive_seconds"] = keepalive_seconds
+
+
+def _get_setting(name, env_var, default, parse=int):
+  if name not in _settings:
+    _settings[name] = parse(os.environ.get(env_var, default))
+  return _settings[name]
+
+
+class _TracedHTTPConnection(HTTPConnection):
+
+  def connect(self):
+    with tracing.span("http.connect", host=self.host):
+      super().connect()
+
+
+class _TracedHTTPSConnection(HTTPSConnection):
+
+  def connect(self):
+    with tracing.span("http.connect", host=self.host, tls=True):
+      super().connect()
+
+
+class _TracedHTTPConnectionPool(HTTPConnectionPool):
+  ConnectionCls = _TracedHTTPConnection
+
+
+class _TracedHTTPSConnectionPool(HTTPSConnectionPool):
+  ConnectionCls = _TracedHTTPSConnection
+
+
+class _KeepAliveAdapter(HTTPAdapter):
+  """An HTTPAdapter that turns on TCP keep-alive for its pooled sockets."""
+
+  def __init__(self, keepalive_seconds, **kwargs):
+    self._keepalive_seconds = keepalive_seconds
+    super().__init__(**kwargs)
+
+  def init_poolmanager(self, *args, **kwargs):
+    if self._keepalive_seconds > 0:
+      socket_options = list(HTTPConnection.default_socket_options)
+      socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+      if hasattr(socket, "TCP_KEEPIDLE"):
+        socket_options.append(
+            (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self._keepalive_seconds)
+        )
+      kwargs["socket_options"] = socket_options
+    super().init_poolmanager(*args, **kwargs)
+    self.poolmanager.pool_classes_by_scheme = {
+        "http": _TracedHTTPConnectionPool,
+        "https": _TracedHTTPSConnectionPool,
+    }
+
+
+class _TracedSession(requests.Session):
+  """A Session that times each request in stages, when tracing is on."""
+
+  def send(self, request, **kwargs):
+    if not tracing.is_enabled():
+      return super().send(request, **kwargs)
+    parts = urlsplit(request.url)
+    stream = kwargs.get("stream", False)
+    # Read the body here, rather than inside super().send(), to time it.
+    kwargs["stream"] = True
+    with tracing.span(
+        "http.request",
+        method=request.method,
+        host=parts.netloc,
+        path=parts.path,
+    ) as request_span:
+      with tracing.span("http.ttfb"):
+        response = super().send(request, **kwargs)
+      request_span.set(status=response.status_code)
+      if not stream:
+        start_ns = time.perf_counter_ns()
+        content = response.content
+        tracing.record(
+            "http.body", start_ns, time.perf_counter_ns(), bytes=len(content)
+        )
+    return response
+
+
+def _new_session():
+  pool_maxsize = _get_setting(
+      "pool_maxsize", "HTTP_POOL_MAXSIZE", DEFAULT_POOL_MAXSIZE
+  )
+  keepalive_seconds = _get_setting(
+      "keepalive_seconds", "HTTP_KEEPALIVE_SECONDS", DEFAULT_KEEPALIVE_SECONDS
+  )
+  adapter = _KeepAliveAdapter(
+      keepalive_seconds,
+      pool_connections=1,
+      pool_maxsize=pool_maxsize,
+      pool_block=True,
+  )
+  session = _TracedSession()
+  session.mount("https://", adapter)
+  session.mount("http://", adapter)
+  return session
+
+
+def get_session(url):
+  """Returns the shared session for the scheme and host of the given url."""
+  parts = urlsplit(url)
+  key = (parts.scheme, parts.netloc)
+  session = _sessions.get(key)
+  if session is None:
+    with _lock:
+      session = _sessions.get(key)
+      if session is None:
+        session = _new_session()
+        _sessions[key] = session
+  return session
+
+
+def get_pool_maxsize():
+  """Returns the configured number of pooled connections per host."""
+  with _lock:
+    return _get_setting(
+        "pool_maxsize", "HTTP_POOL_MAXSIZE", DEFAULT_POOL_MAXSIZE
+    )
+
+
+def get_keepalive_seconds():
+  """Returns the configured keep-alive idle time, in seconds."""
+  with _lock:
+    return _get_setting(
+        "keepalive_seconds", "HTTP_KEEPALIVE_SECONDS", DEFAULT_KEEPALIVE_SECONDS
+    )
+
+
+def get_timeout():
+  """Returns the (connect, read) timeouts, in seconds, for upstream requests."""
+  with _lock:
+    return (
+        _get_setting(
+            "connect_timeout",
+            "HTTP_CONNECT_TIMEOUT",
+            DEFAULT_CONNECT_TIMEOUT,
+            float,
+        ),
+        _get_setting(
+            "read_timeout", "HTTP_READ_TIMEOUT", DEFAULT_READ_TIMEOUT, float
+        ),
+    )
+
+
+def close_all():
+  """Closes every shared session and its pooled connections."""
+  with _lock:
+    for session in _sessions.values():
+      session.close()
+    _sessions.clear()
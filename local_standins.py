@@ -0,0 +1,660 @@
+"""Local stand-ins for Gemini, TomTom, weather.gov and the dictionary API."""
+
+# Copyright © 2025-2026 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# Each stand-in is a small HTTP server on localhost that answers the handful of
+# requests the examples make, after a configurable delay. The Gemini stand-in
+# follows a script, based on the placeholders that were filled into the prompt:
+#
+#   weather prompts   turn 1 asks for get_weather_forecast for each place;
+#                     turn 2 answers with text.
+#   scrabble prompts  turn 1 asks for get_is_known_word for each word; turn 2
+#                     asks for get_min_scrabble_word_score for the known words,
+#                     and turn 3 answers with text.
+#
+# Run this module to start the stand-ins and print the environment settings
+# that point the examples at them:
+#
+#   python3 local_standins.py --latency gemini=0.4,tomtom=0.05
+#
+# The Gemini stand-in also serves streamGenerateContent, with alt=sse: it
+# sends each part of the reply as its own event, spreading the delay over
+# them. And it emulates the cachedContents API, for context caching: caches
+# can be created, extended, read and deleted, and expire after their TTL.
+#
+# With a quota, the Gemini stand-in answers model calls beyond that many per
+# second with 429 RESOURCE_EXHAUSTED, and a RetryInfo that says when the next
+# second starts, the way Gemini does when a quota is used up.
+
+import argparse
+import hashlib
+import json
+import re
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import unquote
+from urllib.parse import urlsplit
+
+import text_utils
+
+SERVICES = ("gemini", "tomtom", "weather", "dictionary")
+
+# The environment variable that points each example at a service.
+BASE_URL_ENV_VARS = {
+    "gemini": "BASE_API_URL",
+    "tomtom": "TOMTOM_BASE_URL",
+    "weather": "WEATHER_GOV_BASE_URL",
+    "dictionary": "DICTIONARY_BASE_URL",
+}
+
+# The nonsense and made-up entries in text_utils.ENGLISH_WORDS.
+UNKNOWN_WORDS = {
+    "borogoves",
+    "brillig",
+    "eledricious",
+    "gimble",
+    "gyrattable",
+    "manxome",
+    "mimserable",
+    "pulsameter",
+    "slithy",
+    "toves",
+    "wabe",
+}
+
+FORECAST_MAX_AGE_SECONDS = 60
+
+# How many server-sent events a streamed text answer is split into.
+STREAM_TEXT_PIECES = 3
+
+# The parts of a request that a cachedContent can hold instead.
+CACHEABLE_KEYS = (
+    "tools",
+    "tool_config",
+    "toolConfig",
+    "system_instruction",
+    "systemInstruction",
+)
+
+
+def _digest(text):
+  return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8])
+
+
+def _approx_tokens(value):
+  """A rough token count: about four characters per token."""
+  return max(1, len(json.dumps(value)) // 4)
+
+
+def _find_in_order(text, candidates):
+  """Returns the candidates that occur in text, in order of appearance."""
+  found = []
+  for candidate in candidates:
+    for match in re.finditer(re.escape(candidate), text):
+      found.append((match.start(), candidate))
+  return [candidate for _, candidate in sorted(found)]
+
+
+def scripted_reply(request_payload):
+  """Returns the model content the Gemini stand-in sends for a request."""
+  contents = request_payload.get("contents", [])
+  prompt = ""
+  if contents:
+    prompt = " ".join(p.get("text", "") for p in contents[0].get("parts", []))
+  function_responses = [
+      part["functionResponse"]
+      for content in contents
+      for part in content.get("parts", [])
+      if "functionResponse" in part
+  ]
+  turn = sum(
+      1
+      for content in contents
+      if any("functionResponse" in part for part in content.get("parts", []))
+  )
+
+  calls = []
+  if turn == 0:
+    places = _find_in_order(prompt, text_utils.PLACES)
+    if places:
+      calls = [("get_weather_forecast", {"placename": p}) for p in places]
+    else:
+      words = _find_in_order(prompt, text_utils.ENGLISH_WORDS)
+      calls = [("get_is_known_word", {"candidate": w}) for w in words]
+  elif turn == 1:
+    known_words = [
+        r["response"]["content"]["candidate"]
+        for r in function_responses
+        if r.get("name") == "get_is_known_word"
+        and r["response"]["content"].get("is_known")
+    ]
+    calls = [
+        ("get_min_scrabble_word_score", {"candidate": w}) for w in known_words
+    ]
+
+  if calls:
+    parts = [{"functionCall": {"name": n, "args": a}} for n, a in calls]
+  else:
+    parts = [{
+        "text": (
+            f"Based on {len(function_responses)} function result(s), here"
+            " is the answer."
+        )
+    }]
+  return {"role": "model", "parts": parts}
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+  """Routes requests to the stand-in for the service this server plays."""
+
+  protocol_version = "HTTP/1.1"  # keep-alive, like the real services
+  service = None
+  latency = 0.0
+  # The Gemini stand-in's cachedContents, by name, shared by its threads.
+  cached_contents = None
+  cache_lock = None
+  cache_min_tokens = 0
+  # Model calls allowed per second, or 0 for no limit; the state of the
+  # current one-second window is [start, calls], shared by the threads.
+  quota_per_second = 0
+  quota_window = None
+  quota_lock = None
+
+  def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+    pass
+
+  def _send_json(self, status, body, headers=None):
+    data = json.dumps(body).encode("utf-8")
+    self.send_response(status)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(data)))
+    for name, value in (headers or {}).items():
+      self.send_header(name, value)
+    self.end_headers()
+    self.wfile.write(data)
+
+  def _send_empty(self, status, headers=None):
+    self.send_response(status)
+    self.send_header("Content-Length", "0")
+    for name, value in (headers or {}).items():
+      self.send_header(name, value)
+    self.end_headers()
+
+  def _read_json(self):
+    length = int(self.headers.get("Content-Length") or 0)
+    return json.loads(self.rfile.read(length) or b"{}")
+
+  def do_GET(self):  # pylint: disable=invalid-name
+    time.sleep(self.latency)
+    path = unquote(urlsplit(self.path).path)
+    if self.service == "tomtom":
+      self._tomtom(path)
+    elif self.service == "weather":
+      self._weather(path)
+    elif self.service == "dictionary":
+      self._dictionary(path)
+    else:
+      self._send_json(404, {"error": {"code": 404, "status": "NOT_FOUND"}})
+
+  def do_POST(self):  # pylint: disable=invalid-name
+    path = urlsplit(self.path).path
+    request_payload = self._read_json()
+    if self.service != "gemini":
+      time.sleep(self.latency)
+      self._send_json(404, {"error": {"code": 404, "status": "NOT_FOUND"}})
+      return
+    if path == "/v1beta/cachedContents":
+      time.sleep(self.latency)
+      self._create_cached_content(request_payload)
+      return
+    if self._over_quota():
+      return  # the error was sent
+    cached_tokens = self._resolve_cached_content(request_payload)
+    if cached_tokens is None:
+      return  # the error was sent
+    if path.endswith(":generateContent"):
+      time.sleep(self.latency)
+      self._generate_content(request_payload, cached_tokens)
+    elif path.endswith(":streamGenerateContent"):
+      self._stream_generate_content(request_payload, cached_tokens)
+    else:
+      time.sleep(self.latency)
+      self._send_json(404, {"error": {"code": 404, "status": "NOT_FOUND"}})
+
+  def do_PATCH(self):  # pylint: disable=invalid-name
+    time.sleep(self.latency)
+    name = urlsplit(self.path).path.removeprefix("/v1beta/")
+    request_payload = self._read_json()
+    with self.cache_lock:
+      cached = self._live_cached_content(name)
+      if cached and "ttl" in request_payload:
+        cached["expires"] = time.time() + float(
+            request_payload["ttl"].rstrip("s")
+        )
+    if cached:
+      self._send_json(200, self._cached_content_resource(name, cached))
+    else:
+      self._send_cache_not_found()
+
+  def do_DELETE(self):  # pylint: disable=invalid-name
+    time.sleep(self.latency)
+    name = urlsplit(self.path).path.removeprefix("/v1beta/")
+    with self.cache_lock:
+      cached = self.cached_contents.pop(name, None)
+    if cached:
+      self._send_json(200, {})
+    else:
+      self._send_cache_not_found()
+
+  def _over_quota(self):
+    """Sends a 429 and returns True if this call is beyond the quota."""
+    if not self.quota_per_second:
+      return False
+    now = time.time()
+    with self.quota_lock:
+      if now - self.quota_window[0] >= 1:
+        self.quota_window[:] = [now, 0]
+      self.quota_window[1] += 1
+      if self.quota_window[1] <= self.quota_per_second:
+        return False
+      retry_delay = max(0.0, 1 - (now - self.quota_window[0]))
+    self._send_json(
+        429,
+        {
+            "error": {
+                "code": 429,
+                "message": "Resource has been exhausted (e.g. check quota).",
+                "status": "RESOURCE_EXHAUSTED",
+                "details": [{
+                    "@type": "type.googleapis.com/google.rpc.RetryInfo",
+                    "retryDelay": f"{retry_delay:.3f}s",
+                }],
+            }
+        },
+    )
+    return True
+
+  def _send_cache_not_found(self):
+    self._send_json(
+        403,
+        {
+            "error": {
+                "code": 403,
+                "message": "CachedContent not found (or permission denied)",
+                "status": "PERMISSION_DENIED",
+            }
+        },
+    )
+
+  def _live_cached_content(self, name):
+    """Returns a cachedContent that has not expired; call with cache_lock."""
+    cached = self.cached_contents.get(name)
+    if cached and cached["expires"] <= time.time():
+      del self.cached_contents[name]
+      cached = None
+    return cached
+
+  @staticmethod
+  def _cached_content_resource(name, cached):
+    return {
+        "name": name,
+        "model": cached["model"],
+        "expireTime": time.strftime(
+            "%Y-%m-%dT%H:%M:%SZ", time.gmtime(cached["expires"])
+        ),
+        "usageMetadata": {"totalTokenCount": cached["tokens"]},
+    }
+
+  def _create_cached_content(self, request_payload):
+    cached_parts = {
+        k: request_payload[k] for k in CACHEABLE_KEYS if k in request_payload
+    }
+    tokens = _approx_tokens(cached_parts)
+    if tokens < self.cache_min_tokens:
+      # Like Gemini, refuse to cache too little content.
+      self._send_json(
+          400,
+          {
+              "error": {
+                  "code": 400,
+                  "message": (
+                      "Cached content is too small."
+                      f" total_token_count={tokens},"
+                      f" min_total_token_count={self.cache_min_tokens}"
+                  ),
+                  "status": "INVALID_ARGUMENT",
+              }
+          },
+      )
+      return
+    name = f"cachedContents/{secrets.token_hex(8)}"
+    cached = {
+        "model": request_payload.get("model"),
+        "parts": cached_parts,
+        "tokens": tokens,
+        "expires": (
+            time.time()
+            + float(str(request_payload.get("ttl", "3600s")).rstrip("s"))
+        ),
+    }
+    with self.cache_lock:
+      self.cached_contents[name] = cached
+    self._send_json(200, self._cached_content_resource(name, cached))
+
+  def _resolve_cached_content(self, request_payload):
+    """Checks a request's cachedContent; returns its token count, or None.
+
+    Returns 0 for a request without one. Sends the error response, and
+    returns None, if the request is not valid.
+    """
+    name = request_payload.get("cachedContent")
+    if not name:
+      return 0
+    if any(k in request_payload for k in CACHEABLE_KEYS):
+      time.sleep(self.latency)
+      self._send_json(
+          400,
+          {
+              "error": {
+                  "code": 400,
+                  "message": (
+                      "CachedContent can not be used with GenerateContent"
+                      " request setting system_instruction, tools or"
+                      " tool_config."
+                  ),
+                  "status": "INVALID_ARGUMENT",
+              }
+          },
+      )
+      return None
+    with self.cache_lock:
+      cached = self._live_cached_content(name)
+    if not cached:
+      time.sleep(self.latency)
+      self._send_cache_not_found()
+      return None
+    return cached["tokens"]
+
+  @staticmethod
+  def _usage_metadata(request_payload, content, cached_tokens=0):
+    prompt_tokens = _approx_tokens(request_payload) + cached_tokens
+    candidates_tokens = _approx_tokens(content)
+    usage_metadata = {
+        "promptTokenCount": prompt_tokens,
+        "candidatesTokenCount": candidates_tokens,
+        "totalTokenCount": prompt_tokens + candidates_tokens,
+    }
+    if cached_tokens:
+      usage_metadata["cachedContentTokenCount"] = cached_tokens
+    return usage_metadata
+
+  def _generate_content(self, request_payload, cached_tokens=0):
+    content = scripted_reply(request_payload)
+    self._send_json(
+        200,
+        {
+            "candidates": [{"content": content, "finishReason": "STOP"}],
+            "usageMetadata": self._usage_metadata(
+                request_payload, content, cached_tokens
+            ),
+            "modelVersion": "standin",
+        },
+    )
+
+  def _stream_generate_content(self, request_payload, cached_tokens=0):
+    # Sends one server-sent event per part, spreading the latency over them,
+    # the way a model emits its output as it generates it. Text is split into
+    # a few pieces.
+    content = scripted_reply(request_payload)
+    pieces = []
+    for part in content["parts"]:
+      if "text" in part:
+        words = part["text"].split(" ")
+        step = max(1, len(words) // STREAM_TEXT_PIECES)
+        for start in range(0, len(words), step):
+          text = " ".join(words[start : start + step])
+          pieces.append({"text": text if start == 0 else " " + text})
+      else:
+        pieces.append(part)
+
+    self.send_response(200)
+    self.send_header("Content-Type", "text/event-stream")
+    self.send_header("Transfer-Encoding", "chunked")
+    self.end_headers()
+    for number, piece in enumerate(pieces):
+      time.sleep(self.latency / len(pieces))
+      chunk = {
+          "candidates": [
+              {"content": {"role": "model", "parts": [piece]}, "index": 0}
+          ],
+          "modelVersion": "standin",
+      }
+      if number == len(pieces) - 1:
+        chunk["candidates"][0]["finishReason"] = "STOP"
+        chunk["usageMetadata"] = self._usage_metadata(
+            request_payload, content, cached_tokens
+        )
+      data = f"data: {json.dumps(chunk)}\r\n\r\n".encode("utf-8")
+      self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+      self.wfile.flush()
+    self.wfile.write(b"0\r\n\r\n")
+
+  def _tomtom(self, path):
+    match = re.fullmatch(r"/search/2/geocode/(.+)\.json", path)
+    if not match:
+      self._send_json(404, {"errorText": "not found"})
+      return
+    placename = match.group(1)
+    digest = _digest(placename.casefold())
+    # Somewhere in the contiguous United States, with TomTom's precision.
+    latitude = 30 + (digest % 1500000) / 100000
+    longitude = -120 + ((digest >> 24) % 4000000) / 100000
+    self._send_json(
+        200,
+        {
+            "summary": {"query": placename, "numResults": 1},
+            "results": [{
+                "type": "Geography",
+                "position": {"lat": latitude, "lon": longitude},
+            }],
+        },
+    )
+
+  def _weather(self, path):
+    match = re.fullmatch(r"/points/(-?[\d.]+),(-?[\d.]+)", path)
+    if match:
+      latitude, longitude = match.groups()
+      rounded = f"{round(float(latitude), 4)},{round(float(longitude), 4)}"
+      if rounded != f"{latitude},{longitude}":
+        # Like weather.gov, redirect to the canonical precision.
+        self._send_empty(301, {"Location": f"/points/{rounded}"})
+        return
+      digest = _digest(rounded)
+      office = ("LOT", "SEW", "IND", "PBZ", "LWX", "PQR")[digest % 6]
+      grid = f"{digest % 100},{(digest >> 8) % 100}"
+      host = self.headers.get("Host")
+      self._send_json(
+          200,
+          {
+              "properties": {
+                  "forecast": (
+                      f"http://{host}/gridpoints/{office}/{grid}/forecast"
+                  ),
+              }
+          },
+      )
+      return
+
+    if re.fullmatch(r"/gridpoints/\w+/\d+,\d+/forecast", path):
+      self._forecast(path)
+      return
+    self._send_json(404, {"status": 404, "detail": "not found"})
+
+  def _forecast(self, path):
+    # The forecast changes every FORECAST_MAX_AGE_SECONDS, and carries the
+    # validators the real service sends.
+    generation = int(time.time() // FORECAST_MAX_AGE_SECONDS)
+    etag = f'"{_digest(f"{path}/{generation}"):x}"'
+    headers = {
+        "Cache-Control": f"public, max-age={FORECAST_MAX_AGE_SECONDS}",
+        "ETag": etag,
+        "Last-Modified": time.strftime(
+            "%a, %d %b %Y %H:%M:%S GMT",
+            time.gmtime(generation * FORECAST_MAX_AGE_SECONDS),
+        ),
+    }
+    if self.headers.get("If-None-Match") == etag:
+      self._send_empty(304, headers)
+      return
+    base_temperature = 40 + _digest(path) % 40
+    periods = []
+    for number in range(14):
+      is_night = number % 2 == 1
+      temperature = base_temperature - (12 if is_night else 0) + number // 2
+      periods.append({
+          "number": number + 1,
+          "name": f"Period {number + 1}{' Night' if is_night else ''}",
+          "isDaytime": not is_night,
+          "temperature": temperature,
+          "temperatureUnit": "F",
+          "probabilityOfPrecipitation": {
+              "unitCode": "wmoUnit:percent",
+              "value": (_digest(f"{path}{number}") % 10) * 10,
+          },
+          "shortForecast": "Partly Cloudy",
+          "detailedForecast": f"Partly cloudy, with a high near {temperature}.",
+      })
+    self._send_json(200, {"properties": {"periods": periods}}, headers)
+
+  def _dictionary(self, path):
+    match = re.fullmatch(r"/api/v2/entries/en/(.+)", path)
+    word = match.group(1) if match else ""
+    if word and word.casefold() not in UNKNOWN_WORDS:
+      self._send_json(200, [{"word": word.lower(), "meanings": []}])
+    else:
+      self._send_json(
+          404,
+          {
+              "title": "No Definitions Found",
+              "message": "Sorry pal, we couldn't find definitions.",
+          },
+      )
+
+
+class Standins:
+  """Runs one local server per service, each in a background thread."""
+
+  def __init__(
+      self, latency=None, host="127.0.0.1", cache_min_tokens=0, gemini_quota=0
+  ):
+    """Starts the servers.
+
+    Args:
+      latency: optional dict of service name to seconds of delay per request.
+      host: the address to listen on.
+      cache_min_tokens: the smallest cachedContent, in tokens, the Gemini
+        stand-in accepts. Gemini itself wants about a thousand.
+      gemini_quota: the model calls the Gemini stand-in accepts per second;
+        0 for no limit.
+    """
+    latency = latency or {}
+    self._servers = {}
+    self.base_urls = {}
+    for service in SERVICES:
+      handler = type(
+          f"{service.title()}Handler",
+          (StandinHandler,),
+          {
+              "service": service,
+              "latency": latency.get(service, 0.0),
+              "cached_contents": {},
+              "cache_lock": threading.Lock(),
+              "cache_min_tokens": cache_min_tokens,
+              "quota_per_second": gemini_quota,
+              "quota_window": [0.0, 0],
+              "quota_lock": threading.Lock(),
+          },
+      )
+      server = ThreadingHTTPServer((host, 0), handler)
+      server.daemon_threads = True
+      threading.Thread(target=server.serve_forever, daemon=True).start()
+      self._servers[service] = server
+      self.base_urls[service] = f"http://{host}:{server.server_port}"
+
+  def environment(self):
+    """Returns the environment settings that point the examples here."""
+    settings = {
+        BASE_URL_ENV_VARS[service]: url
+        for service, url in self.base_urls.items()
+    }
+    settings.setdefault("GEMINI_APIKEY", "standin-key")
+    settings.setdefault("TOMTOM_APIKEY", "standin-key")
+    return settings
+
+  def stop(self):
+    for server in self._servers.values():
+      server.shutdown()
+      server.server_close()
+
+
+def parse_latency(spec):
+  """Parses "gemini=0.4,tomtom=0.05" into a dict of seconds per service."""
+  latency = {}
+  for item in (spec or "").split(","):
+    if not item.strip():
+      continue
+    service, _, seconds = item.partition("=")
+    service = service.strip()
+    if service not in SERVICES:
+      raise ValueError(f"Unknown service '{service}'; use one of {SERVICES}.")
+    latency[service] = float(seconds)
+  return latency
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(
+      description="Runs local stand-ins for the upstream services."
+  )
+  parser.add_argument(
+      "--latency",
+      type=str,
+      default="",
+      help=(
+          "Per-request delay in seconds, for example"
+          " 'gemini=0.4,tomtom=0.05,weather=0.1,dictionary=0.05'."
+      ),
+  )
+  parser.add_argument(
+      "--gemini-quota",
+      type=int,
+      default=0,
+      help="Model calls per second before Gemini answers 429 (default: none).",
+  )
+  args = parser.parse_args()
+
+  standins = Standins(
+      parse_latency(args.latency), gemini_quota=args.gemini_quota
+  )
+  for name, value in standins.environment().items():
+    print(f"export {name}={value}")
+  print("\nPress Ctrl-C to stop.")
+  try:
+    threading.Event().wait()
+  except KeyboardInterrupt:
+    standins.stop()
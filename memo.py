@@ -0,0 +1,227 @@
+"""Memoized results of the known functions, keyed on their arguments."""
+
+# Copyright © 2025-2026 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# The caches in callable_functions.py each serve one upstream service. This
+# one sits at the KNOWN_FUNCTIONS boundary instead: a function that
+# callable_functions.FUNCTION_MEMO declares cacheable is called at most once
+# for the same arguments, for as long as its TTL allows, and the result is
+# reused. The key is the function name and the canonical JSON of its
+# arguments. Results that report an error are not kept.
+#
+# The results can live in this process only, or in a file that every process
+# of a run shares, so that no process computes what another already has.
+#
+# Settings, read from the environment on first use:
+#   TOOL_MEMO       memory (default), sqlite, mmap, or off
+#   TOOL_MEMO_FILE  the file for sqlite or mmap (default tool_memo.sqlite or
+#                   tool_memo.mmap)
+#   TOOL_MEMO_SIZE  the entries kept in memory, or the slots of the mmap file
+#                   (default 10000)
+
+import asyncio
+import functools
+import json
+import os
+import threading
+
+import caches
+import callable_functions
+
+BACKENDS = ("memory", "sqlite", "mmap", "off")
+DEFAULT_SIZE = 10000
+
+_MISSING = object()
+_memo = None
+_memo_lock = threading.Lock()
+
+
+def canonical_key(function_name, arg_values):
+  """Returns the function name and arguments as canonical JSON.
+
+  This is what makes two calls identical, for the memo, for coalescing in
+  tool_dispatch.py, and for matching speculations in speculation.py.
+  """
+  return json.dumps(
+      [function_name, list(arg_values)],
+      sort_keys=True,
+      separators=(",", ":"),
+      ensure_ascii=False,
+  )
+
+
+def _is_error(result):
+  return isinstance(result, dict) and "error" in result
+
+
+class Memo:
+  """Remembers the results of the cacheable functions in a store."""
+
+  def __init__(self, store, policies=None):
+    """Configures the memo.
+
+    Args:
+      store: where the results are kept; anything with the get/set interface
+        of caches.TTLCache, caches.SqliteTTLStore or caches.MmapTTLStore.
+      policies: optional dict of function name to {"cacheable",
+        "ttl_seconds"}; defaults to callable_functions.FUNCTION_MEMO.
+    """
+    self._store = store
+    # Only a TTLCache in memory is quick enough to use on an event loop; the
+    # files of the other stores are read and written on a worker thread.
+    self._in_memory = (
+        isinstance(store, caches.TTLCache) and store.filename is None
+    )
+    self._policies = (
+        callable_functions.FUNCTION_MEMO if policies is None else policies
+    )
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+
+  def _count(self, hit):
+    with self._lock:
+      if hit:
+        self.hits += 1
+      else:
+        self.misses += 1
+
+  def _lookup(self, key):
+    value = self._store.get(key, _MISSING)
+    self._count(value is not _MISSING)
+    return value
+
+  def _remember(self, key, result, ttl_seconds):
+    if not _is_error(result):
+      self._store.set(key, result, ttl_seconds=ttl_seconds)
+
+  def _policy(self, function_name):
+    policy = self._policies.get(function_name, {})
+    return policy.get("cacheable", False), policy.get("ttl_seconds")
+
+  def wrap(self, known_functions_map):
+    """Returns a functions map that reuses the results of cacheable functions.
+
+    Args:
+      known_functions_map: a dict mapping function names to callables.
+
+    Returns:
+      a dict with the same keys. The functions that are not cacheable are the
+      originals.
+    """
+    wrapped = {}
+    for name, function in known_functions_map.items():
+      cacheable, ttl_seconds = self._policy(name)
+      wrapped[name] = (
+          self._memoized(name, function, ttl_seconds) if cacheable else function
+      )
+    return wrapped
+
+  def _memoized(self, function_name, target_function, ttl_seconds):
+    @functools.wraps(target_function)
+    def memoized(*arg_values):
+      key = canonical_key(function_name, arg_values)
+      result = self._lookup(key)
+      if result is _MISSING:
+        result = target_function(*arg_values)
+        self._remember(key, result, ttl_seconds)
+      return result
+
+    return memoized
+
+  def wrap_async(self, known_functions_map):
+    """Like wrap(), for a map of coroutine functions."""
+    wrapped = {}
+    for name, function in known_functions_map.items():
+      cacheable, ttl_seconds = self._policy(name)
+      wrapped[name] = (
+          self._memoized_async(name, function, ttl_seconds)
+          if cacheable
+          else function
+      )
+    return wrapped
+
+  def _memoized_async(self, function_name, target_function, ttl_seconds):
+    @functools.wraps(target_function)
+    async def memoized(*arg_values):
+      key = canonical_key(function_name, arg_values)
+      if self._in_memory:
+        result = self._lookup(key)
+      else:
+        result = await asyncio.to_thread(self._lookup, key)
+      if result is _MISSING:
+        result = await target_function(*arg_values)
+        if self._in_memory:
+          self._remember(key, result, ttl_seconds)
+        else:
+          await asyncio.to_thread(self._remember, key, result, ttl_seconds)
+      return result
+
+    return memoized
+
+  def stats(self):
+    """Returns the counts of results reused and computed."""
+    with self._lock:
+      calls = self.hits + self.misses
+      return {
+          "hits": self.hits,
+          "misses": self.misses,
+          "hit_rate": self.hits / calls if calls else 0.0,
+      }
+
+
+def new_store(backend, filename=None, size=DEFAULT_SIZE):
+  """Returns an empty, or shared, store for one of the BACKENDS.
+
+  Args:
+    backend: "memory", "sqlite" or "mmap".
+    filename: the file for sqlite or mmap; defaults to tool_memo.<backend>.
+    size: the entries kept in memory, or the slots of the mmap file.
+
+  Raises:
+    ValueError: for an unknown backend.
+  """
+  if backend == "memory":
+    return caches.TTLCache(size, None)
+  if backend == "sqlite":
+    return caches.SqliteTTLStore(filename or "tool_memo.sqlite", "tool_memo")
+  if backend == "mmap":
+    return caches.MmapTTLStore(filename or "tool_memo.mmap", slots=size)
+  raise ValueError(f"Unknown memo backend '{backend}'; use one of {BACKENDS}.")
+
+
+def get_memo():
+  """Returns the shared Memo configured by the environment, or None if off."""
+  global _memo
+  with _memo_lock:
+    if _memo is None:
+      backend = os.environ.get("TOOL_MEMO", "memory")
+      if backend == "off":
+        return None
+      _memo = Memo(
+          new_store(
+              backend,
+              os.environ.get("TOOL_MEMO_FILE") or None,
+              int(os.environ.get("TOOL_MEMO_SIZE", DEFAULT_SIZE)),
+          )
+      )
+    return _memo
+
+
+def get_stats():
+  """Returns the stats of the shared Memo, or None if memoizing is off."""
+  memo = get_memo()
+  return memo.stats() if memo else None
@@ -0,0 +1,104 @@
+"""Tests for memo.py - the async wrapper against the sqlite store."""
+
+# Copyright © 2025-2026 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+
+import caches
+import memo
+
+_POLICIES = {"lookup": {"cacheable": True, "ttl_seconds": 60}}
+
+
+class _ThreadRecordingStore(caches.SqliteTTLStore):
+  """A SqliteTTLStore that records the threads it is used on."""
+
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.threads = []
+
+  def get(self, key, default=None):
+    self.threads.append(threading.current_thread())
+    return super().get(key, default)
+
+  def set(self, key, value, ttl_seconds=None):
+    self.threads.append(threading.current_thread())
+    super().set(key, value, ttl_seconds=ttl_seconds)
+
+
+class MemoAsyncSqliteTest(unittest.TestCase):
+
+  def setUp(self):
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    self.store = _ThreadRecordingStore(
+        os.path.join(directory.name, "tool_memo.sqlite"), "tool_memo"
+    )
+    self.memo = memo.Memo(self.store, _POLICIES)
+    self.calls = []
+
+  async def _lookup(self, word):
+    self.calls.append(word)
+    return {"word": word, "length": len(word)}
+
+  def test_second_call_is_a_hit(self):
+    lookup = self.memo.wrap_async({"lookup": self._lookup})["lookup"]
+
+    async def run():
+      return await lookup("apple"), await lookup("apple")
+
+    first, second = asyncio.run(run())
+    self.assertEqual(first, {"word": "apple", "length": 5})
+    self.assertEqual(second, first)
+    self.assertEqual(self.calls, ["apple"])
+    self.assertEqual(self.memo.stats()["hits"], 1)
+    self.assertEqual(self.memo.stats()["misses"], 1)
+
+  def test_store_is_used_off_the_event_loop(self):
+    lookup = self.memo.wrap_async({"lookup": self._lookup})["lookup"]
+
+    async def run():
+      loop_thread = threading.current_thread()
+      await lookup("apple")
+      await lookup("apple")
+      return loop_thread
+
+    loop_thread = asyncio.run(run())
+    # A get and a set for the miss, then a get for the hit.
+    self.assertEqual(len(self.store.threads), 3)
+    self.assertNotIn(loop_thread, self.store.threads)
+
+  def test_errors_are_not_kept(self):
+    async def failing_lookup(word):
+      self.calls.append(word)
+      return {"error": "upstream down"}
+
+    lookup = self.memo.wrap_async({"lookup": failing_lookup})["lookup"]
+
+    async def run():
+      await lookup("apple")
+      await lookup("apple")
+
+    asyncio.run(run())
+    self.assertEqual(self.calls, ["apple", "apple"])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,241 @@
+"""Client-side rate limits: a token bucket for each upstream service."""
+
+# Copyright © 2025-2026 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# Many sessions at once can send more requests than an upstream allows: the
+# TomTom key has a QPS limit, weather.gov asks clients to be polite, and
+# Gemini has requests-per-minute and tokens-per-minute quotas. Rather than
+# find out from a 429, every request first takes a token from the bucket of
+# its upstream, shared by all the threads and event loops of the process, and
+# waits for one if the bucket is empty. Time spent waiting shows up as
+# "ratelimit.wait" spans when tracing.
+#
+# A bucket refills at its rate, up to its burst. Each caller reserves its
+# tokens up front, possibly leaving the bucket in debt, and then sleeps until
+# the debt is repaid; so waiters are served in the order they came, without
+# polling, whether they block a thread or await on an event loop.
+#
+# The "gemini_tokens" bucket counts prompt tokens rather than requests. It is
+# charged an estimate before each generateContent, and settled with the
+# promptTokenCount of the response once it arrives.
+#
+# Settings, read from the environment on first use; unset means no limit:
+#   RATE_LIMIT_GEMINI         generateContent requests, e.g. "60/min"
+#   RATE_LIMIT_GEMINI_TOKENS  prompt tokens, e.g. "1000000/min"
+#   RATE_LIMIT_TOMTOM         TomTom requests, e.g. "5/s"
+#   RATE_LIMIT_WEATHER        weather.gov requests
+#   RATE_LIMIT_DICTIONARY     dictionaryapi.dev requests
+# A limit is "<count>/<s|min|h>", optionally followed by ":<burst>"; the burst
+# defaults to the count.
+
+import asyncio
+import json
+import os
+import threading
+import time
+
+import tracing
+
+GEMINI = "gemini"
+GEMINI_TOKENS = "gemini_tokens"
+TOMTOM = "tomtom"
+WEATHER = "weather"
+DICTIONARY = "dictionary"
+UPSTREAMS = (GEMINI, GEMINI_TOKENS, TOMTOM, WEATHER, DICTIONARY)
+
+_PERIODS = {"s": 1.0, "sec": 1.0, "min": 60.0, "m": 60.0, "h": 3600.0}
+# A rough count of characters per token, for estimate_tokens().
+_CHARS_PER_TOKEN = 4
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def parse_limit(value):
+  """Returns (rate per second, burst) for a limit like "5/s" or "60/min:10".
+
+  Raises:
+    ValueError: if the limit is not in that form, or not positive.
+  """
+  limit, _, burst = value.strip().partition(":")
+  count, _, period = limit.partition("/")
+  try:
+    count = float(count)
+    seconds = _PERIODS[period.strip() or "s"]
+    burst = float(burst) if burst else count
+  except (KeyError, ValueError):
+    raise ValueError(
+        f"Bad rate limit '{value}'; use e.g. '5/s', '60/min' or '60/min:10'."
+    ) from None
+  if count <= 0 or burst <= 0:
+    raise ValueError(f"Bad rate limit '{value}'; it must be positive.")
+  return count / seconds, burst
+
+
+class TokenBucket:
+  """Hands out tokens at a steady rate, with bursts of up to `burst`."""
+
+  def __init__(self, name, rate, burst):
+    """Configures the bucket, full.
+
+    Args:
+      name: the upstream, for the stats and the spans.
+      rate: the tokens added per second.
+      burst: the most tokens the bucket holds.
+    """
+    self.name = name
+    self.rate = rate
+    self.burst = burst
+    self._tokens = burst
+    self._updated = time.monotonic()
+    self._lock = threading.Lock()
+    self.acquired = 0
+    self.waits = 0
+    self.waited_seconds = 0.0
+    self.max_wait_seconds = 0.0
+
+  def _reserve(self, tokens):
+    """Takes tokens, in debt if need be; returns the seconds until paid."""
+    with self._lock:
+      now = time.monotonic()
+      self._tokens = min(
+          self.burst, self._tokens + (now - self._updated) * self.rate
+      )
+      self._updated = now
+      self._tokens -= tokens
+      wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+      self.acquired += 1
+      if wait:
+        self.waits += 1
+        self.waited_seconds += wait
+        self.max_wait_seconds = max(self.max_wait_seconds, wait)
+      return wait
+
+  def acquire(self, tokens=1):
+    """Takes tokens, blocking the thread until the bucket can afford them."""
+    wait = self._reserve(tokens)
+    if wait:
+      with tracing.span("ratelimit.wait", upstream=self.name):
+        time.sleep(wait)
+
+  async def acquire_async(self, tokens=1):
+    """Like acquire(), but awaits instead of blocking the event loop.
+
+    A caller that is cancelled while waiting does not get its tokens back.
+    """
+    wait = self._reserve(tokens)
+    if wait:
+      with tracing.span("ratelimit.wait", upstream=self.name):
+        await asyncio.sleep(wait)
+
+  def adjust(self, tokens):
+    """Takes tokens, or gives them back if negative, without waiting."""
+    with self._lock:
+      self._tokens = min(self.burst, self._tokens - tokens)
+
+  def stats(self):
+    with self._lock:
+      return {
+          "rate_per_second": self.rate,
+          "burst": self.burst,
+          "acquired": self.acquired,
+          "waits": self.waits,
+          "waited_seconds": round(self.waited_seconds, 3),
+          "max_wait_seconds": round(self.max_wait_seconds, 3),
+      }
+
+
+def get_bucket(upstream):
+  """Returns the shared TokenBucket of an upstream, or None if it has no limit.
+
+  Raises:
+    ValueError: for an upstream not in UPSTREAMS, or a bad RATE_LIMIT_*.
+  """
+  if upstream not in UPSTREAMS:
+    raise ValueError(f"Unknown upstream '{upstream}'; use one of {UPSTREAMS}.")
+  with _buckets_lock:
+    if upstream not in _buckets:
+      value = os.environ.get(f"RATE_LIMIT_{upstream.upper()}", "").strip()
+      _buckets[upstream] = (
+          TokenBucket(upstream, *parse_limit(value)) if value else None
+      )
+    return _buckets[upstream]
+
+
+def acquire(upstream, tokens=1):
+  """Waits for tokens from the bucket of an upstream, if it has a limit."""
+  bucket = get_bucket(upstream)
+  if bucket:
+    bucket.acquire(tokens)
+
+
+async def acquire_async(upstream, tokens=1):
+  """Like acquire(), but awaits instead of blocking the event loop."""
+  bucket = get_bucket(upstream)
+  if bucket:
+    await bucket.acquire_async(tokens)
+
+
+def estimate_tokens(text):
+  """Returns a rough count of the tokens in a text, e.g. a JSON payload."""
+  return max(1, len(text) // _CHARS_PER_TOKEN)
+
+
+def acquire_gemini(payload):
+  """Waits for a generateContent request, and the tokens of its payload.
+
+  Returns:
+    the tokens the payload was estimated at, to settle_gemini() later; 0 if
+    tokens are not limited.
+  """
+  acquire(GEMINI)
+  bucket = get_bucket(GEMINI_TOKENS)
+  if bucket is None:
+    return 0
+  estimate = estimate_tokens(json.dumps(payload, ensure_ascii=False))
+  bucket.acquire(estimate)
+  return estimate
+
+
+async def acquire_gemini_async(payload):
+  """Like acquire_gemini(), but awaits instead of blocking the event loop."""
+  await acquire_async(GEMINI)
+  bucket = get_bucket(GEMINI_TOKENS)
+  if bucket is None:
+    return 0
+  estimate = estimate_tokens(json.dumps(payload, ensure_ascii=False))
+  await bucket.acquire_async(estimate)
+  return estimate
+
+
+def settle_gemini(estimate, prompt_tokens):
+  """Corrects the tokens charged for a request, once its usage is known."""
+  bucket = get_bucket(GEMINI_TOKENS)
+  if bucket is not None and estimate and prompt_tokens:
+    bucket.adjust(prompt_tokens - estimate)
+
+
+def reset():
+  """Forgets the buckets; the next use reads the settings again."""
+  with _buckets_lock:
+    _buckets.clear()
+
+
+def get_stats():
+  """Returns the stats of each upstream that has a limit."""
+  with _buckets_lock:
+    buckets = [b for b in _buckets.values() if b is not None]
+  return {b.name: b.stats() for b in buckets}
@@ -0,0 +1,297 @@
+"""Retries with backoff for requests that fail for a while, like 429 or 503."""
+
+# Copyright © 2025-2026 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# Gemini answers 429 RESOURCE_EXHAUSTED when a quota is used up, and 500, 503
+# or 504 when it is overloaded. Both pass; giving up on the whole session
+# throws away the turns it has already done. A RetryPolicy sends the request
+# again instead, after a delay:
+#
+#   - the delay the server asked for, if it did: a Retry-After header, or the
+#     retryDelay of a google.rpc.RetryInfo in the error details;
+#   - otherwise an exponential backoff with full jitter, so that sessions that
+#     failed together do not all come back at the same moment.
+#
+# Each session has a RetryBudget: a number of retries and a number of seconds
+# of waiting, across all of its requests. Under quota pressure the sessions
+# slow down, and only fail once their budget is spent: a 429 is retried for as
+# long as the budget lasts, while other failures also stop after max_attempts
+# tries of the same request.
+#
+# Settings, read by from_environment():
+#   GEMINI_RETRY_ATTEMPTS        tries per request, first one included, for
+#                                failures other than 429 (default 5; 1 turns
+#                                retrying off altogether)
+#   GEMINI_RETRY_BASE_DELAY      seconds before the first retry, doubled
+#                                for each one after it (default 1)
+#   GEMINI_RETRY_MAX_DELAY       the longest single wait (default 60)
+#   GEMINI_RETRY_BUDGET          retries per session (default 10)
+#   GEMINI_RETRY_BUDGET_SECONDS  seconds of waiting per session (default 300)
+
+import asyncio
+import email.utils
+import os
+import random
+import threading
+import time
+
+import requests
+
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+# Failures to connect, or to get an answer, are worth another try too.
+RETRYABLE_EXCEPTIONS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+)
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+DEFAULT_BUDGET_RETRIES = 10
+DEFAULT_BUDGET_SECONDS = 300.0
+
+_RETRY_INFO_TYPE = "type.googleapis.com/google.rpc.RetryInfo"
+
+
+def _parse_duration(duration):
+  """Returns the seconds in a protobuf Duration like "34s" or "1.5s"."""
+  if isinstance(duration, str) and duration.endswith("s"):
+    try:
+      return float(duration[:-1])
+    except ValueError:
+      return None
+  return None
+
+
+def _parse_retry_after(value):
+  """Returns the seconds in a Retry-After header: a number, or an HTTP date."""
+  if not value:
+    return None
+  try:
+    return max(0.0, float(value))
+  except ValueError:
+    pass
+  try:
+    retry_at = email.utils.parsedate_to_datetime(value)
+  except (TypeError, ValueError):
+    return None
+  return max(0.0, retry_at.timestamp() - time.time())
+
+
+def server_delay(response):
+  """Returns the seconds the server asked to wait before retrying, or None.
+
+  Args:
+    response: a requests or httpx response.
+  """
+  delay = _parse_retry_after(response.headers.get("Retry-After"))
+  if delay is not None:
+    return delay
+  try:
+    details = response.json().get("error", {}).get("details", [])
+  except (ValueError, AttributeError):
+    return None
+  for detail in details:
+    if isinstance(detail, dict) and detail.get("@type") == _RETRY_INFO_TYPE:
+      return _parse_duration(detail.get("retryDelay"))
+  return None
+
+
+class RetryBudget:
+  """The retries, and the seconds of waiting, that one session may spend."""
+
+  def __init__(self, retries, seconds):
+    self.retries_left = retries
+    self.seconds_left = seconds
+    self.retries = 0
+    self.waited_seconds = 0.0
+    self._lock = threading.Lock()
+
+  def spend(self, delay):
+    """Takes one retry and `delay` seconds; returns False if either is gone."""
+    with self._lock:
+      if self.retries_left < 1 or delay > self.seconds_left:
+        return False
+      self.retries_left -= 1
+      self.seconds_left -= delay
+      self.retries += 1
+      self.waited_seconds += delay
+      return True
+
+  def stats(self):
+    with self._lock:
+      return {
+          "retries": self.retries,
+          "waited_seconds": round(self.waited_seconds, 3),
+      }
+
+
+class RetryPolicy:
+  """Decides which failures to retry, and how long to wait before each try."""
+
+  def __init__(
+      self,
+      max_attempts=DEFAULT_MAX_ATTEMPTS,
+      base_delay=DEFAULT_BASE_DELAY,
+      max_delay=DEFAULT_MAX_DELAY,
+      budget_retries=DEFAULT_BUDGET_RETRIES,
+      budget_seconds=DEFAULT_BUDGET_SECONDS,
+      retryable_exceptions=RETRYABLE_EXCEPTIONS,
+      rng=None,
+  ):
+    """Configures the policy.
+
+    Args:
+      max_attempts: tries per request, the first one included, unless the
+        failure is a 429; 1 means no retries at all.
+      base_delay: the backoff before the first retry, in seconds; it doubles
+        with each retry, up to max_delay.
+      max_delay: the longest wait before a single retry, in seconds. A server
+        that asks for more than the budget allows gets no retry.
+      budget_retries: the retries each session may spend; see new_budget().
+      budget_seconds: the seconds of waiting each session may spend.
+      retryable_exceptions: the exceptions, other than HTTP errors with a
+        status in RETRYABLE_STATUS_CODES, that are worth a retry.
+      rng: optional random.Random, for the jitter.
+    """
+    self.max_attempts = max(1, max_attempts)
+    self.base_delay = base_delay
+    self.max_delay = max_delay
+    self.budget_retries = budget_retries
+    self.budget_seconds = budget_seconds
+    self.retryable_exceptions = retryable_exceptions
+    self._rng = rng or random.Random()
+
+  @classmethod
+  def from_environment(cls, **kwargs):
+    """Returns a policy configured by the GEMINI_RETRY_* settings."""
+    return cls(
+        max_attempts=int(
+            os.environ.get("GEMINI_RETRY_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)
+        ),
+        base_delay=float(
+            os.environ.get("GEMINI_RETRY_BASE_DELAY", DEFAULT_BASE_DELAY)
+        ),
+        max_delay=float(
+            os.environ.get("GEMINI_RETRY_MAX_DELAY", DEFAULT_MAX_DELAY)
+        ),
+        budget_retries=int(
+            os.environ.get("GEMINI_RETRY_BUDGET", DEFAULT_BUDGET_RETRIES)
+        ),
+        budget_seconds=float(
+            os.environ.get(
+                "GEMINI_RETRY_BUDGET_SECONDS", DEFAULT_BUDGET_SECONDS
+            )
+        ),
+        **kwargs,
+    )
+
+  def new_budget(self):
+    """Returns a fresh RetryBudget, for one session."""
+    return RetryBudget(self.budget_retries, self.budget_seconds)
+
+  def _status_code(self, error):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+  def is_retryable(self, error):
+    """Returns True if a request that failed this way may succeed later."""
+    status_code = self._status_code(error)
+    if status_code is not None:
+      return status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, self.retryable_exceptions)
+
+  def delay(self, error, retry_number):
+    """Returns the seconds to wait before a retry.
+
+    Args:
+      error: the error the last try failed with.
+      retry_number: 1 for the first retry, 2 for the second, and so on.
+    """
+    response = getattr(error, "response", None)
+    if response is not None:
+      requested = server_delay(response)
+      if requested is not None:
+        # Wait at least as asked, plus a little, so that sessions that were
+        # told the same thing spread out.
+        return requested + self._rng.uniform(0, self.base_delay)
+    ceiling = min(self.max_delay, self.base_delay * 2 ** (retry_number - 1))
+    return self._rng.uniform(0, ceiling)
+
+  def _next_delay(self, error, attempt, budget):
+    """Returns the delay before the next try, or None to give up."""
+    if self.max_attempts == 1 or not self.is_retryable(error):
+      return None
+    if attempt >= self.max_attempts and self._status_code(error) != 429:
+      return None
+    delay = self.delay(error, attempt)
+    if budget is not None and not budget.spend(delay):
+      return None
+    return delay
+
+  def _report(self, error, attempt, delay):
+    status_code = self._status_code(error)
+    reason = f"status {status_code}" if status_code else type(error).__name__
+    print(
+        f"Request failed ({reason}) on try {attempt}; retrying in {delay:.1f}s."
+    )
+
+  def call(self, send, budget=None, on_retry=None):
+    """Calls send() until it succeeds, or until retrying would not help.
+
+    Args:
+      send: a function of no arguments that makes the request, and raises on
+        failure.
+      budget: optional RetryBudget of the session; each retry spends from it.
+      on_retry: optional function of no arguments, called before each retry,
+        e.g. to discard the partial results of the failed try.
+
+    Returns:
+      what send() returned.
+
+    Raises:
+      the last error, once it is not retryable, the tries are used up, or the
+      budget cannot pay for the wait.
+    """
+    attempt = 1
+    while True:
+      try:
+        return send()
+      except Exception as e:  # pylint: disable=broad-exception-caught
+        delay = self._next_delay(e, attempt, budget)
+        if delay is None:
+          raise
+        self._report(e, attempt, delay)
+      time.sleep(delay)
+      if on_retry:
+        on_retry()
+      attempt += 1
+
+  async def call_async(self, send, budget=None, on_retry=None):
+    """Like call(), for a coroutine function; waits without blocking."""
+    attempt = 1
+    while True:
+      try:
+        return await send()
+      except Exception as e:  # pylint: disable=broad-exception-caught
+        delay = self._next_delay(e, attempt, budget)
+        if delay is None:
+          raise
+        self._report(e, attempt, delay)
+      await asyncio.sleep(delay)
+      if on_retry:
+        on_retry()
+      attempt += 1
@@ -0,0 +1,74 @@
+"""Scores many words at once, with the rules of get_min_scrabble_word_score."""
+
+# Copyright © 2025-2026 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# All the ASCII words are joined into one byte buffer, and a 256-entry lookup
+# table turns every byte into its letter score in a single NumPy operation. A
+# running sum over those scores then yields each word's total as the
+# difference between the sums at its end and at its start.
+
+from callable_functions import get_min_scrabble_word_score
+from callable_functions import LETTER_SCORES
+import numpy as np
+
+BONUS_LENGTH = 9  # each character past this many adds 1 point
+
+_BYTE_SCORES = np.zeros(256, dtype=np.int64)
+for _letter, _score in LETTER_SCORES.items():
+  _BYTE_SCORES[ord(_letter)] = _score
+  _BYTE_SCORES[ord(_letter.lower())] = _score
+
+
+def score_words(words):
+  """Calculates the minimum Scrabble score of every word in a sequence.
+
+  Gives the same result as calling get_min_scrabble_word_score on each word:
+  letters score their standard values regardless of case, other ASCII
+  characters score 0, each character past 9 adds 1 point, and words with
+  non-ASCII characters score 0.
+
+  Args:
+    words: a sequence of strings.
+
+  Returns:
+    a NumPy int64 array with the score of each word.
+  """
+  if not isinstance(words, (list, tuple)):
+    words = list(words)
+  original_words = words
+  count = len(words)
+  is_ascii = np.fromiter(map(str.isascii, words), dtype=bool, count=count)
+  all_ascii = bool(is_ascii.all())
+  if not all_ascii:
+    # Leave these out of the buffer; they are scored one at a time below.
+    words = [word if ok else "" for word, ok in zip(words, is_ascii)]
+
+  lengths = np.fromiter(map(len, words), dtype=np.int64, count=count)
+  buffer = "".join(words).encode("ascii")
+  letter_scores = _BYTE_SCORES[np.frombuffer(buffer, dtype=np.uint8)]
+
+  running_total = np.zeros(len(buffer) + 1, dtype=np.int64)
+  np.cumsum(letter_scores, out=running_total[1:])
+  ends = np.cumsum(lengths)
+  scores = running_total[ends] - running_total[ends - lengths]
+  scores += np.maximum(lengths - BONUS_LENGTH, 0)
+
+  if not all_ascii:
+    # The scalar function decides these; almost all of them score 0, but a
+    # few characters, like "ı", uppercase to ASCII letters.
+    for i in np.flatnonzero(~is_ascii):
+      scores[i] = get_min_scrabble_word_score(original_words[i])
+  return scores
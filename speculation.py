@@ -0,0 +1,160 @@
+"""Speculative function calls, started before the model asks for them."""
+
+# Copyright © 2025-2026 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# When a payload is filled, the words put in place of :PLACE or :ENGLISH_WORD
+# are almost certainly the arguments the model will ask for on its first turn.
+# A Speculator starts those calls in the background, while the first request
+# to the model is in flight. Its wrap() returns a functions map that serves a
+# matching call from the speculation, waiting for it if it is still running,
+# and calls the real function for anything else. Speculations nobody asked for
+# are dropped when the session closes the Speculator.
+
+import concurrent.futures
+import functools
+import threading
+
+import memo
+import tracing
+
+# The function calls to speculate on, for each placeholder. Each is called
+# with the substituted word as its only argument.
+SPECULATIONS = {
+    ":PLACE": ("get_weather_forecast",),
+    ":ENGLISH_WORD": ("get_is_known_word",),
+}
+
+# At most this many speculative calls per session.
+DEFAULT_MAX_CALLS = 8
+DEFAULT_MAX_WORKERS = 4
+
+
+def _speculate(function_name, target_function, word):
+  with tracing.span("speculate", function=function_name):
+    return target_function(word)
+
+
+class Speculator:
+  """Runs the likely function calls of one session ahead of time."""
+
+  def __init__(
+      self,
+      known_functions_map,
+      speculations=None,
+      max_calls=DEFAULT_MAX_CALLS,
+      max_workers=DEFAULT_MAX_WORKERS,
+  ):
+    """Configures the speculator.
+
+    Args:
+      known_functions_map: a dict mapping function names to callables.
+      speculations: a dict of placeholder to the names of the functions to
+        call with its word; defaults to SPECULATIONS.
+      max_calls: the budget of speculative calls for this session.
+      max_workers: how many speculative calls may run at once.
+    """
+    self._known_functions_map = known_functions_map
+    self._speculations = SPECULATIONS if speculations is None else speculations
+    self._max_calls = max_calls
+    self._max_workers = max_workers
+    self._lock = threading.Lock()
+    self._buffer = {}  # key -> Future
+    self._executor = None
+    self.started = 0
+    self.hits = 0
+    self.dropped = 0
+
+  def start(self, substitutions):
+    """Starts the calls that the substituted words suggest.
+
+    Args:
+      substitutions: (placeholder, word) pairs, as collected by
+        gemini_utils.load_payload().
+    """
+    for placeholder, word in substitutions:
+      for function_name in self._speculations.get(placeholder, ()):
+        target_function = self._known_functions_map.get(function_name)
+        if target_function is None:
+          continue
+        key = memo.canonical_key(function_name, (word,))
+        with self._lock:
+          if key in self._buffer or self.started >= self._max_calls:
+            continue
+          if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self._max_workers, thread_name_prefix="speculate"
+            )
+          self._buffer[key] = self._executor.submit(
+              tracing.bind(_speculate), function_name, target_function, word
+          )
+          self.started += 1
+
+  def _take(self, function_name, arg_values):
+    with self._lock:
+      future = self._buffer.pop(
+          memo.canonical_key(function_name, arg_values), None
+      )
+      if future is not None:
+        self.hits += 1
+      return future
+
+  def wrap(self, known_functions_map):
+    """Returns a functions map that uses the speculations where they match.
+
+    Args:
+      known_functions_map: a dict mapping function names to callables.
+
+    Returns:
+      a dict with the same keys. Each function returns the result of a
+      matching speculative call if there is one, and otherwise calls the
+      original function. A speculative call that failed is tried again.
+    """
+
+    def wrap_one(function_name, target_function):
+      @functools.wraps(target_function)
+      def speculative(*arg_values):
+        future = self._take(function_name, arg_values)
+        if future is not None:
+          try:
+            return future.result()
+          except Exception:  # pylint: disable=broad-exception-caught
+            pass
+        return target_function(*arg_values)
+
+      return speculative
+
+    return {
+        name: wrap_one(name, function)
+        for name, function in known_functions_map.items()
+    }
+
+  def close(self):
+    """Drops the speculations nobody asked for, without waiting for them."""
+    with self._lock:
+      self.dropped += len(self._buffer)
+      self._buffer.clear()
+      executor, self._executor = self._executor, None
+    if executor is not None:
+      executor.shutdown(wait=False, cancel_futures=True)
+
+  def stats(self):
+    """Returns the counts of started, used and dropped speculative calls."""
+    with self._lock:
+      return {
+          "started": self.started,
+          "hits": self.hits,
+          "dropped": self.dropped,
+      }
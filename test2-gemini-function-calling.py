@@ -21,15 +21,36 @@
 #
 
 import argparse
-import glob
+import concurrent.futures
 import json
 import os
-import random
+import threading
+import time
 
 from callable_functions import KNOWN_FUNCTIONS
+import context_cache
 from dotenv import load_dotenv
+from gemini_utils import add_usage
+from gemini_utils import ConversationHistory
+from gemini_utils import extract_function_calls_from_response
+from gemini_utils import format_tool_response
+from gemini_utils import get_arg_values
+from gemini_utils import get_model_content
+from gemini_utils import get_text_from_payload
+from gemini_utils import get_usage
+from gemini_utils import iter_sse_events
+from gemini_utils import list_payload_files
+from gemini_utils import load_payload
+from gemini_utils import merge_stream_chunks
+from gemini_utils import select_random_payload
+import http_sessions
+import memo
+import rate_limit
 import requests
-import text_utils
+from retry_policy import RetryPolicy
+import speculation
+import tool_dispatch
+import tracing
 
 load_dotenv()
 
@@ -41,308 +62,895 @@ TEXT_MODEL_NAME = os.environ.get("TEXT_MODEL_NAME", "gemini-2.5-flash")
 GEMINI_APIKEY = os.environ.get("GEMINI_APIKEY", "")
 
 
-def _select_random_payload(filename_filter=None):
-  """Selects a random function candidate-*.json file from the config directory,.
+def _pause(interactive):
+  """Waits for the user, unless running non-interactively."""
+  if interactive:
+    input("\nPress ENTER to continue...")
+
 
-  optionally filtering by a string in the filename.
-  Loads its JSON content, and returns the payload and the selected file path.
+def invoke_with_function_calling(
+    api_key,
+    verbose=False,
+    filename_filter=None,
+    tool_workers=1,
+    tool_timeout=None,
+    interactive=True,
+    payload_file=None,
+    stream=False,
+    context_cache=None,
+    speculate=False,
+    retry_policy=None,
+):
+  """Invokes the Gemini generateContent function.
+
+  Selects a function calling payload randomly (maybe with a filter), and sends
+  its content to the Gemini API. Then parses the response.
+
+  Each item in the list is a dictionary with "name" and "arguments".
+  If verbose is True, logs full request and response payloads.
 
   Args:
-    filename_filter: When present this function restricts found files to those
-      that have names that include this string.
+    api_key: The Gemini api key to apply in the call to generateContent.
+    verbose: boolean flag, if true prints more verbose progress messages.
+    filename_filter: the filename_filter to use when selecting a payload.
+    tool_workers: how many function calls from a single model turn may run
+      concurrently.
+    tool_timeout: optional per-call timeout, in seconds, for tool calls.
+    interactive: if true, pauses for ENTER between the steps.
+    payload_file: optional payload file to use, instead of a random one.
+    stream: if true, uses streamGenerateContent, and starts each function call
+      as soon as it arrives, while the model is still generating.
+    context_cache: optional context_cache.ContextCache; if given, the tools
+      and system_instruction are sent as cached content when possible.
+    speculate: if true, starts the function calls suggested by the words that
+      were filled into the prompt before the model asks for them; see
+      speculation.py.
+    retry_policy: optional RetryPolicy for model calls that fail with a 429,
+      a 5xx or a connection error; defaults to RetryPolicy.from_environment().
+      Each session gets its own budget of retries.
 
   Returns:
-    (payload, selected_file_path) if everything works.
-    (None, None) if an error occurs.
+    a dict describing the session: the payload file, the number of
+    iterations and tool calls, the wall time, the final text, any error, and
+    the time spent on the model call and the tools in each iteration. When
+    streaming, the tools time is only the wait after the stream ended. Also
+    the token counts from the usageMetadata of each model response, and
+    their totals for the session, and the retries it took.
   """
-  try:
-    config_dir_path = "config"
-    file_pattern = "fn-*.json"
-    search_path = os.path.join(config_dir_path, file_pattern)
-
-    all_candidate_files = glob.glob(search_path)
-    if not all_candidate_files:
+  session_result = {
+      "template": payload_file,
+      "iterations": 0,
+      "tool_calls": 0,
+      "wall_seconds": 0.0,
+      "final_text": None,
+      "error": None,
+      "iteration_timings": [],
+      "iteration_usage": [],
+      "usage": add_usage({}, {}),
+  }
+  if not api_key:
+    session_result["error"] = "no API key"
+    return session_result
+
+  with tracing.span("session") as session_span:
+    start_time = time.perf_counter()
+    substitutions = [] if speculate else None
+    with tracing.span("payload.select"):
+      if payload_file:
+        payload, selected_file_path = (
+            load_payload(payload_file, substitutions),
+            payload_file,
+        )
+      else:
+        payload, selected_file_path = select_random_payload(
+            filename_filter=filename_filter, substitutions=substitutions
+        )
+    session_result["template"] = selected_file_path
+    if not payload:
+      session_result["error"] = "no payload"
+      return session_result
+
+    # CPU-bound functions run in worker processes; see tool_dispatch.py.
+    known_functions = tool_dispatch.wrap(KNOWN_FUNCTIONS)
+    if retry_policy is None:
+      retry_policy = RetryPolicy.from_environment()
+    retry_budget = retry_policy.new_budget()
+    speculator = None
+    if speculate:
+      # Start the calls the model will most likely ask for, while the first
+      # request to the model is in flight.
+      speculator = speculation.Speculator(known_functions)
+      speculator.start(substitutions)
+      known_functions = speculator.wrap(known_functions)
+
+    if stream:
+      url = (
+          f"{BASE_API_URL}/v1beta/models/{TEXT_MODEL_NAME}"
+          ":streamGenerateContent?alt=sse"
+      )
+    else:
+      url = f"{BASE_API_URL}/v1beta/models/{TEXT_MODEL_NAME}:generateContent"
+    headers = {"Content-Type": "application/json", "x-goog-api-key": api_key}
+    try:
       print(
-          f"No '{file_pattern}' files found in the '{config_dir_path}'"
-          " directory."
+          "Starting iterative function calling with payload from:"
+          f" {selected_file_path}..."
       )
-      return None, None
-
-    if filename_filter:
-      filtered_files = [
-          f
-          for f in all_candidate_files
-          if filename_filter in os.path.basename(f)
-      ]
-      if not filtered_files:
+      _pause(interactive)
+
+      # `payload` is the original full payload used for the first call.
+      # `history` accumulates the turns for subsequent calls. It starts with the
+      # user's initial prompt.
+      history = ConversationHistory(payload)
+
+      # `current_payload_for_api_call` will be the payload sent in each
+      # iteration. For the first iteration, it's the initial payload.
+      current_payload_for_api_call = payload
+      initial_prompt_text = get_text_from_payload(
+          payload, datatype="initial_prompt"
+      )
+      current_api_response_json = None
+      last_processed_api_response_json = None
+
+      max_iterations = 10
+      for iteration_num in range(max_iterations):
         print(
-            f"No '{file_pattern}' files containing '{filename_filter}' found in"
-            f" '{config_dir_path}'."
+            f"\n--- Iteration {iteration_num + 1} of up to {max_iterations} ---"
         )
-        return None, None
-      selected_file_path = random.choice(filtered_files)
-    else:
-      selected_file_path = random.choice(all_candidate_files)
-    print(f"\nSelected function calling payload file: {selected_file_path}")
+        session_result["iterations"] = iteration_num + 1
+
+        # Make the API call
+        dispatcher = None
+        try:
+          print(f"Calling Model API for iteration {iteration_num + 1}...")
+          if verbose:
+            print("Request Payload:")
+            print(
+                json.dumps(
+                    current_payload_for_api_call,
+                    indent=2,
+                    ensure_ascii=False,
+                )
+            )
+            _pause(interactive)
+
+          iteration_timing = {"model_seconds": 0.0, "tools_seconds": 0.0}
+          session_result["iteration_timings"].append(iteration_timing)
+          model_start_time = time.perf_counter()
+          tool_timings = []
+          if stream:
+            dispatcher = ToolDispatcher(
+                known_functions,
+                max_workers=tool_workers,
+                timeout=tool_timeout,
+                tool_timings=tool_timings,
+            )
+          with tracing.span(
+              "model.call", iteration=iteration_num + 1, stream=stream
+          ) as model_span:
+            request_payload, cached_content = current_payload_for_api_call, None
+            if context_cache:
+              request_payload, cached_content = context_cache.apply(
+                  current_payload_for_api_call
+              )
+              model_span.set(cached_content=cached_content)
+            try:
+              current_api_response_json, first_chunk_seconds = (
+                  _send_model_request(
+                      url,
+                      request_payload,
+                      headers,
+                      dispatcher,
+                      retry_policy,
+                      retry_budget,
+                  )
+              )
+            except requests.exceptions.HTTPError as e_cache:
+              # An expired or deleted cache is refused before any chunk arrives;
+              # forget it, and send this turn inline.
+              if not cached_content or e_cache.response.status_code not in (
+                  400,
+                  403,
+                  404,
+              ):
+                raise
+              print(
+                  f"Cached content {cached_content} was refused; sending"
+                  " inline."
+              )
+              context_cache.invalidate(cached_content)
+              current_api_response_json, first_chunk_seconds = (
+                  _send_model_request(
+                      url,
+                      current_payload_for_api_call,
+                      headers,
+                      dispatcher,
+                      retry_policy,
+                      retry_budget,
+                  )
+              )
+          if first_chunk_seconds is not None:
+            iteration_timing["first_chunk_seconds"] = round(
+                first_chunk_seconds, 6
+            )
+          iteration_timing["model_seconds"] = round(
+              time.perf_counter() - model_start_time, 6
+          )
+          last_processed_api_response_json = current_api_response_json
+          usage = get_usage(current_api_response_json)
+          session_result["iteration_usage"].append(usage)
+          add_usage(session_result["usage"], usage)
+          print("\nResponse from Model API received.")
+          print(f"Tokens: {_format_usage(usage)}")
+          if verbose:
+            print("Response Payload:")
+            print(
+                json.dumps(
+                    current_api_response_json,
+                    indent=2,
+                    ensure_ascii=False,
+                )
+            )
+        except requests.exceptions.RequestException as e_req_iter:
+          print(f"RequestException during API call: {e_req_iter}")
+          if e_req_iter.response is not None:
+            print(f"Response content: {e_req_iter.response.text}")
+          session_result["error"] = str(e_req_iter)
+          if dispatcher:
+            dispatcher.close()
+          break  # Exit loop on API error
+        except json.JSONDecodeError as e_json_iter:
+          print(f"JSONDecodeError during API call: {e_json_iter}")
+          session_result["error"] = str(e_json_iter)
+          if dispatcher:
+            dispatcher.close()
+          break  # Exit loop on API error
+
+        extracted_api_calls = extract_function_calls_from_response(
+            current_api_response_json
+        )
+
+        if not extracted_api_calls:
+          print(
+              "\nNo function calls found in the latest API response. Halting"
+              " iteration."
+          )
+          break
+
+        if interactive or verbose:
+          print("\nTool suggestions:")
+          print(json.dumps(extracted_api_calls, indent=2, ensure_ascii=False))
+        _pause(interactive)
 
-    with open(selected_file_path, "r") as f:
-      payload_str = f.read()
+        model_content_part = get_model_content(current_api_response_json)
 
-    payload_str = text_utils.replace_placeholders_in_string(
-        payload_str, text_utils.REPLACEMENTS
+        # Append the model's response (that contained function calls) to the
+        # history. Each response is a new object, so it is never a duplicate.
+        if model_content_part:
+          history.append(model_content_part)
+        else:
+          print(
+              "Warning: Could not find model's content part in the current"
+              " response to append."
+          )
+
+        tools_start_time = time.perf_counter()
+        with tracing.span(
+            "tools", iteration=iteration_num + 1, calls=len(extracted_api_calls)
+        ):
+          if dispatcher:
+            # The calls have been running since their chunks arrived.
+            print(
+                f"\nCollecting {len(extracted_api_calls)} function call(s)"
+                " started while streaming:"
+            )
+            function_tool_response_parts = dispatcher.collect()
+          else:
+            function_tool_response_parts = execute_and_format_tool_calls(
+                extracted_api_calls,
+                known_functions,
+                max_workers=tool_workers,
+                timeout=tool_timeout,
+                tool_timings=tool_timings,
+            )
+        iteration_timing["tools_seconds"] = round(
+            time.perf_counter() - tools_start_time, 6
+        )
+        iteration_timing["tool_timings"] = tool_timings
+        session_result["tool_calls"] += len(extracted_api_calls)
+
+        tool_response_section = {
+            "role": "user",  # previously "tool" or "function"
+            "parts": function_tool_response_parts,
+        }
+        history.append(tool_response_section)
+
+        if interactive or verbose:
+          print("\nNew Tool response:")
+          print(json.dumps(tool_response_section, indent=2, ensure_ascii=False))
+        _pause(interactive)
+
+        if iteration_num == max_iterations - 1:
+          print(
+              "\nMax iterations reached. The current response is considered"
+              " final."
+          )
+          break
+
+        # Prepare payload for the next iteration
+        current_payload_for_api_call = history.payload
+
+      print("\n--- Iterative Function Calling Process Ended ---")
+      if last_processed_api_response_json:
+        final_response_text = get_text_from_payload(
+            last_processed_api_response_json, datatype="final_response"
+        )
+        session_result["final_text"] = final_response_text
+
+        print("\n--- Summary ---")
+        if initial_prompt_text:
+          print(f"Initial Prompt: {initial_prompt_text}")
+        else:
+          print("Initial Prompt: Could not extract.")
+
+        if final_response_text:
+          print(f"Final Response Text: {final_response_text}")
+        else:
+          print(
+              "Final Response Text: Could not extract or not a text response."
+          )
+        print(f"Tokens Used: {_format_usage(session_result['usage'])}")
+        print("\n")
+      else:
+        print(
+            "No API response was successfully processed to be displayed as"
+            " final."
+        )
+
+    except Exception as e:  # Catch-all for other unexpected errors during setup
+      print(
+          f"An unexpected error occurred in invoke_with_function_calling: {e}"
+      )
+      session_result["error"] = str(e)
+
+    session_result["retries"] = retry_budget.stats()
+    if speculator:
+      speculator.close()
+      session_result["speculation"] = speculator.stats()
+    session_result["wall_seconds"] = round(time.perf_counter() - start_time, 3)
+    session_span.set(
+        template=session_result["template"],
+        iterations=session_result["iterations"],
+        tool_calls=session_result["tool_calls"],
     )
+  return session_result
 
-    payload = json.loads(payload_str)  # Convert back to Python object
-    return payload, selected_file_path
 
-  except FileNotFoundError:
-    # This case should ideally not be reached if glob.glob worked
-    # and random.choice selected a valid file
-    print(f"Error: File {selected_file_path} not found after selection.")
-    return None, None
-  except json.JSONDecodeError:
-    print(f"Error: Could not decode JSON from {selected_file_path}.")
-    return None, None
-  except Exception as e:
-    print(f"An error occurred while selecting or loading the payload: {e}")
-    return None, None
+def _format_usage(usage):
+  """Returns the token counts of a response or a session as one line."""
+  return (
+      f"{usage['prompt_tokens']} prompt ({usage['cached_tokens']} cached),"
+      f" {usage['candidates_tokens']} candidates,"
+      f" {usage['thoughts_tokens']} thoughts, {usage['total_tokens']} total"
+  )
 
 
-def extract_function_calls_from_response(response_data):
-  """Extracts function call details from the Gemini API response.
+def _percentile(sorted_values, fraction):
+  """Returns the nearest-rank percentile of an already sorted list."""
+  if not sorted_values:
+    return 0.0
+  rank = max(
+      0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1)
+  )
+  return sorted_values[rank]
 
-  Args:
-    response_data: a parsed JSON, as returned from Gemini
 
-  Returns:
-    a list of functionCall objects directly from the response.
+def print_batch_report(
+    session_results,
+    elapsed_seconds,
+    coalescing=None,
+    memo_stats=None,
+    rate_limits=None,
+):
+  """Prints aggregate throughput and latency for a batch of sessions.
+
+  Args:
+    session_results: the results of invoke_with_function_calling.
+    elapsed_seconds: the wall time of the whole batch.
+    coalescing: optional stats from tool_dispatch.get_coalescing_stats().
+    memo_stats: optional stats from memo.get_stats().
+    rate_limits: optional stats from rate_limit.get_stats().
   """
-  extracted_function_calls = []
-  if "candidates" in response_data:
-    for candidate in response_data.get("candidates", []):
-      if "content" in candidate and "parts" in candidate["content"]:
-        for part in candidate["content"].get("parts", []):
-          if "functionCall" in part:
-            extracted_function_calls.append(part["functionCall"])
-  return extracted_function_calls
+  completed = [r for r in session_results if not r["error"]]
+  latencies = sorted(r["wall_seconds"] for r in session_results)
+  iterations = sum(r["iterations"] for r in session_results)
+  tool_calls = sum(r["tool_calls"] for r in session_results)
+
+  print("\n--- Batch Report ---")
+  print(
+      f"Sessions: {len(session_results)} ({len(completed)} ok,"
+      f" {len(session_results) - len(completed)} failed) in"
+      f" {elapsed_seconds:.2f}s"
+  )
+  if elapsed_seconds > 0:
+    print(
+        "Throughput:"
+        f" {len(session_results) / elapsed_seconds:.2f} sessions/s,"
+        f" {iterations / elapsed_seconds:.2f} model calls/s,"
+        f" {tool_calls / elapsed_seconds:.2f} tool calls/s"
+    )
+  if latencies:
+    print(
+        "Session latency (s):"
+        f" p50={_percentile(latencies, 0.50):.3f}"
+        f" p90={_percentile(latencies, 0.90):.3f}"
+        f" p99={_percentile(latencies, 0.99):.3f}"
+        f" max={latencies[-1]:.3f}"
+    )
+  first_chunk_latencies = sorted(
+      timing["first_chunk_seconds"]
+      for r in session_results
+      for timing in r["iteration_timings"]
+      if "first_chunk_seconds" in timing
+  )
+  if first_chunk_latencies:
+    print(
+        "Time to first chunk (s):"
+        f" p50={_percentile(first_chunk_latencies, 0.50):.3f}"
+        f" p90={_percentile(first_chunk_latencies, 0.90):.3f}"
+        f" p99={_percentile(first_chunk_latencies, 0.99):.3f}"
+    )
+
+  speculations = [
+      r["speculation"] for r in session_results if "speculation" in r
+  ]
+  if speculations:
+    started = sum(s["started"] for s in speculations)
+    hits = sum(s["hits"] for s in speculations)
+    print(
+        f"Speculative calls: {started} started, {hits} used,"
+        f" {sum(s['dropped'] for s in speculations)} dropped"
+        f" ({hits / started if started else 0:.0%} hit rate)"
+    )
+  retries = [r["retries"] for r in session_results if "retries" in r]
+  retried = sum(1 for r in retries if r["retries"])
+  if retried:
+    print(
+        f"Retried model calls: {sum(r['retries'] for r in retries)} retries"
+        f" in {retried} session(s), waiting"
+        f" {sum(r['waited_seconds'] for r in retries):.1f}s in all"
+    )
+  if coalescing and coalescing["calls"]:
+    print(
+        f"Coalesced tool calls: {coalescing['coalesced']} of"
+        f" {coalescing['calls']} shared a call already in flight"
+        f" ({coalescing['dedup_ratio']:.0%} dedup ratio), up to"
+        f" {coalescing['max_waiters']} waiting on one call"
+    )
+  if memo_stats and memo_stats["hits"] + memo_stats["misses"]:
+    print(
+        f"Memoized tool results: {memo_stats['hits']} reused,"
+        f" {memo_stats['misses']} computed"
+        f" ({memo_stats['hit_rate']:.0%} hit rate)"
+    )
+  for upstream, limit in (rate_limits or {}).items():
+    print(
+        f"Rate limit {upstream}: {limit['waits']} of {limit['acquired']}"
+        f" requests waited, {limit['waited_seconds']:.1f}s in all, up to"
+        f" {limit['max_wait_seconds']:.2f}s"
+    )
 
+  usage = add_usage({}, {})
+  prompt_tokens_by_iteration = {}
+  for r in session_results:
+    add_usage(usage, r["usage"])
+    for number, iteration_usage in enumerate(r["iteration_usage"], 1):
+      prompt_tokens_by_iteration.setdefault(number, []).append(
+          iteration_usage["prompt_tokens"]
+      )
+  if usage["total_tokens"]:
+    print(f"Tokens: {_format_usage(usage)}")
+    if elapsed_seconds > 0:
+      output_tokens = usage["candidates_tokens"] + usage["thoughts_tokens"]
+      print(
+          "Token throughput:"
+          f" {usage['total_tokens'] / elapsed_seconds:.0f} tokens/s,"
+          f" {output_tokens / elapsed_seconds:.0f} output tokens/s"
+      )
+    # Each turn sends the whole conversation so far; this shows how fast it
+    # grows.
+    print("Prompt tokens by iteration:")
+    for number, prompt_tokens in sorted(prompt_tokens_by_iteration.items()):
+      print(
+          f"  {number}: avg={sum(prompt_tokens) / len(prompt_tokens):.0f},"
+          f" max={max(prompt_tokens)} ({len(prompt_tokens)} session(s))"
+      )
 
-def invoke_with_function_calling(api_key, verbose=False, filename_filter=None):
-  """Invokes the Gemini generateContent function.
+  by_template = {}
+  for r in session_results:
+    by_template.setdefault(r["template"], []).append(r)
+  for template, results in sorted(
+      by_template.items(), key=lambda kv: str(kv[0])
+  ):
+    template_latencies = sorted(r["wall_seconds"] for r in results)
+    average_tokens = sum(r["usage"]["total_tokens"] for r in results) / len(
+        results
+    )
+    peak_prompt_tokens = max(
+        (u["prompt_tokens"] for r in results for u in r["iteration_usage"]),
+        default=0,
+    )
+    print(
+        f"  {template}: {len(results)} session(s),"
+        f" p50={_percentile(template_latencies, 0.50):.3f}s,"
+        " avg iterations="
+        f"{sum(r['iterations'] for r in results) / len(results):.1f},"
+        " avg tool calls="
+        f"{sum(r['tool_calls'] for r in results) / len(results):.1f},"
+        f" avg tokens={average_tokens:.0f},"
+        f" peak prompt tokens={peak_prompt_tokens}"
+    )
 
-  Selects a function calling payload randomly (maybe with a filter), and sends
-  its content to the Gemini API. Then parses the response.
 
-  Each item in the list is a dictionary with "name" and "arguments".
-  If verbose is True, logs full request and response payloads.
+def run_batch(
+    api_key,
+    sessions,
+    concurrency,
+    results_path,
+    filename_filter=None,
+    tool_workers=1,
+    tool_timeout=None,
+    stream=False,
+    context_cache=None,
+    speculate=False,
+    retry_policy=None,
+):
+  """Runs function calling sessions unattended, and reports on them.
+
+  The sessions cycle through the matching config/fn-*.json templates, and up
+  to `concurrency` of them run at once. As each session ends, its result is
+  appended as one JSON line to results_path.
 
   Args:
     api_key: The Gemini api key to apply in the call to generateContent.
-    verbose: boolean flag, if true prints more verbose progress messages.
-    filename_filter: the filename_filter to use when selecting a payload.
+    sessions: the number of sessions to run.
+    concurrency: the number of sessions to run at once.
+    results_path: the JSONL file to write the session results to.
+    filename_filter: the filename_filter to use when selecting payloads.
+    tool_workers: passed to invoke_with_function_calling.
+    tool_timeout: passed to invoke_with_function_calling.
+    stream: passed to invoke_with_function_calling.
+    context_cache: passed to invoke_with_function_calling, and shared by all
+      the sessions.
+    speculate: passed to invoke_with_function_calling.
+    retry_policy: passed to invoke_with_function_calling; by default, one
+      from RetryPolicy.from_environment() is shared by all the sessions.
 
   Returns:
-    a list of functionCall items extracted from the response..
+    the list of session results.
   """
-  if not api_key:
+  payload_files = list_payload_files(filename_filter)
+  if not payload_files:
+    print("No payload files match; nothing to run.")
     return []
 
-  payload, selected_file_path = _select_random_payload(
-      filename_filter=filename_filter
+  # Start the worker processes for cpu functions before the clock starts.
+  tool_dispatch.warm_up()
+  if retry_policy is None:
+    retry_policy = RetryPolicy.from_environment()
+  write_lock = threading.Lock()
+  session_results = []
+
+  def run_one(session_num):
+    session_result = invoke_with_function_calling(
+        api_key,
+        filename_filter=filename_filter,
+        tool_workers=tool_workers,
+        tool_timeout=tool_timeout,
+        interactive=False,
+        payload_file=payload_files[session_num % len(payload_files)],
+        stream=stream,
+        context_cache=context_cache,
+        speculate=speculate,
+        retry_policy=retry_policy,
+    )
+    session_result = {"session": session_num, **session_result}
+    with write_lock:
+      session_results.append(session_result)
+      results_file.write(json.dumps(session_result, ensure_ascii=False) + "\n")
+      results_file.flush()
+
+  start_time = time.perf_counter()
+  with open(results_path, "w") as results_file:
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="session"
+    ) as executor:
+      list(executor.map(run_one, range(sessions)))
+  elapsed_seconds = time.perf_counter() - start_time
+
+  session_results.sort(key=lambda r: r["session"])
+  print_batch_report(
+      session_results,
+      elapsed_seconds,
+      tool_dispatch.get_coalescing_stats(),
+      memo.get_stats(),
+      rate_limit.get_stats(),
   )
-  if not payload:
-    return []
+  print(f"Session results written to {results_path}")
+  return session_results
+
+
+def _invoke_tool(fc_from_api, known_functions_map, tool_timings=None):
+  """Executes one extracted function call and formats its functionResponse.
+
+  Args:
+      fc_from_api: A function call object from the API.
+      known_functions_map: A dictionary mapping function names to callable
+        functions.
+      tool_timings: optional list; if given, a dict with the function name and
+        the seconds the call took is appended to it.
+
+  Returns:
+      A formatted function response part, or None if the call failed.
+  """
+  function_name = fc_from_api.get("name")
+  if function_name not in known_functions_map:
+    print(f"Function '{function_name}' is not a known invokable function.")
+    return None
+
+  target_function = known_functions_map[function_name]
+  args_dict = fc_from_api.get("args")
+  arg_values = get_arg_values(fc_from_api)
 
-  url = f"{BASE_API_URL}/v1beta/models/{TEXT_MODEL_NAME}:generateContent"
-  headers = {"Content-Type": "application/json", "x-goog-api-key": api_key}
   try:
+    start_time = time.perf_counter()
+    with tracing.span("tool", function=function_name):
+      result = target_function(*arg_values)
+    if tool_timings is not None:
+      tool_timings.append({
+          "name": function_name,
+          "seconds": round(time.perf_counter() - start_time, 6),
+      })
+    args_repr = ", ".join(f"'{str(arg)}'" for arg in arg_values)
+    print(f"Result of local {function_name}({args_repr}): {result}")
+    return format_tool_response(function_name, args_dict, result)
+  except TypeError as e_type:
     print(
-        "Starting iterative function calling with payload from:"
-        f" {selected_file_path}..."
+        f"TypeError calling local {function_name} with {arg_values}: {e_type}"
     )
-    input("\nPress ENTER to continue...")
+  except Exception as e_exc:
+    print(f"Error calling local {function_name} with {arg_values}: {e_exc}")
+  return None
 
-    # `payload` is the original full payload used for the first call.
-    # `ongoing_contents_list` will accumulate parts for subsequent calls.
-    # It starts with the user's initial prompt.
-    ongoing_contents_list = list(payload.get("contents", []))
 
-    # `current_payload_for_api_call` will be the payload sent in each iteration.
-    # For the first iteration, it's the initial payload.
-    current_payload_for_api_call = payload
-    initial_prompt_text = _get_text_from_payload(payload, type="initial_prompt")
-    current_api_response_json = None
-    last_processed_api_response_json = None
+class _PendingCall:
+  """A submitted function call, and when it started running."""
 
-    max_iterations = 10
-    for iteration_num in range(max_iterations):
-      print(
-          f"\n--- Iteration {iteration_num + 1} of up to {max_iterations} ---"
-      )
+  __slots__ = ("fc_from_api", "future", "started", "deadline")
 
-      # Make the API call
-      response_iter = None
-      try:
-        print(f"Calling Model API for iteration {iteration_num + 1}...")
-        if verbose:
-          print("Request Payload:")
-          print(
-              json.dumps(
-                  current_payload_for_api_call,
-                  indent=2,
-                  ensure_ascii=False,
-              )
-          )
-          input("\nPress ENTER to continue...")
+  def __init__(self, fc_from_api):
+    self.fc_from_api = fc_from_api
+    self.future = None
+    self.started = threading.Event()
+    self.deadline = None
 
-        response_iter = requests.post(
-            url, json=current_payload_for_api_call, headers=headers
-        )
-        response_iter.raise_for_status()
-        current_api_response_json = response_iter.json()
-        last_processed_api_response_json = current_api_response_json
-        print("\nResponse from Model API received.")
-        if verbose:
-          print("Response Payload:")
-          print(
-              json.dumps(
-                  current_api_response_json,
-                  indent=2,
-                  ensure_ascii=False,
-              )
-          )
-      except requests.exceptions.RequestException as e_req_iter:
-        print(f"RequestException during API call: {e_req_iter}")
-        if response_iter is not None:
-          print(f"Response content: {response_iter.text}")
-        break  # Exit loop on API error
-      except json.JSONDecodeError as e_json_iter:
-        print(f"JSONDecodeError during API call: {e_json_iter}")
-        break  # Exit loop on API error
-
-      extracted_api_calls = extract_function_calls_from_response(
-          current_api_response_json
-      )
 
-      if not extracted_api_calls:
-        print(
-            "\nNo function calls found in the latest API response. Halting"
-            " iteration."
-        )
-        break
-
-      print("\nTool suggestions:")
-      print(json.dumps(extracted_api_calls, indent=2, ensure_ascii=False))
-      input("\nPress ENTER to continue...")
-
-      model_content_part = None
-      if current_api_response_json.get("candidates"):
-        candidate = current_api_response_json["candidates"][0]
-        if "content" in candidate:
-          model_content_part = candidate["content"]
-
-      # Append the model's response (that contained function calls) to
-      # ongoing_contents_list Only if it's not the very first iteration's user
-      # prompt (which is already there)
-      if model_content_part and (
-          iteration_num > 0 or ongoing_contents_list != [model_content_part]
-      ):
-        # Check to avoid duplicating the model's response if it was already
-        # added.  This logic might need refinement based on exact desired
-        # accumulation behavior.
-        if not any(
-            part == model_content_part for part in ongoing_contents_list
-        ):
-          ongoing_contents_list.append(model_content_part)
-      elif not model_content_part:
-        print(
-            "Warning: Could not find model's content part in the current"
-            " response to append."
-        )
-
-      function_tool_response_parts = execute_and_format_tool_calls(
-          extracted_api_calls, KNOWN_FUNCTIONS
-      )
+class ToolDispatcher:
+  """Starts function calls on a thread pool as soon as they are known.
 
-      tool_response_section = {
-          "role": "user",  # previously "tool" or "function"
-          "parts": function_tool_response_parts,
-      }
-      ongoing_contents_list.append(tool_response_section)
+  Call submit() for each function call, in the order the model asked for
+  them, then collect() to wait for the results. Each call gets `timeout`
+  seconds from the moment a worker starts running it, so time spent queued
+  behind other calls does not count; a call that does not finish in time, or
+  that cannot get a worker within `timeout` seconds of the calls before it
+  being settled, gets an error response.
+  """
 
-      print("\nNew Tool response:")
-      print(json.dumps(tool_response_section, indent=2, ensure_ascii=False))
-      input("\nPress ENTER to continue...")
+  def __init__(
+      self, known_functions_map, max_workers=1, timeout=None, tool_timings=None
+  ):
+    self._known_functions_map = known_functions_map
+    self._max_workers = max(1, max_workers)
+    self._timeout = timeout
+    self._tool_timings = tool_timings
+    self._executor = None
+    self._pending = []
+
+  def _run(self, call):
+    """Runs in a worker: starts the call's clock, then calls the function."""
+    if self._timeout is not None:
+      call.deadline = time.monotonic() + self._timeout
+    call.started.set()
+    return _invoke_tool(
+        call.fc_from_api, self._known_functions_map, self._tool_timings
+    )
 
-      if iteration_num == max_iterations - 1:
-        print(
-            "\nMax iterations reached. The current response is considered"
-            " final."
-        )
-        break
-
-      # Prepare payload for the next iteration
-      next_api_call_payload_parts = {
-          "contents": ongoing_contents_list,
-          "tools": payload.get("tools"),  # Use original tools definition
-          "generation_config": payload.get(
-              "generation_config"
-          ),  # Use original gen config
-          "system_instruction": payload.get(
-              "system_instruction"
-          ),  # Use original system instruction
-      }
-      current_payload_for_api_call = {
-          k: v for k, v in next_api_call_payload_parts.items() if v is not None
-      }
-
-    print("\n--- Iterative Function Calling Process Ended ---")
-    if last_processed_api_response_json:
-      final_response_text = _get_text_from_payload(
-          last_processed_api_response_json, type="final_response"
+  def submit(self, fc_from_api):
+    """Starts one function call in the background."""
+    if self._executor is None:
+      self._executor = concurrent.futures.ThreadPoolExecutor(
+          max_workers=self._max_workers, thread_name_prefix="tool"
+      )
+    call = _PendingCall(fc_from_api)
+    # Bound, the call's spans nest under the span that submitted it.
+    call.future = self._executor.submit(tracing.bind(self._run), call)
+    self._pending.append(call)
+
+  def _result(self, call):
+    """Returns the call's response part.
+
+    Raises:
+      concurrent.futures.TimeoutError: with the error to send to the model.
+    """
+    if self._timeout is None:
+      return call.future.result()
+    function_name = call.fc_from_api.get("name")
+    # The calls before this one are settled by now, so it waits only for a
+    # worker that a call which timed out may still be holding.
+    if not call.started.wait(self._timeout):
+      raise concurrent.futures.TimeoutError(
+          f"{function_name} did not start within {self._timeout}s; the"
+          " workers are held by calls that timed out."
       )
+    try:
+      return call.future.result(
+          timeout=max(0, call.deadline - time.monotonic())
+      )
+    except concurrent.futures.TimeoutError:
+      raise concurrent.futures.TimeoutError(
+          f"{function_name} did not complete within {self._timeout}s."
+      ) from None
+
+  def collect(self):
+    """Waits for the submitted calls, and returns their response parts.
+
+    Returns:
+      A list of formatted function response parts, in the order the calls
+      were submitted.
+    """
+    function_tool_response_parts = []
+    try:
+      for call in self._pending:
+        try:
+          response_part = self._result(call)
+        except concurrent.futures.TimeoutError as e:
+          error_msg = str(e)
+          print(error_msg)
+          response_part = format_tool_response(
+              call.fc_from_api.get("name"),
+              call.fc_from_api.get("args"),
+              {"error": error_msg},
+          )
+        if response_part:
+          function_tool_response_parts.append(response_part)
+    finally:
+      self.close()
+    return function_tool_response_parts
 
-      print("\n--- Summary ---")
-      if initial_prompt_text:
-        print(f"Initial Prompt: {initial_prompt_text}")
-      else:
-        print("Initial Prompt: Could not extract.")
+  def close(self):
+    """Releases the pool, without waiting for calls that are still running."""
+    self._pending = []
+    if self._executor is not None:
+      # Results of calls that timed out are discarded.
+      self._executor.shutdown(wait=False, cancel_futures=True)
+      self._executor = None
+
+
+def _send_model_request(
+    url,
+    request_payload,
+    headers,
+    dispatcher=None,
+    retry_policy=None,
+    retry_budget=None,
+):
+  """Sends one request to the model, retrying it if it fails for a while.
 
-      if final_response_text:
-        print(f"Final Response Text: {final_response_text}")
-      else:
-        print("Final Response Text: Could not extract or not a text response.")
-      print("\n")
+  Args:
+    url: the generateContent or streamGenerateContent URL.
+    request_payload: the payload to send.
+    headers: the request headers.
+    dispatcher: when streaming, the ToolDispatcher that starts each function
+      call as it arrives; None for generateContent.
+    retry_policy: optional RetryPolicy for 429s, 5xx and connection errors.
+    retry_budget: the session's RetryBudget, that the retries spend.
+
+  Returns:
+    (response, first_chunk_seconds); the latter is None unless streaming.
+  """
+
+  def send():
+    estimated_tokens = rate_limit.acquire_gemini(request_payload)
+    if dispatcher:
+      response, first_chunk_seconds = stream_model_turn(
+          url, request_payload, headers, on_function_call=dispatcher.submit
+      )
     else:
-      print(
-          "No API response was successfully processed to be displayed as final."
+      http_response = http_sessions.get_session(url).post(
+          url, json=request_payload, headers=headers
       )
+      http_response.raise_for_status()
+      with tracing.span("model.decode"):
+        response, first_chunk_seconds = http_response.json(), None
+    rate_limit.settle_gemini(
+        estimated_tokens, get_usage(response)["prompt_tokens"]
+    )
+    return response, first_chunk_seconds
+
+  if retry_policy is None:
+    return send()
+  # A stream that broke off may have started some function calls already;
+  # drop them, since the retry starts them again.
+  return retry_policy.call(
+      send, retry_budget, on_retry=dispatcher.close if dispatcher else None
+  )
 
-  except Exception as e:  # Catch-all for other unexpected errors during setup
-    print(f"An unexpected error occurred in invoke_with_function_calling: {e}")
 
+def stream_model_turn(url, request_payload, headers, on_function_call=None):
+  """Calls streamGenerateContent, and handles each chunk as it arrives.
 
-def _get_text_from_payload(data, datatype="initial_prompt"):
-  """Safely extracts text from payload structures."""
-  try:
-    if datatype == "initial_prompt":
-      return data["contents"][0]["parts"][0]["text"]
-    elif datatype == "final_response":
-      return data["candidates"][0]["content"]["parts"][0]["text"]
-  except (IndexError, KeyError, TypeError):
-    return None
-  return None
+  Args:
+    url: the streamGenerateContent URL, with alt=sse.
+    request_payload: the payload to send.
+    headers: the request headers.
+    on_function_call: optional callable, called with each functionCall as
+      soon as the chunk that carries it has been parsed.
 
+  Returns:
+    (response, first_chunk_seconds): the chunks merged into one response, as
+    generateContent would have returned it, and the seconds until the first
+    chunk arrived.
 
-def execute_and_format_tool_calls(extracted_api_calls, known_functions_map):
+  Raises:
+    requests.exceptions.RequestException: if the request fails.
+    json.JSONDecodeError: if an event is not valid JSON.
+  """
+  start_time = time.perf_counter()
+  first_chunk_seconds = None
+  chunks = []
+  with http_sessions.get_session(url).post(
+      url, json=request_payload, headers=headers, stream=True
+  ) as response:
+    response.raise_for_status()
+    # The body is read here, chunk by chunk, and decoded as it arrives.
+    with tracing.span("model.stream_body") as body_span:
+      # chunk_size=None hands over each chunk as soon as the server sends it.
+      for chunk in iter_sse_events(response.iter_lines(chunk_size=None)):
+        if first_chunk_seconds is None:
+          first_chunk_seconds = time.perf_counter() - start_time
+        chunks.append(chunk)
+        if on_function_call:
+          for fc_from_api in extract_function_calls_from_response(chunk):
+            on_function_call(fc_from_api)
+      body_span.set(chunks=len(chunks))
+  return merge_stream_chunks(chunks), first_chunk_seconds
+
+
+def execute_and_format_tool_calls(
+    extracted_api_calls,
+    known_functions_map,
+    max_workers=1,
+    timeout=None,
+    tool_timings=None,
+):
   """Executes local functions based on extracted API calls.
 
-  Formats their responses into a form Gemini can consume on the next turn..
+  Formats their responses into a form Gemini can consume on the next turn.
+  When max_workers is greater than 1 and the model asked for more than one
+  function in the same turn, the calls run concurrently on a bounded thread
+  pool, so the turn takes as long as the slowest tool rather than the sum of
+  all of them. The response parts are always returned in the order of the
+  original function calls.
 
   Args:
       extracted_api_calls: A list of function call objects from the API.
       known_functions_map: A dictionary mapping function names to callable
         functions.
+      max_workers: the maximum number of tool calls to run at once.
+      timeout: optional number of seconds each call may run. A call that
+        does not finish in time gets an error response; the calls then run on
+        worker threads even if max_workers is 1, one at a time.
+      tool_timings: optional list to append the duration of each call to.
 
   Returns:
       A list of formatted function response parts for the API.
@@ -352,45 +960,24 @@ def execute_and_format_tool_calls(extracted_api_calls, known_functions_map):
     return function_tool_response_parts
 
   print(f"\nExecuting {len(extracted_api_calls)} extracted function call(s):")
-  for fc_from_api in extracted_api_calls:
-    function_name = fc_from_api.get("name")
-    if function_name in known_functions_map:
-      target_function = known_functions_map[function_name]
-      args_dict = fc_from_api.get("args")
-      arg_values = (
-          list(args_dict.values())
-          if args_dict and isinstance(args_dict, dict)
-          else []
+  if timeout is None and (max_workers <= 1 or len(extracted_api_calls) == 1):
+    for fc_from_api in extracted_api_calls:
+      response_part = _invoke_tool(
+          fc_from_api, known_functions_map, tool_timings
       )
+      if response_part:
+        function_tool_response_parts.append(response_part)
+    return function_tool_response_parts
 
-      try:
-        result = target_function(*arg_values)
-        args_repr = ", ".join(f"'{str(arg)}'" for arg in arg_values)
-        print(f"Result of local {function_name}({args_repr}): {result}")
-
-        response_content_for_tool = args_dict.copy() if args_dict else {}
-        if function_name == "get_max_scrabble_word_score":
-          response_content_for_tool["score"] = result
-        elif function_name == "get_is_known_word":
-          response_content_for_tool["is_known"] = result
-        else:
-          response_content_for_tool["result"] = result
-
-        function_tool_response_parts.append({
-            "functionResponse": {
-                "name": function_name,
-                "response": {"content": response_content_for_tool},
-            }
-        })
-      except TypeError as e_type:
-        print(
-            f"TypeError calling local {function_name} with {arg_values}:"
-            f" {e_type}"
-        )
-      except Exception as e_exc:
-        print(f"Error calling local {function_name} with {arg_values}: {e_exc}")
-    else:
-      print(f"Function '{function_name}' is not a known invokable function.")
+  dispatcher = ToolDispatcher(
+      known_functions_map,
+      max_workers=min(max_workers, len(extracted_api_calls)),
+      timeout=timeout,
+      tool_timings=tool_timings,
+  )
+  for fc_from_api in extracted_api_calls:
+    dispatcher.submit(fc_from_api)
+  function_tool_response_parts = dispatcher.collect()
   return function_tool_response_parts
 
 
@@ -411,6 +998,82 @@ if __name__ == "__main__":
       type=str,
       help="Filter payload files by a string contained in their filename.",
   )
+  parser.add_argument(
+      "--tool-workers",
+      type=int,
+      default=1,
+      help=(
+          "Run up to this many function calls from one model turn"
+          " concurrently. The default of 1 runs them one after another."
+      ),
+  )
+  parser.add_argument(
+      "--tool-timeout",
+      type=float,
+      default=None,
+      help="Per-call timeout in seconds for tool calls.",
+  )
+  parser.add_argument(
+      "--stream",
+      action="store_true",
+      help=(
+          "Use streamGenerateContent, and start each function call as soon as"
+          " it arrives."
+      ),
+  )
+  parser.add_argument(
+      "--context-cache",
+      action="store_true",
+      help=(
+          "Send the tools and system_instruction as cached content, through"
+          " the cachedContents API."
+      ),
+  )
+  parser.add_argument(
+      "--context-cache-ttl",
+      type=int,
+      default=context_cache.DEFAULT_TTL_SECONDS,
+      help="With --context-cache, the seconds each cache lives.",
+  )
+  parser.add_argument(
+      "--speculate",
+      action="store_true",
+      help=(
+          "Start the function calls suggested by the words filled into the"
+          " prompt before the model asks for them."
+      ),
+  )
+  parser.add_argument(
+      "--trace",
+      type=str,
+      metavar="FILE",
+      help=(
+          "Record where the time goes, and write the spans to FILE: as JSON"
+          " lines if it ends in .jsonl, otherwise in the Chrome trace-event"
+          " format."
+      ),
+  )
+  parser.add_argument(
+      "--sessions",
+      type=int,
+      default=0,
+      help=(
+          "Run this many sessions unattended, cycling through the payload"
+          " files, instead of one interactive session."
+      ),
+  )
+  parser.add_argument(
+      "--concurrency",
+      type=int,
+      default=4,
+      help="With --sessions, the number of sessions to run at once.",
+  )
+  parser.add_argument(
+      "--results",
+      type=str,
+      default="batch_results.jsonl",
+      help="With --sessions, the JSONL file to write session results to.",
+  )
   args = parser.parse_args()
 
   if not GEMINI_APIKEY:
@@ -420,6 +1083,49 @@ if __name__ == "__main__":
     )
     raise SystemExit
 
-  invoke_with_function_calling(
-      GEMINI_APIKEY, verbose=(not args.quiet), filename_filter=args.filter
-  )
+  if args.trace:
+    tracing.enable()
+
+  shared_context_cache = None
+  if args.context_cache:
+    shared_context_cache = context_cache.ContextCache(
+        BASE_API_URL,
+        TEXT_MODEL_NAME,
+        GEMINI_APIKEY,
+        ttl_seconds=args.context_cache_ttl,
+    )
+
+  if args.sessions:
+    run_batch(
+        GEMINI_APIKEY,
+        args.sessions,
+        args.concurrency,
+        args.results,
+        filename_filter=args.filter,
+        tool_workers=args.tool_workers,
+        tool_timeout=args.tool_timeout,
+        stream=args.stream,
+        context_cache=shared_context_cache,
+        speculate=args.speculate,
+    )
+  else:
+    invoke_with_function_calling(
+        GEMINI_APIKEY,
+        verbose=(not args.quiet),
+        filename_filter=args.filter,
+        tool_workers=args.tool_workers,
+        tool_timeout=args.tool_timeout,
+        stream=args.stream,
+        context_cache=shared_context_cache,
+        speculate=args.speculate,
+    )
+
+  if shared_context_cache:
+    # The caches are only tracked in this process; do not leave them to
+    # expire on their own.
+    shared_context_cache.delete_all()
+
+  if args.trace:
+    tracing.print_summary()
+    tracing.write(args.trace)
+    print(f"Trace written to {args.trace}")
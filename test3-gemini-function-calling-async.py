@@ -0,0 +1,336 @@
+"""Test tool3 - function calling on asyncio, many conversations at once."""
+
+# /// script
+# requires-python = ">=3.13"
+# dependencies = ["httpx", "python-dotenv", "requests"]
+# ///
+
+# Copyright © 2025-2026 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import async_callable_functions
+from dotenv import load_dotenv
+from gemini_utils import add_usage
+from gemini_utils import ConversationHistory
+from gemini_utils import extract_function_calls_from_response
+from gemini_utils import format_tool_response
+from gemini_utils import get_arg_values
+from gemini_utils import get_model_content
+from gemini_utils import get_text_from_payload
+from gemini_utils import get_usage
+from gemini_utils import select_random_payload
+import httpx
+import memo
+import rate_limit
+from retry_policy import RetryPolicy
+import tool_dispatch
+
+load_dotenv()
+
+
+BASE_API_URL = os.environ.get(
+    "BASE_API_URL", "https://generativelanguage.googleapis.com"
+)
+TEXT_MODEL_NAME = os.environ.get("TEXT_MODEL_NAME", "gemini-2.5-flash")
+GEMINI_APIKEY = os.environ.get("GEMINI_APIKEY", "")
+
+
+async def invoke_with_function_calling(
+    client,
+    api_key,
+    verbose=False,
+    filename_filter=None,
+    max_iterations=10,
+    retry_policy=None,
+):
+  """Runs one function calling conversation with Gemini, without blocking.
+
+  This is the asyncio counterpart of invoke_with_function_calling in
+  test2-gemini-function-calling.py. It never waits for the user, so many of
+  these can run concurrently on one event loop.
+
+  Args:
+    client: the httpx.AsyncClient to use for calls to generateContent.
+    api_key: The Gemini api key to apply in the call to generateContent.
+    verbose: boolean flag, if true prints the request and response payloads.
+    filename_filter: the filename_filter to use when selecting a payload.
+    max_iterations: the maximum number of calls to generateContent.
+    retry_policy: optional RetryPolicy for calls to generateContent that
+      fail with a 429, a 5xx or a transport error; by default, one from
+      RetryPolicy.from_environment(). The session gets its own budget.
+
+  Returns:
+    a dict summarizing the conversation, with the token counts of each model
+    response and their totals, and the retries it took.
+  """
+  summary = {
+      "file": None,
+      "iterations": 0,
+      "tool_calls": 0,
+      "final_text": None,
+      "error": None,
+      "iteration_usage": [],
+      "usage": add_usage({}, {}),
+  }
+  payload, selected_file_path = select_random_payload(
+      filename_filter=filename_filter
+  )
+  if not payload:
+    summary["error"] = "no payload"
+    return summary
+  summary["file"] = selected_file_path
+
+  url = f"{BASE_API_URL}/v1beta/models/{TEXT_MODEL_NAME}:generateContent"
+  headers = {"Content-Type": "application/json", "x-goog-api-key": api_key}
+
+  history = ConversationHistory(payload)
+  if retry_policy is None:
+    retry_policy = _new_retry_policy()
+  retry_budget = retry_policy.new_budget()
+  # CPU-bound functions run in worker processes; see tool_dispatch.py.
+  known_functions = tool_dispatch.wrap_async(
+      async_callable_functions.KNOWN_FUNCTIONS
+  )
+  current_payload_for_api_call = payload
+  last_processed_api_response_json = None
+
+  for iteration_num in range(max_iterations):
+    summary["iterations"] = iteration_num + 1
+    if verbose:
+      print("Request Payload:")
+      print(
+          json.dumps(current_payload_for_api_call, indent=2, ensure_ascii=False)
+      )
+
+    async def send():
+      estimated_tokens = await rate_limit.acquire_gemini_async(
+          current_payload_for_api_call
+      )
+      response_iter = await client.post(
+          url, json=current_payload_for_api_call, headers=headers
+      )
+      response_iter.raise_for_status()
+      response_json = response_iter.json()
+      rate_limit.settle_gemini(
+          estimated_tokens, get_usage(response_json)["prompt_tokens"]
+      )
+      return response_json
+
+    try:
+      current_api_response_json = await retry_policy.call_async(
+          send, retry_budget
+      )
+    except httpx.HTTPError as e_req_iter:
+      print(f"HTTPError during API call: {e_req_iter}")
+      summary["error"] = str(e_req_iter)
+      break  # Exit loop on API error
+    except json.JSONDecodeError as e_json_iter:
+      print(f"JSONDecodeError during API call: {e_json_iter}")
+      summary["error"] = str(e_json_iter)
+      break  # Exit loop on API error
+
+    last_processed_api_response_json = current_api_response_json
+    usage = get_usage(current_api_response_json)
+    summary["iteration_usage"].append(usage)
+    add_usage(summary["usage"], usage)
+    if verbose:
+      print("Response Payload:")
+      print(json.dumps(current_api_response_json, indent=2, ensure_ascii=False))
+
+    extracted_api_calls = extract_function_calls_from_response(
+        current_api_response_json
+    )
+    if not extracted_api_calls:
+      break
+
+    model_content_part = get_model_content(current_api_response_json)
+    if model_content_part:
+      history.append(model_content_part)
+
+    function_tool_response_parts = await execute_and_format_tool_calls(
+        extracted_api_calls, known_functions
+    )
+    summary["tool_calls"] += len(extracted_api_calls)
+    history.append({"role": "user", "parts": function_tool_response_parts})
+    current_payload_for_api_call = history.payload
+
+  summary["retries"] = retry_budget.stats()
+  if last_processed_api_response_json:
+    summary["final_text"] = get_text_from_payload(
+        last_processed_api_response_json, datatype="final_response"
+    )
+  return summary
+
+
+def _new_retry_policy():
+  # httpx raises its own errors for failures to connect or to get an answer.
+  return RetryPolicy.from_environment(
+      retryable_exceptions=(httpx.TransportError,)
+  )
+
+
+async def _invoke_tool(fc_from_api, known_functions_map):
+  """Awaits one extracted function call and formats its functionResponse."""
+  function_name = fc_from_api.get("name")
+  if function_name not in known_functions_map:
+    print(f"Function '{function_name}' is not a known invokable function.")
+    return None
+
+  arg_values = get_arg_values(fc_from_api)
+  try:
+    result = await known_functions_map[function_name](*arg_values)
+    return format_tool_response(function_name, fc_from_api.get("args"), result)
+  except Exception as e_exc:
+    print(f"Error calling local {function_name} with {arg_values}: {e_exc}")
+  return None
+
+
+async def execute_and_format_tool_calls(
+    extracted_api_calls, known_functions_map
+):
+  """Runs all the function calls from one model turn concurrently.
+
+  Args:
+      extracted_api_calls: A list of function call objects from the API.
+      known_functions_map: A dictionary mapping function names to coroutine
+        functions.
+
+  Returns:
+      A list of formatted function response parts for the API, in the order of
+      the original calls.
+  """
+  response_parts = await asyncio.gather(*[
+      _invoke_tool(fc_from_api, known_functions_map)
+      for fc_from_api in extracted_api_calls
+  ])
+  return [part for part in response_parts if part]
+
+
+async def run_sessions(api_key, sessions, concurrency, filename_filter=None):
+  """Runs a number of conversations, at most `concurrency` at a time."""
+  semaphore = asyncio.Semaphore(concurrency)
+  retry_policy = _new_retry_policy()
+  limits = httpx.Limits(
+      max_connections=concurrency, max_keepalive_connections=concurrency
+  )
+
+  async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+
+    async def one_session(session_num):
+      async with semaphore:
+        start_time = time.perf_counter()
+        summary = await invoke_with_function_calling(
+            client,
+            api_key,
+            filename_filter=filename_filter,
+            retry_policy=retry_policy,
+        )
+        summary["session"] = session_num
+        summary["seconds"] = round(time.perf_counter() - start_time, 3)
+        print(json.dumps(summary, ensure_ascii=False))
+        return summary
+
+    try:
+      # Start the worker processes for cpu functions before the clock starts.
+      await asyncio.to_thread(tool_dispatch.warm_up)
+      start_time = time.perf_counter()
+      results = await asyncio.gather(*[one_session(n) for n in range(sessions)])
+      elapsed = time.perf_counter() - start_time
+    finally:
+      await async_callable_functions.aclose_client()
+
+  failed = sum(1 for r in results if r["error"])
+  print(
+      f"\n{len(results)} session(s) in {elapsed:.2f}s,"
+      f" {failed} failed, {len(results) / elapsed:.2f} sessions/s."
+  )
+  usage = add_usage({}, {})
+  for r in results:
+    add_usage(usage, r["usage"])
+  print(
+      f"{usage['total_tokens']} tokens ({usage['prompt_tokens']} prompt,"
+      f" {usage['cached_tokens']} cached, {usage['candidates_tokens']}"
+      f" candidates, {usage['thoughts_tokens']} thoughts),"
+      f" {usage['total_tokens'] / elapsed:.0f} tokens/s."
+  )
+  coalescing = tool_dispatch.get_coalescing_stats()
+  if coalescing["calls"]:
+    print(
+        f"{coalescing['coalesced']} of {coalescing['calls']} tool calls"
+        f" shared a call already in flight ({coalescing['dedup_ratio']:.0%}),"
+        f" up to {coalescing['max_waiters']} waiting on one call."
+    )
+  memo_stats = memo.get_stats()
+  if memo_stats and memo_stats["hits"] + memo_stats["misses"]:
+    print(
+        f"{memo_stats['hits']} memoized tool results reused,"
+        f" {memo_stats['misses']} computed."
+    )
+  rate_limits = rate_limit.get_stats()
+  for upstream, limit in rate_limits.items():
+    print(
+        f"Rate limit {upstream}: {limit['waits']} of {limit['acquired']}"
+        f" requests waited, {limit['waited_seconds']:.1f}s in all."
+    )
+  return results
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(
+      description=(
+          "Runs Gemini API function calling conversations concurrently on a"
+          " single asyncio event loop."
+      )
+  )
+  parser.add_argument(
+      "--sessions",
+      type=int,
+      default=1,
+      help="The number of conversations to run.",
+  )
+  parser.add_argument(
+      "--concurrency",
+      type=int,
+      default=100,
+      help="The maximum number of conversations in flight at once.",
+  )
+  parser.add_argument(
+      "--filter",
+      type=str,
+      help="Filter payload files by a string contained in their filename.",
+  )
+  args = parser.parse_args()
+
+  if not GEMINI_APIKEY:
+    print(
+        "No gemini API key found in environment 'GEMINI_APIKEY'. Cannot"
+        " continue."
+    )
+    raise SystemExit
+
+  asyncio.run(
+      run_sessions(
+          GEMINI_APIKEY,
+          args.sessions,
+          args.concurrency,
+          filename_filter=args.filter,
+      )
+  )
@@ -15,7 +15,9 @@
 # limitations under the License.
 #
 
+import functools
 import random
+import re
 
 NAMES = [
     "Roberto",
@@ -98,13 +100,105 @@ REPLACEMENTS = {
 }
 
 
+class Template:
+  """A text with placeholders, tokenized once so it can be filled quickly.
+
+  The text is split into literal pieces and placeholders, so fill() builds
+  the result in a single pass, however many placeholders there are. Where one
+  placeholder is a prefix of another, the longer one matches. Replacement
+  words are inserted as they are; they are never searched for placeholders.
+  """
+
+  def __init__(self, text, placeholders):
+    """Tokenizes the text.
+
+    Args:
+      text: the template text.
+      placeholders: the placeholders to look for, e.g. [":NAME", ":PLACE"].
+    """
+    self._pieces = []
+    self._slots = []  # (index into self._pieces, placeholder)
+    placeholders = sorted({p for p in placeholders if p}, key=len, reverse=True)
+    position = 0
+    if placeholders:
+      pattern = re.compile("|".join(re.escape(p) for p in placeholders))
+      for match in pattern.finditer(text):
+        if match.start() > position:
+          self._pieces.append(text[position : match.start()])
+        self._slots.append((len(self._pieces), match.group()))
+        self._pieces.append(match.group())
+        position = match.end()
+    if position < len(text):
+      self._pieces.append(text[position:])
+
+  def __len__(self):
+    """The number of placeholders in the text."""
+    return len(self._slots)
+
+  def fill(
+      self,
+      replacements_map,
+      rng=random,
+      available_words=None,
+      substitutions=None,
+  ):
+    """Returns the text with a random word in place of each placeholder.
+
+    For each placeholder, the words are drawn without repeats until they are
+    all used, then reshuffled. A placeholder with no words stays as it is.
+
+    Args:
+      replacements_map: a dict of placeholder to list of words.
+      rng: the source of randomness; anything with a shuffle() method.
+      available_words: optional dict of placeholder to the words not drawn
+        yet. Pass the same dict to several fills to draw from the same pools,
+        as if the texts were one.
+      substitutions: optional list; each (placeholder, word) that was filled
+        in is appended to it, in order.
+
+    Returns:
+      the filled text.
+    """
+    pieces = list(self._pieces)
+    if available_words is None:
+      available_words = {}
+    for index, placeholder in self._slots:
+      available_words_for_this_key = available_words.get(placeholder)
+      if not available_words_for_this_key:
+        word_list = replacements_map.get(placeholder)
+        if not word_list:
+          continue
+        available_words_for_this_key = list(word_list)
+        rng.shuffle(available_words_for_this_key)
+        available_words[placeholder] = available_words_for_this_key
+      pieces[index] = available_words_for_this_key.pop()
+      if substitutions is not None:
+        substitutions.append((placeholder, pieces[index]))
+    return "".join(pieces)
+
+
+@functools.lru_cache(maxsize=64)
+def compile_template(text, placeholders):
+  """Returns the Template for a text, reusing it if it was compiled before.
+
+  Args:
+    text: the template text.
+    placeholders: a tuple of the placeholders to look for.
+
+  Returns:
+    a Template.
+  """
+  return Template(text, placeholders)
+
+
 def replace_placeholders_in_string(text_content, replacements_map):
   """Replaces placeholders in a string.
 
   Uses a random selection algorithm for the replacements.
 
   Placeholders are e.g. :NAME, :ENGLISH_WORD. The replacements_map is
-  a dict like {'NAMES': [...], 'ENGLISH_WORDS': [...]}.
+  a dict like {':NAME': [...], ':ENGLISH_WORD': [...]}. The text is compiled
+  into a Template, which is cached, and filled in a single pass.
 
   Args:
     text_content: the starting string
@@ -113,25 +207,9 @@ def replace_placeholders_in_string(text_content, replacements_map):
   Returns:
     a new string with the placeholders replaced.
   """
-  for placeholder, word_list in replacements_map.items():
-    # Initialize as empty before the loop
-    available_words_for_this_key = []
-
-    while placeholder in text_content:
-      if not available_words_for_this_key:
-        if not word_list:  # Original source list is empty, cannot refill.
-          # no more replacements are possible for this placeholder.
-          break
-        # Populate/Re-populate the list here
-        available_words_for_this_key = list(word_list)
-        random.shuffle(available_words_for_this_key)
-
-      # If word_list was empty, the break above would have been hit.
-      # So, if we are here, available_words_for_this_key is populated.
-      replacement_word = available_words_for_this_key.pop()
-      text_content = text_content.replace(placeholder, replacement_word, 1)
-
-  return text_content
+  return compile_template(text_content, tuple(replacements_map)).fill(
+      replacements_map
+  )
 
 
 def read_text_from_file(filename, key_description):
@@ -0,0 +1,312 @@
+"""Runs each known function the way its execution policy says."""
+
+# Copyright © 2025-2026 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# callable_functions.FUNCTION_POLICIES marks each function "io" or "cpu". An io
+# function is called directly, on the caller's thread (or awaited on its event
+# loop). A cpu function is sent, by name, to a pool of worker processes that
+# is started and warmed up once; the arguments and the result are pickled
+# across, and the caller just gets the result back, as if it had called the
+# function itself.
+#
+# Calls are also coalesced: while a call is running, an identical call - the
+# same function, with arguments that serialize to the same canonical JSON
+# (see memo.canonical_key) - from any session in the process waits for it and
+# shares its result, instead of sending its own upstream requests.
+# get_coalescing_stats() tells how often that happened. Before either, the
+# results of cacheable functions are looked up in the memo, if one is
+# configured; see memo.py.
+#
+# Settings, read from the environment on first use:
+#   TOOL_POLICIES          overrides, e.g. "get_min_scrabble_word_score=cpu"
+#   TOOL_PROCESS_WORKERS   worker processes for cpu functions (default: the
+#                          number of CPUs, up to 4)
+#   TOOL_COALESCE          0 runs every call on its own (default 1)
+
+import asyncio
+import concurrent.futures
+import functools
+import importlib
+import multiprocessing
+import os
+import threading
+
+import callable_functions
+import memo
+
+IO = "io"
+CPU = "cpu"
+POLICIES = (IO, CPU)
+
+# The module whose KNOWN_FUNCTIONS the worker processes call.
+REGISTRY_MODULE = "callable_functions"
+DEFAULT_MAX_PROCESS_WORKERS = 4
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class SingleFlight:
+  """Lets concurrent identical calls share a single execution.
+
+  The first caller for a key runs the function; callers that arrive while it
+  runs wait for it, and get the same result, or the same exception. Once it
+  has finished, the next call for the key runs the function again.
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._in_flight = {}  # key -> [Future, waiters]
+    self._in_flight_async = {}  # (event loop, key) -> [Task, waiters]
+    self.calls = 0
+    self.executions = 0
+    self.max_waiters = 0
+
+  def _join(self, in_flight, key, start):
+    """Returns (entry, is_leader), registering the call under key."""
+    with self._lock:
+      self.calls += 1
+      entry = in_flight.get(key)
+      if entry is None:
+        entry = in_flight[key] = [start(), 0]
+        self.executions += 1
+        return entry, True
+      entry[1] += 1
+      self.max_waiters = max(self.max_waiters, entry[1])
+      return entry, False
+
+  def call(self, key, target_function, *arg_values):
+    """Calls target_function(*arg_values), or waits for an identical call."""
+    entry, is_leader = self._join(
+        self._in_flight, key, concurrent.futures.Future
+    )
+    future = entry[0]
+    if not is_leader:
+      return future.result()
+    try:
+      future.set_result(target_function(*arg_values))
+    except BaseException as e:  # the waiters get it too
+      future.set_exception(e)
+    finally:
+      with self._lock:
+        del self._in_flight[key]
+    return future.result()
+
+  async def call_async(self, key, target_function, *arg_values):
+    """Like call(), for a coroutine function, on the running event loop."""
+    loop = asyncio.get_running_loop()
+    loop_key = (loop, key)
+
+    def start():
+      task = loop.create_task(target_function(*arg_values))
+      task.add_done_callback(lambda _: self._finish_async(loop_key))
+      return task
+
+    entry, _ = self._join(self._in_flight_async, loop_key, start)
+    # A waiter that is cancelled leaves the shared call running.
+    return await asyncio.shield(entry[0])
+
+  def _finish_async(self, loop_key):
+    with self._lock:
+      self._in_flight_async.pop(loop_key, None)
+
+  def stats(self):
+    """Returns the counts of calls, executions and shared results."""
+    with self._lock:
+      coalesced = self.calls - self.executions
+      return {
+          "calls": self.calls,
+          "executions": self.executions,
+          "coalesced": coalesced,
+          "max_waiters": self.max_waiters,
+          "dedup_ratio": coalesced / self.calls if self.calls else 0.0,
+      }
+
+
+_single_flight = SingleFlight()
+
+
+def get_coalescing_stats():
+  """Returns the stats of the calls coalesced so far in this process."""
+  return _single_flight.stats()
+
+
+def _coalescing_enabled():
+  return os.environ.get("TOOL_COALESCE", "1") != "0"
+
+
+def _coalesced(function_name, target_function):
+  @functools.wraps(target_function)
+  def coalesced(*arg_values):
+    return _single_flight.call(
+        memo.canonical_key(function_name, arg_values),
+        target_function,
+        *arg_values,
+    )
+
+  return coalesced
+
+
+def _coalesced_async(function_name, target_function):
+  @functools.wraps(target_function)
+  async def coalesced(*arg_values):
+    return await _single_flight.call_async(
+        memo.canonical_key(function_name, arg_values),
+        target_function,
+        *arg_values,
+    )
+
+  return coalesced
+
+
+def get_policies():
+  """Returns the policy of each known function, with any overrides applied."""
+  policies = dict(callable_functions.FUNCTION_POLICIES)
+  for item in os.environ.get("TOOL_POLICIES", "").split(","):
+    if not item.strip():
+      continue
+    name, _, policy = item.partition("=")
+    policy = policy.strip()
+    if policy not in POLICIES:
+      raise ValueError(
+          f"TOOL_POLICIES: unknown policy '{policy}' for '{name.strip()}';"
+          f" use one of {POLICIES}."
+      )
+    policies[name.strip()] = policy
+  return policies
+
+
+def _call_by_name(function_name, arg_values):
+  """Runs in a worker process: calls a known function by its name."""
+  registry = importlib.import_module(REGISTRY_MODULE)
+  return registry.KNOWN_FUNCTIONS[function_name](*arg_values)
+
+
+def _ready():
+  return os.getpid()
+
+
+def get_process_pool():
+  """Returns the shared process pool, starting and warming it on first use."""
+  global _pool
+  with _pool_lock:
+    if _pool is None:
+      max_workers = int(
+          os.environ.get(
+              "TOOL_PROCESS_WORKERS",
+              min(DEFAULT_MAX_PROCESS_WORKERS, os.cpu_count() or 1),
+          )
+      )
+      # Forking a process that already runs threads is not safe; the
+      # forkserver starts clean workers instead, where it is available.
+      start_method = (
+          "forkserver"
+          if "forkserver" in multiprocessing.get_all_start_methods()
+          else "spawn"
+      )
+      _pool = concurrent.futures.ProcessPoolExecutor(
+          max_workers=max_workers,
+          mp_context=multiprocessing.get_context(start_method),
+          initializer=importlib.import_module,
+          initargs=(REGISTRY_MODULE,),
+      )
+      # Start every worker now, so no call pays for a process start.
+      concurrent.futures.wait(
+          [_pool.submit(_ready) for _ in range(max_workers)]
+      )
+    return _pool
+
+
+def warm_up():
+  """Starts the process pool ahead of time, if any function needs it."""
+  if CPU in get_policies().values():
+    get_process_pool()
+
+
+def call_in_process(function_name, *arg_values):
+  """Calls a known function in the process pool, and returns its result.
+
+  Raises:
+    whatever the function raised, or
+    concurrent.futures.process.BrokenProcessPool if a worker died.
+  """
+  try:
+    return (
+        get_process_pool()
+        .submit(_call_by_name, function_name, arg_values)
+        .result()
+    )
+  except concurrent.futures.process.BrokenProcessPool:
+    shutdown()  # start a fresh pool for the next call
+    raise
+
+
+async def call_in_process_async(function_name, *arg_values):
+  """Like call_in_process, but awaits the result instead of blocking."""
+  future = get_process_pool().submit(_call_by_name, function_name, arg_values)
+  try:
+    return await asyncio.wrap_future(future)
+  except concurrent.futures.process.BrokenProcessPool:
+    shutdown()
+    raise
+
+
+def wrap(known_functions_map, policies=None, coalesce=None):
+  """Returns a functions map that runs each function under its policy.
+
+  Args:
+    known_functions_map: a dict mapping function names to callables.
+    policies: optional dict of function name to policy; defaults to
+      get_policies(). Functions without a policy are treated as io.
+    coalesce: whether identical concurrent calls share one execution;
+      defaults to the TOOL_COALESCE setting.
+
+  Returns:
+    a dict with the same keys. The cpu functions call into the process pool;
+    the io functions are the originals. Either kind is coalesced, if asked,
+    and memoized, if the memo is on and the function is cacheable.
+  """
+  policies = get_policies() if policies is None else policies
+  coalesce = _coalescing_enabled() if coalesce is None else coalesce
+  wrapped = {}
+  for name, function in known_functions_map.items():
+    if policies.get(name, IO) == CPU:
+      function = functools.partial(call_in_process, name)
+    wrapped[name] = _coalesced(name, function) if coalesce else function
+  shared_memo = memo.get_memo()
+  return shared_memo.wrap(wrapped) if shared_memo else wrapped
+
+
+def wrap_async(known_functions_map, policies=None, coalesce=None):
+  """Like wrap(), for a map of coroutine functions."""
+  policies = get_policies() if policies is None else policies
+  coalesce = _coalescing_enabled() if coalesce is None else coalesce
+  wrapped = {}
+  for name, function in known_functions_map.items():
+    if policies.get(name, IO) == CPU:
+      function = functools.partial(call_in_process_async, name)
+    wrapped[name] = _coalesced_async(name, function) if coalesce else function
+  shared_memo = memo.get_memo()
+  return shared_memo.wrap_async(wrapped) if shared_memo else wrapped
+
+
+def shutdown():
+  """Stops the process pool; the next cpu call starts a new one."""
+  global _pool
+  with _pool_lock:
+    pool, _pool = _pool, None
+  if pool is not None:
+    pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,307 @@
+"""Span-based tracing of where the time goes in a function calling session."""
+
+# Copyright © 2025-2026 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# Wrap a stage in `with tracing.span("name", key=value):` to time it. Spans
+# nest: the span that is open in the current context becomes the parent, and
+# the outermost one names the trace that all its descendants belong to. To
+# keep that nesting across a thread pool, submit bind(fn) instead of fn.
+#
+# Tracing is off until enable() is called. While it is off, span() returns
+# one shared object that does nothing, so the stages cost a function call and
+# a flag check each.
+#
+# The finished spans can be written as JSON lines, one span per line, or in
+# the Chrome trace-event format, which chrome://tracing and
+# https://ui.perfetto.dev can display as a timeline.
+
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+
+_enabled = False
+_lock = threading.Lock()
+_spans = []
+_ids = itertools.count(1)
+_origin_ns = time.perf_counter_ns()
+_current = contextvars.ContextVar("tracing_current_span", default=None)
+
+
+class _NoopSpan:
+  """Stands in for a span while tracing is off."""
+
+  __slots__ = ()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    return False
+
+  def set(self, **attributes):
+    pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+  """A timed stage; use it as a context manager, through span()."""
+
+  __slots__ = (
+      "name",
+      "attributes",
+      "span_id",
+      "parent_id",
+      "trace_id",
+      "start_ns",
+      "_token",
+  )
+
+  def __init__(self, name, attributes):
+    self.name = name
+    self.attributes = attributes
+    self.span_id = next(_ids)
+    self.parent_id = None
+    self.trace_id = self.span_id
+    self.start_ns = None
+    self._token = None
+
+  def set(self, **attributes):
+    """Adds attributes, e.g. a status code only known at the end."""
+    self.attributes.update(attributes)
+
+  def __enter__(self):
+    parent = _current.get()
+    if parent is not None:
+      self.parent_id = parent.span_id
+      self.trace_id = parent.trace_id
+    self._token = _current.set(self)
+    self.start_ns = time.perf_counter_ns()
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    end_ns = time.perf_counter_ns()
+    _current.reset(self._token)
+    if exc_type is not None:
+      self.attributes["error"] = exc_type.__name__
+    _record(
+        self.name,
+        self.start_ns,
+        end_ns,
+        self.attributes,
+        self.span_id,
+        self.parent_id,
+        self.trace_id,
+    )
+    return False
+
+
+def _record(name, start_ns, end_ns, attributes, span_id, parent_id, trace_id):
+  thread = threading.current_thread()
+  with _lock:
+    _spans.append({
+        "name": name,
+        "trace_id": trace_id,
+        "span_id": span_id,
+        "parent_id": parent_id,
+        "start_us": (start_ns - _origin_ns) // 1000,
+        "duration_us": (end_ns - start_ns) // 1000,
+        "thread_id": thread.ident,
+        "thread_name": thread.name,
+        "attributes": attributes,
+    })
+
+
+def enable():
+  """Turns tracing on, for the spans started from now on."""
+  global _enabled
+  _enabled = True
+
+
+def disable():
+  """Turns tracing off; the spans recorded so far are kept."""
+  global _enabled
+  _enabled = False
+
+
+def is_enabled():
+  return _enabled
+
+
+def span(name, /, **attributes):
+  """Returns a context manager that records one span, if tracing is on.
+
+  Args:
+    name: the stage, e.g. "model.call". Spans with the same name are
+      summarized together.
+    **attributes: details to keep with the span, e.g. iteration=2.
+  """
+  if not _enabled:
+    return _NOOP_SPAN
+  return Span(name, attributes)
+
+
+def record(name, start_ns, end_ns, /, **attributes):
+  """Records a span that has already ended, as a child of the current span.
+
+  Args:
+    name: the stage.
+    start_ns: when it started, from time.perf_counter_ns().
+    end_ns: when it ended, from time.perf_counter_ns().
+    **attributes: details to keep with the span.
+  """
+  if not _enabled:
+    return
+  parent = _current.get()
+  span_id = next(_ids)
+  _record(
+      name,
+      start_ns,
+      end_ns,
+      attributes,
+      span_id,
+      parent.span_id if parent else None,
+      parent.trace_id if parent else span_id,
+  )
+
+
+def bind(fn):
+  """Returns fn, set to run under the current span, e.g. in another thread."""
+  if not _enabled:
+    return fn
+  context = contextvars.copy_context()
+
+  def bound(*args, **kwargs):
+    return context.run(fn, *args, **kwargs)
+
+  return bound
+
+
+def get_spans():
+  """Returns the finished spans, in the order they ended."""
+  with _lock:
+    return list(_spans)
+
+
+def clear():
+  """Forgets the finished spans."""
+  with _lock:
+    _spans.clear()
+
+
+def summarize(spans=None):
+  """Returns the count, total and percentiles of each span name.
+
+  Args:
+    spans: optional list of spans; defaults to get_spans().
+
+  Returns:
+    a dict of span name to {"count", "total_ms", "p50_ms", "p90_ms",
+    "max_ms"}, sorted by total time, longest first.
+  """
+  durations = {}
+  for s in get_spans() if spans is None else spans:
+    durations.setdefault(s["name"], []).append(s["duration_us"] / 1000)
+  summary = {}
+  for name, values in durations.items():
+    values.sort()
+    summary[name] = {
+        "count": len(values),
+        "total_ms": round(sum(values), 3),
+        "p50_ms": values[(len(values) - 1) // 2],
+        "p90_ms": values[min(len(values) - 1, int(len(values) * 0.9))],
+        "max_ms": values[-1],
+    }
+  return dict(
+      sorted(summary.items(), key=lambda kv: kv[1]["total_ms"], reverse=True)
+  )
+
+
+def print_summary(spans=None):
+  """Prints summarize() as a table."""
+  summary = summarize(spans)
+  if not summary:
+    return
+  width = max(len(name) for name in summary)
+  print("\n--- Trace Summary ---")
+  print(
+      f"{'span':<{width}} {'count':>6} {'total ms':>10} {'p50 ms':>9}"
+      f" {'p90 ms':>9} {'max ms':>9}"
+  )
+  for name, s in summary.items():
+    print(
+        f"{name:<{width}} {s['count']:>6} {s['total_ms']:>10.1f}"
+        f" {s['p50_ms']:>9.2f} {s['p90_ms']:>9.2f} {s['max_ms']:>9.2f}"
+    )
+
+
+def write_jsonl(path, spans=None):
+  """Writes the spans to a file, one JSON object per line."""
+  with open(path, "w") as f:
+    for s in get_spans() if spans is None else spans:
+      f.write(json.dumps(s, ensure_ascii=False, default=str) + "\n")
+
+
+def to_chrome_trace(spans=None):
+  """Returns the spans in the Chrome trace-event format, as a dict."""
+  spans = get_spans() if spans is None else spans
+  pid = os.getpid()
+  events = []
+  thread_names = {}
+  for s in spans:
+    thread_names.setdefault(s["thread_id"], s["thread_name"])
+    events.append({
+        "name": s["name"],
+        "cat": s["name"].split(".", 1)[0],
+        "ph": "X",
+        "ts": s["start_us"],
+        "dur": s["duration_us"],
+        "pid": pid,
+        "tid": s["thread_id"],
+        "args": {
+            "trace_id": s["trace_id"],
+            "span_id": s["span_id"],
+            "parent_id": s["parent_id"],
+            **s["attributes"],
+        },
+    })
+  for thread_id, thread_name in thread_names.items():
+    events.append({
+        "name": "thread_name",
+        "ph": "M",
+        "pid": pid,
+        "tid": thread_id,
+        "args": {"name": thread_name},
+    })
+  return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def write_chrome_trace(path, spans=None):
+  """Writes the spans to a file in the Chrome trace-event format."""
+  with open(path, "w") as f:
+    json.dump(to_chrome_trace(spans), f, ensure_ascii=False, default=str)
+
+
+def write(path, spans=None):
+  """Writes the spans as JSON lines if path ends in .jsonl, else for Chrome."""
+  if path.endswith(".jsonl"):
+    write_jsonl(path, spans)
+  else:
+    write_chrome_trace(path, spans)
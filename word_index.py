@@ -0,0 +1,138 @@
+"""A compact, memory-mapped index of words, for offline dictionary lookups."""
+
+# Copyright © 2025-2026 Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+# The index file holds the casefolded words, sorted by their UTF-8 bytes:
+#
+#   header   8-byte magic, then the word count as a little-endian uint32,
+#            then 4 reserved bytes
+#   offsets  count + 1 little-endian uint32 values; word i occupies
+#            data[offsets[i]:offsets[i + 1]]
+#   data     the UTF-8 bytes of all the words, back to back
+#
+# Lookups binary-search the mapped file directly, so opening an index reads
+# nothing up front, and processes that open the same file share its pages.
+#
+# Build an index from a word list with one word per line, for example:
+#
+#   python3 word_index.py build /usr/share/dict/words words.idx
+
+import argparse
+import mmap
+import struct
+
+MAGIC = b"WRDIDX01"
+_HEADER = struct.Struct("<8sII")
+_OFFSET = struct.Struct("<I")
+
+
+def _normalize(word):
+  return word.strip().casefold()
+
+
+def build_index(words, filename):
+  """Writes an index file for the given words.
+
+  Args:
+    words: an iterable of words. Blank entries are skipped, and duplicates
+      (after casefolding) are stored once.
+    filename: the path of the index file to write.
+
+  Returns:
+    the number of words in the index.
+  """
+  encoded = sorted(
+      {_normalize(word).encode("utf-8") for word in words if _normalize(word)}
+  )
+  offsets = [0]
+  for word_bytes in encoded:
+    offsets.append(offsets[-1] + len(word_bytes))
+
+  with open(filename, "wb") as f:
+    f.write(_HEADER.pack(MAGIC, len(encoded), 0))
+    f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+    for word_bytes in encoded:
+      f.write(word_bytes)
+  return len(encoded)
+
+
+class WordIndex:
+  """Read-only, memory-mapped lookups in an index built by build_index()."""
+
+  def __init__(self, filename):
+    self.filename = filename
+    with open(filename, "rb") as f:
+      self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, self._count, _ = _HEADER.unpack_from(self._mm, 0)
+    if magic != MAGIC:
+      self._mm.close()
+      raise ValueError(f"'{filename}' is not a word index file.")
+    self._offsets_start = _HEADER.size
+    self._data_start = self._offsets_start + (self._count + 1) * _OFFSET.size
+
+  def __len__(self):
+    return self._count
+
+  def _word_at(self, i):
+    start, end = struct.unpack_from(
+        "<II", self._mm, self._offsets_start + i * _OFFSET.size
+    )
+    return self._mm[self._data_start + start : self._data_start + end]
+
+  def __contains__(self, word):
+    target = _normalize(word).encode("utf-8")
+    low, high = 0, self._count
+    while low < high:
+      mid = (low + high) // 2
+      word_bytes = self._word_at(mid)
+      if word_bytes < target:
+        low = mid + 1
+      elif word_bytes > target:
+        high = mid
+      else:
+        return True
+    return False
+
+  def close(self):
+    self._mm.close()
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(
+      description="Builds or queries an offline word index."
+  )
+  subparsers = parser.add_subparsers(dest="command", required=True)
+  build_parser = subparsers.add_parser(
+      "build", help="Build an index from a word list, one word per line."
+  )
+  build_parser.add_argument("wordlist", help="The word list to read.")
+  build_parser.add_argument("index", help="The index file to write.")
+  lookup_parser = subparsers.add_parser(
+      "lookup", help="Check whether words are in an index."
+  )
+  lookup_parser.add_argument("index", help="The index file to read.")
+  lookup_parser.add_argument("words", nargs="+", help="The words to check.")
+  args = parser.parse_args()
+
+  if args.command == "build":
+    with open(args.wordlist, "r", encoding="utf-8") as wordlist_file:
+      count = build_index(wordlist_file, args.index)
+    print(f"Wrote {count} words to {args.index}.")
+  else:
+    index = WordIndex(args.index)
+    for word in args.words:
+      print(f"{word}: {word in index}")
+    index.close()